@@ -1,137 +1,208 @@
+import hashlib
+import importlib
+import json
 import os
 import pandas as pd
 import seaborn as sns
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from normalize import load_typed_offers
+# tag_offers mieszka w tag_matcher (bez pandas/seaborn); import zostaje dla zgodności
+from tag_matcher import tag_offers  # noqa: F401
+import metrics
 
+CHART_DIR = "wykresy"
+CHART_MANIFEST = os.path.join(CHART_DIR, "charts.json")   # plik → klucz danych, z których powstał
+DISPLAY_SIZE = (500, 300)    # wykresy renderujemy od razu w rozmiarze wyświetlania w GUI (px)
+DPI = 100
 
-def analyze_all():
+# Moduły z dodatkowymi wykresami – importowane dopiero, gdy wykres jest potrzebny
+PLUGIN_MODULES = ["chart_plugins"]
+
+# Rejestr wykresów: nazwa → {"func", "filename", "source", "baseline", "params"}
+CHARTS = {}
+
+# Wymagane kolumny źródłowe dla wykresów podstawowych
+REQUIRED_COLUMNS = ["price", "Liczba pokoi", "Powierzchnia", "Piętro"]
+
+
+def register_chart(name, filename, source="typed", baseline=False, **params):
     """
-    Wczytuje dzisiejszy plik Excel (data/oferty_YYYY-MM-DD.xlsx) i generuje trzy wykresy:
-      1. Cena vs liczba pokoi
-      2. Liczba pokoi vs cena na pokój (price_per_room)
-      3. Histogram: rozkład ofert wg piętra
-    Zakłada, że w Excelu mamy kolumny:
-      - "price"          (np. "439 000 zł")
-      - "Liczba pokoi"   (np. "3")
-      - "Powierzchnia"   (np. "63.86 m²")
-      - "Piętro"         (np. "parter/8" lub "2/5" etc.)
-    Inne kolumny mogą się tam znajdować (opis, lokalizacja), ale do wykresów potrzebujemy powyższych.
+    Dekorator rejestrujący wykres func(df, ax, **params), który rysuje na osi 'ax'.
+    'source' – skąd brać dane: "typed" (oferty z normalize.load_typed_offers,
+    bez wierszy z brakami) albo funkcja source(day) → DataFrame.
+    baseline=True – wykres rysowany przy każdej analizie; pozostałe (wtyczki)
+    tylko na żądanie, więc nie spowalniają podstawowej analizy.
     """
-    today = pd.Timestamp.today().date().isoformat()
-    excel_path = f"data/oferty_{today}.xlsx"
-
-    if not os.path.exists(excel_path):
-        print(f"[WARNING] Nie znaleziono pliku: {excel_path}")
-        return
-
-    df = pd.read_excel(excel_path)
-
-    # Sprawdź, czy mamy kolumny "price" i "Liczba pokoi" i "Powierzchnia" i "Piętro"
-    required = ["price", "Liczba pokoi", "Powierzchnia", "Piętro"]
-    if not all(col in df.columns for col in required):
-        print(f"[ERROR] Brak wymaganych kolumn w pliku Excel. Oczekiwano: {required}, znaleziono: {list(df.columns)}")
-        return
-
-    # 1. Konwertuj "price" → price_num (float), usuwając nie-cyfry
-    df["price_clean"] = df["price"].astype(str).str.replace(r"[^\d]", "", regex=True)
-    df["price_num"] = pd.to_numeric(df["price_clean"], errors="coerce")
-    df = df.dropna(subset=["price_num"])
-
-    # 2. Konwertuj "Liczba pokoi" → rooms_int (int)
-    df["rooms_clean"] = df["Liczba pokoi"].astype(str).str.extract(r"(\d+)")
-    df["rooms_int"] = pd.to_numeric(df["rooms_clean"], errors="coerce").astype("Int64")
-    df = df.dropna(subset=["rooms_int"])
-
-    # 3. Konwertuj "Powierzchnia" → area_m2 (float)
-    df["area_clean"] = (
-        df["Powierzchnia"]
-        .astype(str)
-        .str.replace(r"[^\d,\.]", "", regex=True)
-        .str.replace(",", ".", regex=False)
-    )
-    df["area_m2"] = pd.to_numeric(df["area_clean"], errors="coerce")
-    df = df.dropna(subset=["area_m2"])
-
-    # 4. Oblicz "price_per_room" = price_num / rooms_int
-    df["price_per_room"] = df["price_num"] / df["rooms_int"]
-
-    # 5. Konwertuj "Piętro" na floor_int (int)
-    def parse_floor(txt):
-        txt = str(txt).lower()
-        if "parter" in txt:
-            return 0
-        # np. "2/8" → weź "2"
-        import re
-        m = re.search(r"(\d+)", txt)
-        return int(m.group(1)) if m else None
-
-    df["floor_int"] = df["Piętro"].apply(parse_floor)
-    df = df.dropna(subset=["floor_int"])
+    def decorator(func):
+        CHARTS[name] = {"func": func, "filename": filename, "source": source,
+                        "baseline": baseline, "params": params}
+        return func
+    return decorator
 
-    # 6. Utwórz katalog "wykresy", jeśli nie istnieje
-    os.makedirs("wykresy", exist_ok=True)
 
-    # --- WYKRES 1: Cena vs liczba pokoi ---
-    try:
-        plt.figure(figsize=(8, 5))
-        sns.scatterplot(x="rooms_int", y="price_num", data=df, alpha=0.6)
-        plt.title("Cena [zł] vs Liczba pokoi")
-        plt.xlabel("Liczba pokoi")
-        plt.ylabel("Cena [zł]")
-        plt.grid(True, linestyle="--", alpha=0.5)
-        plt.tight_layout()
-        path1 = "wykresy/1_price_vs_rooms.png"
-        plt.savefig(path1)
-        plt.close()
-        print(f"[INFO] Wygenerowano wykres → {path1}")
-    except Exception as e:
-        print(f"[ERROR] Błąd przy tworzeniu wykresu 1: {e}")
-
-    # --- WYKRES 2: Liczba pokoi vs cena na pokój ---
-    try:
-        plt.figure(figsize=(8, 5))
-        sns.scatterplot(x="rooms_int", y="price_per_room", data=df, alpha=0.6, color="green")
-        plt.title("Liczba pokoi vs Cena na pokój [zł]")
-        plt.xlabel("Liczba pokoi")
-        plt.ylabel("Cena na pokój [zł]")
-        plt.grid(True, linestyle="--", alpha=0.5)
-        plt.tight_layout()
-        path2 = "wykresy/2_rooms_vs_price_per_room.png"
-        plt.savefig(path2)
-        plt.close()
-        print(f"[INFO] Wygenerowano wykres → {path2}")
-    except Exception as e:
-        print(f"[ERROR] Błąd przy tworzeniu wykresu 2: {e}")
-
-    # --- WYKRES 3: Histogram rozkładu pięter ---
-    try:
-        plt.figure(figsize=(8, 5))
-        floor_counts = df["floor_int"].value_counts().sort_index()
-        sns.barplot(x=floor_counts.index, y=floor_counts.values, palette="viridis")
-        plt.title("Liczba ofert wg Piętra")
-        plt.xlabel("Piętro")
-        plt.ylabel("Liczba ofert")
-        plt.grid(True, linestyle="--", axis="y", alpha=0.5)
-        plt.tight_layout()
-        path3 = "wykresy/3_floor_distribution.png"
-        plt.savefig(path3)
-        plt.close()
-        print(f"[INFO] Wygenerowano wykres → {path3}")
-    except Exception as e:
-        print(f"[ERROR] Błąd przy tworzeniu wykresu 3: {e}")
+def load_plugins():
+    """
+    Importuje moduły z PLUGIN_MODULES (rejestrują swoje wykresy przez register_chart).
+    """
+    for module in PLUGIN_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print(f"[WARN] Nie udało się wczytać wtyczki wykresów {module}: {e}")
+
+
+def available_charts():
+    """
+    Nazwy wszystkich wykresów (podstawowych i z wtyczek).
+    """
+    load_plugins()
+    return list(CHARTS)
 
-    print("[INFO] Analiza danych zakończona.")
 
+@register_chart("price_vs_rooms", "1_price_vs_rooms.png", baseline=True)
+def chart_price_vs_rooms(df, ax):
+    sns.scatterplot(x="rooms_int", y="price_num", data=df, alpha=0.6, ax=ax)
+    ax.set_title("Cena [zł] vs Liczba pokoi")
+    ax.set_xlabel("Liczba pokoi")
+    ax.set_ylabel("Cena [zł]")
+    ax.grid(True, linestyle="--", alpha=0.5)
 
-def tag_offers(offers, tags):
+
+@register_chart("rooms_vs_price_per_room", "2_rooms_vs_price_per_room.png", baseline=True)
+def chart_rooms_vs_price_per_room(df, ax):
+    sns.scatterplot(x="rooms_int", y="price_per_room", data=df, alpha=0.6, color="green", ax=ax)
+    ax.set_title("Liczba pokoi vs Cena na pokój [zł]")
+    ax.set_xlabel("Liczba pokoi")
+    ax.set_ylabel("Cena na pokój [zł]")
+    ax.grid(True, linestyle="--", alpha=0.5)
+
+
+@register_chart("floor_distribution", "3_floor_distribution.png", baseline=True)
+def chart_floor_distribution(df, ax):
+    floor_counts = df["floor_int"].value_counts().sort_index()
+    sns.barplot(x=floor_counts.index, y=floor_counts.values, palette="viridis", ax=ax)
+    ax.set_title("Liczba ofert wg Piętra")
+    ax.set_xlabel("Piętro")
+    ax.set_ylabel("Liczba ofert")
+    ax.grid(True, linestyle="--", axis="y", alpha=0.5)
+
+
+def dataset_hash(df):
+    """
+    Skrót zawartości DataFrame (wartości, indeks i nazwy kolumn) – klucz pamięci podręcznej wykresów.
+    """
+    digest = hashlib.sha1(",".join(map(str, df.columns)).encode("utf-8"))
+    if len(df):
+        digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def _chart_key(name, spec, data_hash, size):
+    params = json.dumps(spec["params"], sort_keys=True, default=str)
+    return hashlib.sha1(f"{name}|{spec['filename']}|{params}|{size}|{data_hash}".encode("utf-8")).hexdigest()
+
+
+def _load_manifest():
+    try:
+        with open(CHART_MANIFEST, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _render(spec, df, path, size):
+    # Figure + FigureCanvasAgg zamiast pyplot: bez globalnego stanu i backendu GUI,
+    # więc można rysować w wątku roboczym (gui.py)
+    fig = Figure(figsize=(size[0] / DPI, size[1] / DPI), dpi=DPI)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    spec["func"](df, ax, **spec["params"])
+    fig.tight_layout()
+    fig.savefig(path, dpi=DPI)
+
+
+def _typed_source(day):
+    # 1–5. Cena, liczba pokoi, powierzchnia, piętro i cena na pokój są już liczbami
+    #      (normalize.py); odrzucamy tylko wiersze, w których czegoś brakuje
+    typed = load_typed_offers(day)
+    if typed.empty:
+        print("[WARNING] Brak dzisiejszych ofert w magazynie.")
+        return None
+    source_columns = typed.attrs.get("source_columns", [])
+    if not all(col in source_columns for col in REQUIRED_COLUMNS):
+        print(f"[ERROR] Brak wymaganych kolumn w danych. Oczekiwano: {REQUIRED_COLUMNS}, "
+              f"znaleziono: {source_columns}")
+        return None
+    typed = typed.dropna(subset=["price_num", "rooms_int", "area_m2", "floor_int"])
+    # To samo mieszkanie wystawione pod kilkoma adresami liczymy raz (dedup.py)
+    if "cluster_id" in typed.columns:
+        typed = typed[typed["cluster_id"].isna() | ~typed["cluster_id"].duplicated(keep="last")]
+    return typed
+
+
+def analyze_all(day=None, extra=(), size=DISPLAY_SIZE):
     """
-    Dodaje do każdej oferty (słownika) klucz "tags" zawierający listę fraz z 'tags',
-    które występują w title lub description oferty (ignoring case).
+    Generuje wykresy z ofert danego dnia (domyślnie dzisiejszych) w katalogu wykresy/:
+      1. Cena vs liczba pokoi
+      2. Liczba pokoi vs cena na pokój (price_per_room)
+      3. Histogram: rozkład ofert wg piętra
+    oraz wykresy z wtyczek wymienione w 'extra' (np. "price_per_m2_by_district",
+    "time_on_market"; lista: available_charts()).
+    Dane podstawowe pochodzą z normalize.load_typed_offers (kolumny liczbowe z
+    kolumn "price", "Liczba pokoi", "Powierzchnia", "Piętro").
+    Każdy wykres ma klucz = skrót danych wejściowych + nazwa + parametry + rozmiar;
+    jeśli plik powstał już z tym samym kluczem (wykresy/charts.json), nie rysujemy
+    go ponownie. Wykresy mają od razu rozmiar 'size' (px), więc GUI ich nie skaluje.
+    Zwraca listę ścieżek gotowych wykresów (w kolejności rejestracji).
     """
-    for offer in offers:
-        full_text = (str(offer.get("title", "")) + " " + str(offer.get("description", ""))).lower()
-        offer["tags"] = [tag.lower() for tag in tags if tag.lower() in full_text]
-    return offers
+    names = [name for name, spec in CHARTS.items() if spec["baseline"]]
+    if extra:
+        load_plugins()
+        names += [name for name in extra if name not in names]
+
+    # 6. Utwórz katalog "wykresy", jeśli nie istnieje
+    os.makedirs(CHART_DIR, exist_ok=True)
+    manifest = _load_manifest()
+    datasets = {}    # źródło → (DataFrame albo None, skrót)
+    paths = []
+
+    for name in names:
+        spec = CHARTS.get(name)
+        if spec is None:
+            print(f"[ERROR] Nieznany wykres: {name}")
+            continue
+        source = spec["source"]
+        if source not in datasets:
+            with metrics.timer("chart_data_seconds"):
+                df = _typed_source(day) if source == "typed" else source(day)
+                datasets[source] = (df, dataset_hash(df) if df is not None else None)
+        df, data_hash = datasets[source]
+        if df is None:
+            continue
+
+        path = os.path.join(CHART_DIR, spec["filename"])
+        key = _chart_key(name, spec, data_hash, tuple(size))
+        if manifest.get(spec["filename"]) == key and os.path.exists(path):
+            metrics.inc("chart_cache_hits_total")
+            print(f"[INFO] Wykres bez zmian (pamięć podręczna) → {path}")
+            paths.append(path)
+            continue
+
+        try:
+            with metrics.timer("chart_render_seconds", chart=name):
+                _render(spec, df, path, size)
+            manifest[spec["filename"]] = key
+            paths.append(path)
+            print(f"[INFO] Wygenerowano wykres → {path}")
+        except Exception as e:
+            manifest.pop(spec["filename"], None)
+            print(f"[ERROR] Błąd przy tworzeniu wykresu {name}: {e}")
+
+    with open(CHART_MANIFEST, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    print("[INFO] Analiza danych zakończona.")
+    return paths
 
 
 if __name__ == "__main__":
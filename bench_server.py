@@ -0,0 +1,270 @@
+# bench_server.py
+
+import json
+import multiprocessing
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+LOCATION = "mazowieckie/warszawa"
+
+
+PAGE_SIZE = 72
+
+
+def render_listing_page(count, location=LOCATION, page=1):
+    """
+    Generuje stronę wyników nr 'page' w kształcie Otodom dla 'count' ogłoszeń
+    (po PAGE_SIZE na stronę; strona za ostatnią jest pusta).
+    """
+    region, city = location.split("/")
+    articles = []
+    for i in range((page - 1) * PAGE_SIZE, min(count, page * PAGE_SIZE)):
+        articles.append(
+            '<article data-cy="listing-item">'
+            f'<a data-cy="listing-item-link" href="/pl/oferta/mieszkanie-{i}-ID{i}">Mieszkanie {i}</a>'
+            f'<p data-sentry-component="Address">ul. Testowa {i}, {city.title()}, {region}</p>'
+            f'<span data-sentry-element="MainPrice">{listing_price(i)}</span>'
+            '</article>'
+        )
+    return "<html><body>" + "".join(articles) + "</body></html>"
+
+
+def listing_price(i):
+    price = 300000 + (i * 7919) % 900000
+    return f"{price:,}".replace(",", " ") + " zł"
+
+
+def render_detail_page(i, next_data=True):
+    """
+    Generuje podstronę ogłoszenia nr 'i' z tymi samymi selektorami co Otodom.
+    next_data=True dokleja też stan strony w <script id="__NEXT_DATA__">.
+    """
+    rooms = 1 + i % 5
+    area = 25 + (i * 7) % 90
+    price = 300000 + (i * 7919) % 900000
+    floor = "parter/4" if i % 6 == 0 else f"{i % 10}/10"
+    price_txt = listing_price(i)
+    specs = {
+        "Powierzchnia": f"{area} m²",
+        "Liczba pokoi": str(rooms),
+        "Piętro": floor,
+        "Czynsz": f"{400 + i % 300} zł",
+        "Stan wykończenia": "do remontu" if i % 4 == 0 else "do zamieszkania",
+    }
+    description = f'<p>Słoneczne mieszkanie nr {i}, blisko metra, ' \
+                  f'{"do remontu" if i % 4 == 0 else "wysoki standard"}.</p>'
+    state = ""
+    if next_data:
+        ad = {
+            "title": f"Mieszkanie {rooms}-pokojowe nr {i}",
+            "description": description,
+            "characteristics": (
+                [{"key": "price", "label": "Cena", "localizedValue": price_txt},
+                 {"key": "price_per_m", "label": "Cena za m²", "localizedValue": f"{price // area} zł/m²"}]
+                + [{"key": k, "label": k, "localizedValue": v} for k, v in specs.items()]
+            ),
+            "location": {"address": {
+                "street": {"name": "ul. Testowa", "number": str(i)},
+                "city": {"name": "Warszawa"},
+                "province": {"name": "mazowieckie"},
+            }},
+        }
+        state = ('<script id="__NEXT_DATA__" type="application/json">'
+                 + json.dumps({"props": {"pageProps": {"ad": ad}}}, ensure_ascii=False)
+                 + "</script>")
+    grid = "".join(
+        f'<div data-sentry-element="ItemGridContainer"><p data-sentry-element="Item">{k}:</p><p>{v}</p></div>'
+        for k, v in specs.items()
+    )
+    return (
+        "<html><body>"
+        f'<h1 data-cy="adPageAdTitle">Mieszkanie {rooms}-pokojowe nr {i}</h1>'
+        f'<strong data-cy="adPageHeaderPrice">{price_txt}</strong>'
+        f'<div aria-label="Cena za metr kwadratowy">{price // area} zł/m²</div>'
+        f'<div data-sentry-component="MapLink"><a href="#">ul. Testowa {i}, Warszawa, mazowieckie</a></div>'
+        f'<div data-cy="adPageAdDescription">{description}</div>'
+        + grid
+        + state
+        + "</body></html>"
+    )
+
+
+class StandInServer:
+    """
+    Lokalny serwer HTTP udający Otodom (strona wyników + podstrony ogłoszeń).
+    'latency'     – sztuczne opóźnienie każdej odpowiedzi w sekundach,
+    'error_rate'  – odsetek odpowiedzi 503 (wstrzykiwanie awarii),
+    'throttle_rate' – odsetek odpowiedzi 429 z nagłówkiem Retry-After,
+    'capacity'    – maks. liczba zapytań na sekundę; nadmiarowe dostają 429 z Retry-After
+                    (serwer "banuje" zbyt szybkiego klienta, jak prawdziwy serwis),
+    'recorded'    – HttpCache z nagranymi stronami Otodom; zamiast generować strony
+                    serwer odtwarza nagrane odpowiedzi dla recorded_base + ścieżka.
+    Podstrony mają nagłówek ETag i odpowiadają 304 na pasujące If-None-Match.
+    Użycie:
+        with StandInServer(listings=72, latency=0.05) as srv:
+            get_offers(LOCATION, base_url=srv.base_url, save=False)
+    """
+
+    def __init__(self, listings=72, latency=0.0, location=LOCATION, error_rate=0.0,
+                 throttle_rate=0.0, retry_after=1, recorded=None,
+                 recorded_base="https://www.otodom.pl", seed=0, capacity=None):
+        self.listings = listings
+        self.latency = latency
+        self.location = location
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.recorded = recorded
+        self.recorded_base = recorded_base
+        self.capacity = capacity
+        self.requests_served = 0
+        self.failures_injected = 0
+        self.throttled = 0
+        self._recent = deque()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _injected_failure(self):
+        # Zwraca kod błędu do wstrzyknięcia albo None
+        with self._lock:
+            self.requests_served += 1
+            if self.capacity:
+                now = time.monotonic()
+                while self._recent and self._recent[0] <= now - 1.0:
+                    self._recent.popleft()
+                if len(self._recent) >= self.capacity:
+                    self.throttled += 1
+                    return 429
+                self._recent.append(now)
+            roll = self._random.random()
+            if roll < self.throttle_rate:
+                self.failures_injected += 1
+                return 429
+            if roll < self.throttle_rate + self.error_rate:
+                self.failures_injected += 1
+                return 503
+        return None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                failure = server._injected_failure()
+                if server.latency:
+                    time.sleep(server.latency)
+                if failure:
+                    self.send_response(failure)
+                    if failure == 429:
+                        self.send_header("Retry-After", str(server.retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                parsed = urlparse(self.path)
+                path = parsed.path
+                etag = None
+                if server.recorded is not None:
+                    cached = server.recorded.get(server.recorded_base + self.path)
+                    if cached is None:
+                        self.send_error(404)
+                        return
+                    body = cached.text
+                elif path.startswith("/pl/wyniki/"):
+                    page = int(parse_qs(parsed.query).get("page", ["1"])[0])
+                    body = render_listing_page(server.listings, server.location, page)
+                elif path.startswith("/pl/oferta/") and "-ID" in path:
+                    i = int(path.rsplit("-ID", 1)[1])
+                    etag = f'"{i}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        self.send_response(304)
+                        self.send_header("ETag", etag)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    body = render_detail_page(i)
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _serve_forever(conn, kwargs):
+    if kwargs.get("recorded") is not None:
+        # Połączenia SQLite nie da się przekazać – proces potomny otwiera nagrania sam
+        from http_cache import HttpCache
+        kwargs = dict(kwargs, recorded=HttpCache(kwargs["recorded"], replay_only=True))
+    server = StandInServer(**kwargs)
+    conn.send(server.base_url)
+    server._httpd.serve_forever()
+
+
+class StandInProcess:
+    """
+    StandInServer uruchomiony w osobnym procesie, żeby serwer nie konkurował
+    z mierzonym scraperem o GIL. Przyjmuje te same argumenty co StandInServer;
+    'recorded' może być HttpCache albo ścieżką jej katalogu – do procesu serwera
+    trafia katalog, a serwer otwiera go w trybie replay_only.
+        with StandInProcess(listings=7200) as srv:
+            ... srv.base_url ...
+    """
+
+    def __init__(self, **kwargs):
+        recorded = kwargs.get("recorded")
+        if recorded is not None and not isinstance(recorded, str):
+            kwargs["recorded"] = recorded.directory
+        self.kwargs = kwargs
+        self.base_url = None
+        self._process = None
+
+    def __enter__(self):
+        parent_conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_serve_forever, args=(child_conn, self.kwargs),
+                                                daemon=True)
+        self._process.start()
+        self.base_url = parent_conn.recv()
+        return self
+
+    def __exit__(self, *exc):
+        self._process.terminate()
+        self._process.join()
@@ -0,0 +1,616 @@
+# benchmark.py
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import tempfile
+import time
+from bench_server import StandInServer, StandInProcess, LOCATION, render_detail_page
+from extractors import calibrate_extractors, compare_extractors, extract_fields
+from tag_matcher import TagMatcher
+from scraper import get_offers, iter_offers, HostRateLimiter
+from request_policy import AdaptiveRateLimiter, RequestPolicy
+from dedup import NearDuplicateIndex
+from offer_model import Offer, OfferBatch
+from storage import SQLiteOfferStore
+
+RESULTS_DIR = "bench_results"
+DEFAULT_SIZES = (72, 720, 7200, 50000)
+BENCH_TAGS = ["do remontu", "blisko metra", "balkon", "garaż", "ogródek"]
+
+
+def percentile(values, p):
+    """
+    Percentyl metodą najbliższej rangi (p w zakresie 0–100).
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(p / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def _stage_summary(durations):
+    return {
+        "calls": len(durations),
+        "total_s": round(sum(durations), 4),
+        "p50_ms": round(1000 * percentile(durations, 50), 3),
+        "p99_ms": round(1000 * percentile(durations, 99), 3),
+    }
+
+
+def _run_pipeline(size, base_url, concurrency, batch_size, analyze, result_queue):
+    """
+    Jeden przebieg całego potoku w osobnym procesie (osobny, tymczasowy katalog
+    roboczy – usuwany po przebiegu; niezależny pomiar szczytowego zużycia pamięci).
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="otodom_bench_") as workdir:
+        os.chdir(workdir)
+        try:
+            result = _measure_pipeline(size, base_url, concurrency, batch_size, analyze)
+        finally:
+            os.chdir(cwd)
+    result_queue.put(result)
+
+
+def _measure_pipeline(size, base_url, concurrency, batch_size, analyze):
+    """
+    iter_offers → tag_offers → save_offers partiami, na końcu analyze_all
+    (w bieżącym katalogu roboczym). Zwraca wynik przebiegu.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    from analyzer import analyze_all, tag_offers
+    from utils import save_offers
+
+    stages = {"scrape": [], "tag": [], "save": [], "analyze": []}
+    total = 0
+    batch = []
+    start = time.perf_counter()
+    batch_start = start
+
+    def flush(batch):
+        stages["scrape"].append(time.perf_counter() - batch_start)
+        t = time.perf_counter()
+        tag_offers(batch, BENCH_TAGS)
+        stages["tag"].append(time.perf_counter() - t)
+        t = time.perf_counter()
+        save_offers(batch)
+        stages["save"].append(time.perf_counter() - t)
+
+    for offer in iter_offers(LOCATION, concurrency=concurrency, rate_limit=None,
+                             base_url=base_url, max_offers=size):
+        batch.append(offer)
+        total += 1
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+            batch_start = time.perf_counter()
+    if batch:
+        flush(batch)
+
+    if analyze:
+        t = time.perf_counter()
+        analyze_all()
+        stages["analyze"].append(time.perf_counter() - t)
+
+    wall = time.perf_counter() - start
+    return {
+        "size": size,
+        "offers": total,
+        "wall_s": round(wall, 3),
+        "offers_per_s": round(total / wall, 1) if wall else 0.0,
+        "stages": {name: _stage_summary(d) for name, d in stages.items() if d},
+        # ru_maxrss jest w KB na Linuksie
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def bench_pipeline(sizes=DEFAULT_SIZES, latency=0.0, error_rate=0.0, throttle_rate=0.0,
+                   concurrency=16, batch_size=72, analyze=True, output=None, recorded=None):
+    """
+    Benchmark całego potoku na lokalnym serwerze (osobny proces) dla kolejnych
+    rozmiarów zbioru. 'recorded' – katalog HttpCache z nagranymi stronami Otodom,
+    które serwer odtwarza zamiast stron syntetycznych. Wyniki (ofert/s, p50/p99 czasu etapów na partię, szczytowa
+    pamięć) zapisuje do JSON-a w RESULTS_DIR i zwraca je.
+    """
+    config = {
+        "latency": latency,
+        "error_rate": error_rate,
+        "throttle_rate": throttle_rate,
+        "concurrency": concurrency,
+        "batch_size": batch_size,
+        "recorded": recorded,
+    }
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "config": config,
+        "results": [],
+    }
+    with StandInProcess(listings=max(sizes), latency=latency, error_rate=error_rate,
+                        throttle_rate=throttle_rate, recorded=recorded) as srv:
+        for size in sizes:
+            queue = multiprocessing.Queue()
+            proc = multiprocessing.Process(
+                target=_run_pipeline,
+                args=(size, srv.base_url, concurrency, batch_size, analyze, queue)
+            )
+            proc.start()
+            result = queue.get()
+            proc.join()
+            report["results"].append(result)
+            stages = " ".join(
+                f"{name}=p50 {s['p50_ms']:.1f}/p99 {s['p99_ms']:.1f} ms"
+                for name, s in result["stages"].items()
+            )
+            print(f"[BENCH] ofert={result['offers']:<6} {result['offers_per_s']:>8.1f} ofert/s "
+                  f"RSS={result['peak_rss_mb']} MB {stages}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = output or os.path.join(
+        RESULTS_DIR, f"pipeline_{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+    )
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"[INFO] Zapisano wyniki → {output}")
+    return report
+
+
+def compare_results(old_path, new_path):
+    """
+    Porównuje dwa pliki JSON z bench_pipeline (ofert/s i p99 etapów dla tych samych rozmiarów).
+    """
+    with open(old_path, encoding="utf-8") as f:
+        old = {r["size"]: r for r in json.load(f)["results"]}
+    with open(new_path, encoding="utf-8") as f:
+        new = {r["size"]: r for r in json.load(f)["results"]}
+    for size in sorted(set(old) & set(new)):
+        o, n = old[size], new[size]
+        ratio = n["offers_per_s"] / o["offers_per_s"] if o["offers_per_s"] else float("inf")
+        print(f"[BENCH] rozmiar={size:<6} ofert/s {o['offers_per_s']} → {n['offers_per_s']} ({ratio:.2f}x) "
+              f"RSS {o['peak_rss_mb']} → {n['peak_rss_mb']} MB")
+        for stage in sorted(set(o["stages"]) & set(n["stages"])):
+            print(f"          {stage:<8} p99 {o['stages'][stage]['p99_ms']} → {n['stages'][stage]['p99_ms']} ms")
+
+
+def bench_concurrency(listings=72, latency=0.05, concurrency_levels=(1, 4, 8, 16)):
+    """
+    Porównuje czas get_offers dla różnych poziomów współbieżności
+    na lokalnym serwerze udającym Otodom (bez limitu zapytań/s).
+    """
+    results = {}
+    with StandInServer(listings=listings, latency=latency) as srv:
+        baseline = None
+        for level in concurrency_levels:
+            start = time.perf_counter()
+            offers = get_offers(LOCATION, concurrency=level, rate_limit=None,
+                                base_url=srv.base_url, save=False)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            results[level] = elapsed
+            print(f"[BENCH] concurrency={level:<3} ofert={len(offers):<4} "
+                  f"czas={elapsed:.2f}s przyspieszenie={baseline / elapsed:.1f}x")
+    return results
+
+
+def bench_policy(listings=300, latency=0.05, capacity=20, concurrency=16, retry_after=1):
+    """
+    Przepustowość przy serwerze, który odpowiada 429 (z Retry-After) powyżej 'capacity'
+    zapytań/s, dla trzech polityk zapytań:
+      - bez ponowień, bez limitu (dawne zachowanie – odrzucone ogłoszenia przepadają),
+      - ponowienia z opóźnieniem, stałe tempo bez limitu,
+      - ponowienia + adaptacyjne tempo (AIMD).
+    """
+    scenarios = {
+        "bez_ponowien": lambda: (HostRateLimiter(None), RequestPolicy(max_retries=0, breaker=False)),
+        "ponowienia": lambda: (HostRateLimiter(None), RequestPolicy(breaker=False, seed=0)),
+        "adaptacyjne": lambda: (AdaptiveRateLimiter(None), RequestPolicy(seed=0)),
+    }
+    results = {}
+    for name, make in scenarios.items():
+        limiter, policy = make()
+        stats = {}
+        with StandInServer(listings=listings, latency=latency, capacity=capacity,
+                           retry_after=retry_after) as srv:
+            start = time.perf_counter()
+            count = 0
+            aborted = None
+            try:
+                for _ in iter_offers(LOCATION, concurrency=concurrency, base_url=srv.base_url,
+                                     stats=stats, limiter=limiter, policy=policy):
+                    count += 1
+            except Exception as e:
+                # np. strona wyników odrzucona 429 bez ponowień – przebieg przerwany
+                aborted = str(e)
+            elapsed = time.perf_counter() - start
+            results[name] = {
+                "aborted": aborted,
+                "offers": count,
+                "lost": stats["cards"] - count,
+                "seconds": round(elapsed, 2),
+                "offers_per_s": round(count / elapsed, 2),
+                "requests": srv.requests_served,
+                "throttled_429": srv.throttled,
+            }
+        r = results[name]
+        print(f"[BENCH] {name:<13} ofert={r['offers']:<4} utracone={r['lost']:<4} czas={r['seconds']}s "
+              f"({r['offers_per_s']} ofert/s) zapytań={r['requests']} odpowiedzi 429={r['throttled_429']}"
+              + (f" PRZERWANO: {r['aborted']}" if r["aborted"] else ""))
+    return results
+
+
+def bench_imports(runs=5):
+    """
+    Czas importu modułów każdego polecenia cli.py w świeżym interpreterze (mediana z 'runs'
+    uruchomień) w porównaniu z budżetem cli.IMPORT_BUDGETS_MS. Zwraca wyniki i drukuje je;
+    przekroczenie budżetu jest oznaczone jako PRZEKROCZONO.
+    """
+    import statistics
+    import subprocess
+    import sys
+    from cli import COMMAND_MODULES, IMPORT_BUDGETS_MS
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for command, modules in COMMAND_MODULES.items():
+        code = ("import importlib, time\n"
+                "start = time.perf_counter()\n"
+                f"for name in {modules!r}: importlib.import_module(name)\n"
+                "print((time.perf_counter() - start) * 1000)")
+        samples = [
+            float(subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True,
+                                 text=True, check=True).stdout)
+            for _ in range(runs)
+        ]
+        median_ms = statistics.median(samples)
+        budget = IMPORT_BUDGETS_MS[command]
+        results[command] = {"import_ms": round(median_ms, 1), "budget_ms": budget, "ok": median_ms <= budget}
+        print(f"[BENCH] {command:<8} import {median_ms:7.1f} ms  budżet {budget} ms  "
+              f"{'OK' if median_ms <= budget else 'PRZEKROCZONO'}")
+    return results
+
+
+def bench_tags(tag_counts=(5, 50, 200, 500, 1000), offers=500):
+    """
+    Skalowanie dopasowania fraz względem liczby fraz: dawne wyszukiwanie
+    "tag in tekst" dla każdej frazy kontra skompilowany TagMatcher (Aho-Corasick).
+    Sprawdza też, czy oba dają identyczne wyniki.
+    """
+    rng = random.Random(0)
+    words = ["mieszkanie", "blisko", "metra", "do", "remontu", "balkon", "garaż", "ogródek",
+             "słoneczne", "cicha", "okolica", "parking", "winda", "łazienka", "kuchnia",
+             "widok", "park", "szkoła", "sklep", "tramwaj", "nowe", "osiedle", "piwnica"]
+    texts = [
+        " ".join(rng.choice(words) for _ in range(300)) + f" nr {i}"
+        for i in range(offers)
+    ]
+    results = {}
+    for count in tag_counts:
+        tags = [" ".join(rng.choice(words) for _ in range(rng.randint(1, 3))) + ("" if i % 3 else f" {i}")
+                for i in range(count)]
+
+        start = time.perf_counter()
+        naive = []
+        for text in texts:
+            full_text = text.lower()
+            naive.append([tag.lower() for tag in tags if tag.lower() in full_text])
+        naive_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        matcher = TagMatcher(tags)
+        compiled = [matcher.match(text) for text in texts]
+        compiled_s = time.perf_counter() - start
+
+        results[count] = {"naive_s": naive_s, "matcher_s": compiled_s, "identical": naive == compiled}
+        print(f"[BENCH] fraz={count:<5} naiwnie={naive_s:.3f}s matcher={compiled_s:.3f}s "
+              f"({naive_s / compiled_s:.1f}x) identyczne={naive == compiled}")
+    return results
+
+
+def bench_extractors(pages=200, recorded=None):
+    """
+    Porównuje czas parsowania podstron przez każdy ekstraktor (extractors.py)
+    i sprawdza, czy daje identyczne pola jak ścieżka BeautifulSoup.
+    'recorded' – katalog HttpCache z nagranymi stronami Otodom: wtedy porównanie idzie
+    na nagranych podstronach i ustala kolejność ekstraktorów (calibrate_extractors).
+    Bez niego używa stron syntetycznych i kolejności nie zmienia.
+    """
+    if recorded:
+        from http_cache import HttpCache
+        cache = HttpCache(recorded, replay_only=True)
+        try:
+            html_pages = list(cache.pages("detail"))
+        finally:
+            cache.close()
+        report = calibrate_extractors(html_pages)
+    else:
+        report = compare_extractors([render_detail_page(i) for i in range(pages)])
+    for name, row in report.items():
+        if name in ("fastest_identical", "order"):
+            continue
+        print(f"[BENCH] ekstraktor={name:<10} stron={row['pages']:<4} "
+              f"{row['per_page_ms']:.3f} ms/stronę identyczny={row['identical']}")
+    print(f"[BENCH] najszybszy zgodny ekstraktor: {report['fastest_identical']}")
+    if "order" in report:
+        print(f"[BENCH] kolejność ekstraktorów z {len(html_pages)} nagranych stron: {report['order']}")
+    return report
+
+
+def bench_dedup(checkpoints=(1000, 10000, 100000), repost_rate=0.05, probe=500):
+    """
+    Wykrywanie duplikatów (dedup.NearDuplicateIndex) na syntetycznych ogłoszeniach:
+    co 'repost_rate' oferta to ponowne wystawienie wcześniejszej (ok. 10% słów opisu
+    zmienione, cena ±5%). Przy każdym progu z 'checkpoints' mierzy czas przypisania
+    kolejnych 'probe' ofert do indeksu (czy rośnie z rozmiarem indeksu), odsetek
+    wykrytych ponownych wystawień i odsetek fałszywie połączonych ogłoszeń.
+    """
+    rng = random.Random(0)
+    vocabulary = [f"slowo{i}" for i in range(3000)]
+
+    def fresh(i):
+        return {"url": f"https://example.test/oferta/{i}",
+                "title": f"Mieszkanie {rng.randint(1, 5)}-pokojowe",
+                "description": " ".join(rng.choice(vocabulary) for _ in range(80)),
+                "price": f"{rng.randint(300, 1500) * 1000} zł",
+                "Powierzchnia": f"{rng.randint(25, 120)} m²"}
+
+    def repost(i, original):
+        words = original["description"].split()
+        for _ in range(len(words) // 10):
+            words[rng.randrange(len(words))] = rng.choice(vocabulary)
+        price = int(original["price"].split()[0]) * rng.uniform(0.95, 1.05)
+        return dict(original, url=f"https://example.test/oferta/{i}", description=" ".join(words),
+                    price=f"{int(price)} zł")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        with NearDuplicateIndex(os.path.join(tmp, "dedup.db")) as index:
+            originals, expected = [], {}
+            found = false_merges = reposts = 0
+            count = 0
+            for checkpoint in checkpoints:
+                for phase, target in (("fill", checkpoint - probe), ("probe", checkpoint)):
+                    start = time.perf_counter()
+                    batch = []
+                    while count < target:
+                        if originals and rng.random() < repost_rate:
+                            source = rng.choice(originals)
+                            batch.append(repost(count, source))
+                            expected[batch[-1]["url"]] = source["url"]
+                        else:
+                            batch.append(fresh(count))
+                            originals.append(batch[-1])
+                        count += 1
+                        if len(batch) == 500 or count == target:
+                            index.assign(batch)
+                            for offer in batch:
+                                if offer["url"] in expected:
+                                    reposts += 1
+                                    found += offer.get("duplicate_of") == expected[offer["url"]]
+                                else:
+                                    false_merges += "duplicate_of" in offer
+                            batch = []
+                    probe_s = time.perf_counter() - start
+                results[checkpoint] = {
+                    "per_offer_ms": probe_s / probe * 1000,
+                    "recall": found / reposts if reposts else None,
+                    "false_merges": false_merges / (count - reposts),
+                }
+                row = results[checkpoint]
+                print(f"[BENCH] indeks={checkpoint:<7} {row['per_offer_ms']:.3f} ms/ofertę "
+                      f"wykryte ponowne wystawienia={row['recall']:.1%} "
+                      f"fałszywe połączenia={row['false_merges']:.2%}")
+    return results
+
+
+def _legacy_offer(html, url):
+    # Dawny format oferty (słownik napisów) – punkt odniesienia dla bench_offer_memory
+    _, fields = extract_fields(html)
+    offer = {"title": fields["title"], "price": fields["price"], "price_per_m2": fields["price_per_m2"],
+             "location": fields["location"] or "brak", "description": fields["description"],
+             "url": url, "date": str(datetime.datetime.now())}
+    offer.update(fields["details"])
+    return offer
+
+
+def bench_offer_memory(offers=10000):
+    """
+    Pamięć zajmowana przez 'offers' ofert sparsowanych z podstron (tracemalloc, po
+    zwolnieniu obiektów tymczasowych): dawne słowniki napisów, offer_model.Offer
+    i OfferBatch, oraz pamięć ramki pandas z dawnych słowników i z OfferBatch.to_pandas().
+    Sprawdza też, że dict(Offer) zwraca dokładnie to, co dał ekstraktor (check_offer_round_trip).
+    """
+    import gc
+    import tracemalloc
+    import pandas as pd
+
+    pages = [(render_detail_page(i), f"https://example.test/oferta/{i}") for i in range(offers)]
+    results = {}
+
+    def measure(name, build):
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        built = build()
+        seconds = time.perf_counter() - start
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = {"mb": current / 1024 / 1024, "seconds": seconds}
+        print(f"[BENCH] {name:<14} {current / 1024 / 1024:7.2f} MB na {offers} ofert "
+              f"({current / offers:.0f} B/ofertę, {seconds:.2f} s)")
+        return built
+
+    legacy = measure("dict", lambda: [_legacy_offer(html, url) for html, url in pages])
+    typed = measure("Offer", lambda: [Offer.from_fields(extract_fields(html)[1], url) for html, url in pages])
+    batch = measure("OfferBatch", lambda: OfferBatch.from_offers(typed))
+
+    for name, frame in (("DataFrame(dict)", pd.DataFrame(legacy)), ("to_pandas()", batch.to_pandas())):
+        mb = frame.memory_usage(deep=True).sum() / 1024 / 1024
+        results[name] = {"mb": mb}
+        print(f"[BENCH] {name:<14} {mb:7.2f} MB ramki pandas")
+    results["round_trip_mismatches"] = check_offer_round_trip(html for html, _ in pages[:1000])
+    return results
+
+
+# Teksty, które liczba nie odtwarza bajt w bajt – widok słownika musi zwrócić oryginał
+ROUND_TRIP_FIELDS = [
+    {"price": "450\xa0000 zł", "price_per_m2": "7\xa0046 zł/m²", "details": {"Powierzchnia": "63.86 m²"}},
+    {"price": "120 000 €", "price_per_m2": "2 000 €/m²", "details": {"Powierzchnia": "1234567.5 m²"}},
+    {"price": "Zapytaj o cenę", "price_per_m2": "brak", "details": {"Powierzchnia": "63,86 m²",
+                                                                    "Piętro": "parter/4"}},
+]
+
+
+def check_offer_round_trip(pages):
+    """
+    dict(Offer.from_fields(...)) kontra pola z ekstraktora (i ROUND_TRIP_FIELDS):
+    każdy klucz poza "date" musi mieć identyczny tekst, bo to trafia do magazynu
+    i eksportu Excel. Drukuje i zwraca liczbę niezgodnych pól.
+    """
+    samples = [extract_fields(html)[1] for html in pages]
+    for extra in ROUND_TRIP_FIELDS:
+        samples.append({"title": "t", "location": "l", "description": "d", **extra})
+    mismatches = 0
+    for i, fields in enumerate(samples):
+        url = f"https://example.test/oferta/{i}"
+        expected = {"title": fields["title"], "price": fields["price"], "price_per_m2": fields["price_per_m2"],
+                    "location": fields["location"] or "brak", "description": fields["description"],
+                    "url": url, **fields["details"]}
+        got = dict(Offer.from_fields(fields, url))
+        got.pop("date")
+        for key in expected.keys() | got.keys():
+            if expected.get(key) != got.get(key):
+                mismatches += 1
+                print(f"[WARN] {key}: {expected.get(key)!r} → {got.get(key)!r}")
+    print(f"[BENCH] round-trip dict(Offer): {len(samples)} ofert, niezgodnych pól {mismatches}")
+    return mismatches
+
+
+BENCH_QUERIES = {
+    "fraza": '"blisko metra"',
+    "prefiks": "metr*",
+    "logika": '(balkon OR taras) AND "blisko metra" NOT parter',
+    "bez polskich znaków": "lazienka AND garaz",
+}
+
+
+def bench_search(offers=200000, runs=20):
+    """
+    Wyszukiwanie pełnotekstowe (indeks offers_fts magazynu) na 'offers' syntetycznych
+    ogłoszeniach: czas zapisu z indeksowaniem, mediana czasu zapytań BENCH_QUERIES
+    (liczba trafień + 20 najtrafniejszych ofert, osobno 20 najnowszych trafień) oraz dla
+    porównania liniowy przegląd opisów (filtr 'tags' – instr na JSON).
+    """
+    rng = random.Random(0)
+    # Tysiące rzadkich słów wypełnienia i kilkanaście częstszych cech mieszkań
+    filler = [f"slowo{i}" for i in range(5000)]
+    features = ("balkon taras garaż łazienka parter blisko metra metrem metro ogródek winda "
+                "klimatyzacja komórka").split()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        with SQLiteOfferStore(os.path.join(tmp, "oferty.db")) as store:
+            start = time.perf_counter()
+            for first in range(0, offers, 1000):
+                store.upsert([
+                    {"url": f"https://example.test/oferta/{i}", "title": f"Mieszkanie {rng.randint(1, 5)}-pokojowe",
+                     "description": " ".join(rng.choice(features) if rng.random() < 0.02 else rng.choice(filler)
+                                             for _ in range(80)),
+                     "location": "Mokotów, Warszawa, mazowieckie", "price": f"{rng.randint(300, 1500) * 1000} zł"}
+                    for i in range(first, min(first + 1000, offers))
+                ])
+            write_s = time.perf_counter() - start
+            results["write_per_offer_ms"] = write_s / offers * 1000
+            print(f"[BENCH] zapis z indeksowaniem: {results['write_per_offer_ms']:.3f} ms/ofertę ({offers} ofert)")
+
+            def timed(run):
+                times = []
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    found = run()
+                    times.append((time.perf_counter() - start) * 1000)
+                return found, percentile(times, 50)
+
+            for name, query in BENCH_QUERIES.items():
+                found, ms = timed(lambda: (store.count_matching(text=query), list(store.search(query, 20)))[0])
+                _, newest_ms = timed(lambda: list(store.query(limit=20, text=query)))
+                results[name] = {"hits": found, "median_ms": ms, "newest_ms": newest_ms}
+                print(f"[BENCH] {name:<20} {ms:8.2f} ms  trafień {found}  "
+                      f"(20 najnowszych bez oceny trafności: {newest_ms:.2f} ms)")
+            found, ms = timed(lambda: store.count_matching(tags=["blisko metra"]))
+            results["linear_scan"] = {"hits": found, "median_ms": ms}
+            print(f"[BENCH] {'przegląd liniowy':<20} {ms:8.2f} ms  trafień {found}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarki scrapera na lokalnym serwerze")
+    sub = parser.add_subparsers(dest="command")
+
+    p = sub.add_parser("pipeline", help="cały potok dla różnych rozmiarów zbioru (domyślnie)")
+    p.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    p.add_argument("--latency", type=float, default=0.0)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--throttle-rate", type=float, default=0.0)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--no-analyze", action="store_true")
+    p.add_argument("--output")
+    p.add_argument("--recorded", help="katalog HttpCache z nagranymi stronami do odtwarzania")
+
+    p = sub.add_parser("compare", help="porównanie dwóch plików z wynikami")
+    p.add_argument("old")
+    p.add_argument("new")
+
+    p = sub.add_parser("concurrency", help="przyspieszenie get_offers względem współbieżności")
+    p.add_argument("--listings", type=int, default=72)
+    p.add_argument("--latency", type=float, default=0.05)
+
+    p = sub.add_parser("policy", help="ponowienia i adaptacyjne tempo przy serwerze zwracającym 429")
+    p.add_argument("--listings", type=int, default=300)
+    p.add_argument("--capacity", type=int, default=20, help="zapytań/s, powyżej których serwer zwraca 429")
+    p.add_argument("--latency", type=float, default=0.05)
+    p.add_argument("--concurrency", type=int, default=16)
+    sub.add_parser("imports", help="czas importu dla poleceń cli.py względem budżetów")
+    p = sub.add_parser("extractors", help="czas parsowania per ekstraktor")
+    p.add_argument("--recorded", help="katalog HttpCache z nagranymi stronami – ustala kolejność ekstraktorów")
+    sub.add_parser("tags", help="skalowanie dopasowania fraz względem ich liczby")
+    p = sub.add_parser("offers", help="pamięć na 10 tys. ofert: słowniki kontra Offer/OfferBatch")
+    p.add_argument("--offers", type=int, default=10000)
+    p = sub.add_parser("dedup", help="wykrywanie duplikatów ogłoszeń względem rozmiaru indeksu")
+    p.add_argument("--checkpoints", type=int, nargs="+", default=[1000, 10000, 100000])
+    p = sub.add_parser("search", help="wyszukiwanie pełnotekstowe względem przeglądu liniowego")
+    p.add_argument("--offers", type=int, default=200000)
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare_results(args.old, args.new)
+    elif args.command == "concurrency":
+        bench_concurrency(args.listings, args.latency)
+    elif args.command == "policy":
+        bench_policy(args.listings, args.latency, args.capacity, args.concurrency)
+    elif args.command == "imports":
+        results = bench_imports()
+        if not all(r["ok"] for r in results.values()):
+            raise SystemExit(1)
+    elif args.command == "extractors":
+        bench_extractors(recorded=args.recorded)
+    elif args.command == "tags":
+        bench_tags()
+    elif args.command == "offers":
+        bench_offer_memory(args.offers)
+    elif args.command == "dedup":
+        bench_dedup(args.checkpoints)
+    elif args.command == "search":
+        bench_search(args.offers)
+    elif args.command == "pipeline":
+        bench_pipeline(args.sizes, args.latency, args.error_rate, args.throttle_rate,
+                       args.concurrency, analyze=not args.no_analyze, output=args.output)
+    else:
+        bench_pipeline()
@@ -0,0 +1,72 @@
+# chart_plugins.py
+# Dodatkowe wykresy (wtyczki) dla analyzer.analyze_all(extra=[...]).
+# Nie są rysowane przy podstawowej analizie – tylko na żądanie.
+
+import datetime
+import os
+import sqlite3
+from contextlib import closing
+import pandas as pd
+import seaborn as sns
+from analyzer import register_chart
+from history import HISTORY_PATH
+from storage import get_store
+
+
+def district_prices(day):
+    """
+    Cena za m² i dzielnica każdej oferty z danego dnia. Dzielnica to trzecia
+    od końca część adresu ("ul. X, Mokotów, Warszawa, mazowieckie" → "Mokotów").
+    """
+    with get_store() as store:
+        raw = store.read_frame(day)
+    if raw.empty or "location" not in raw.columns or "price_per_m2" not in raw.columns:
+        return None
+    parts = raw["location"].astype("string").str.split(",")
+    district = parts.str[-3].where(parts.str.len() >= 3, parts.str[0]).str.strip()
+    price_m2 = pd.to_numeric(
+        raw["price_per_m2"].astype("string").str.replace(r"[^\d]", "", regex=True), errors="coerce"
+    )
+    return pd.DataFrame({"district": district, "price_per_m2_num": price_m2}).dropna()
+
+
+def listing_lifetimes(day):
+    """
+    Czas na rynku ogłoszeń z historii cen, które były na rynku danego dnia (domyślnie
+    dzisiaj): dni od pierwszego widzenia do ostatniego, najpóźniej do końca tego dnia.
+    Historię cen czytamy tylko do odczytu – bez niej wykres nie powstaje.
+    """
+    day = day or datetime.date.today().isoformat()
+    day_end = day + "T23:59:59"
+    if not os.path.exists(HISTORY_PATH):
+        return None
+    try:
+        uri = "file:" + os.path.abspath(HISTORY_PATH) + "?mode=ro"
+        with closing(sqlite3.connect(uri, uri=True)) as conn:
+            df = pd.read_sql_query(
+                "SELECT julianday(min(last_seen, ?)) - julianday(first_seen) AS days FROM listings "
+                "WHERE first_seen <= ? AND last_seen >= ?",
+                conn, params=(day_end, day_end, day)
+            )
+    except (sqlite3.Error, pd.errors.DatabaseError):
+        return None
+    return df.dropna() if not df.empty else None
+
+
+@register_chart("price_per_m2_by_district", "4_price_per_m2_by_district.png", source=district_prices, top=15)
+def chart_price_per_m2_by_district(df, ax, top):
+    medians = df.groupby("district")["price_per_m2_num"].median().sort_values(ascending=False).head(top)
+    sns.barplot(x=medians.values, y=medians.index, color="steelblue", ax=ax)
+    ax.set_title("Mediana ceny za m² wg dzielnicy")
+    ax.set_xlabel("Cena za m² [zł]")
+    ax.set_ylabel("")
+    ax.grid(True, linestyle="--", axis="x", alpha=0.5)
+
+
+@register_chart("time_on_market", "5_time_on_market.png", source=listing_lifetimes, bins=20)
+def chart_time_on_market(df, ax, bins):
+    sns.histplot(df["days"], bins=bins, color="darkorange", ax=ax)
+    ax.set_title("Czas ogłoszeń na rynku")
+    ax.set_xlabel("Dni od pierwszego widzenia")
+    ax.set_ylabel("Liczba ogłoszeń")
+    ax.grid(True, linestyle="--", axis="y", alpha=0.5)
@@ -0,0 +1,253 @@
+# cli.py
+# Bezokienkowy interfejs scrapera (serwery, cron). Każde polecenie importuje tylko
+# potrzebne moduły – import pandas/seaborn/tkinter nie spowalnia np. samego scrapowania.
+#
+#   python cli.py scrape [--location mazowieckie/warszawa] [--full] [--no-notify] [--durable]
+#   python cli.py worker [--concurrency 8]
+#   python cli.py analyze [--day 2025-05-01] [--extra time_on_market]
+#   python cli.py notify [--since 2025-05-01T00:00:00]
+#   python cli.py export [--day 2025-05-01] [--path oferty.xlsx]
+#   python cli.py search '"blisko metra" AND balkon*' [--max-price 700000] [--limit 20]
+#   python cli.py tag "blisko metra" [--since 2025-05-01] [--notify]
+
+import argparse
+import sys
+
+# Moduły importowane przez każde polecenie i budżet czasu ich importu (ms, zimny start).
+# Pomiar: python benchmark.py imports
+COMMAND_MODULES = {
+    "scrape": ["pipeline", "scraper", "parallel"],
+    "worker": ["pipeline", "crawl_queue"],
+    "analyze": ["analyzer"],
+    "notify": ["pipeline"],
+    "export": ["utils"],
+    "search": ["utils"],
+    "tag": ["pipeline"],
+}
+IMPORT_BUDGETS_MS = {
+    "scrape": 300,     # requests + bs4
+    "worker": 300,
+    "analyze": 1500,   # pandas + matplotlib + seaborn
+    "notify": 80,
+    "export": 30,      # pandas dopiero przy zapisie pliku
+    "search": 30,
+    "tag": 80,
+}
+
+NOTIFY_TIMEOUT = 120   # s – ile czekamy na wysłanie kolejki powiadomień przed wyjściem
+
+
+def _flush_notifications():
+    from notifier import get_notification_queue
+    queue = get_notification_queue()
+    if not queue.flush(NOTIFY_TIMEOUT):
+        print("[WARN] Nie wszystkie powiadomienia zostały wysłane przed zakończeniem.")
+    print(f"[INFO] Wysłano e-maili: {queue.sent_messages}")
+
+
+def _print_summary(summary):
+    print(f"[INFO] Pobrano {summary['offers']} ofert (w wynikach {summary['cards']}, "
+          f"pominięto {summary['skipped']}, błędy {summary['errors']}), "
+          f"pasujących {summary['matching']}, do powiadomienia {summary['queued']}")
+    if summary["queued"]:
+        _flush_notifications()
+
+
+def cmd_scrape(args):
+    import metrics
+    from pipeline import run_scrape
+    from utils import load_config, parse_tags
+
+    config = load_config()
+    locations = None
+    if args.location:
+        known = {entry["location"]: entry["tags"] for entry in config["locations"]}
+        tags = parse_tags(args.tags) if args.tags else None
+        locations = [{"location": loc, "tags": tags or known.get(loc, config["tags"])}
+                     for loc in args.location]
+
+    crawl_kwargs = {}
+    if args.base_url:
+        crawl_kwargs["base_url"] = args.base_url
+    if args.max_pages:
+        crawl_kwargs["max_pages"] = args.max_pages
+    cache = None
+    if args.cache:
+        from http_cache import HttpCache
+        cache = HttpCache()
+
+    with metrics.profile(args.profile):
+        summary = run_scrape(config, locations, parallel=False if args.serial or cache else None,
+                             incremental=not args.full, notify=not args.no_notify, cache=cache,
+                             durable=args.durable, **crawl_kwargs)
+    _print_summary(summary)
+    metrics.export(event="cli_scrape")
+    return 0
+
+
+def cmd_worker(args):
+    import metrics
+    from pipeline import run_queue_worker
+
+    worker_kwargs = {}
+    if args.concurrency:
+        worker_kwargs["concurrency"] = args.concurrency
+    if args.rate_limit:
+        worker_kwargs["rate_limit"] = args.rate_limit
+    with metrics.profile(args.profile):
+        summary = run_queue_worker(notify=not args.no_notify, wait=not args.no_wait, **worker_kwargs)
+    _print_summary(summary)
+    metrics.export(event="cli_worker")
+    return 0
+
+
+def cmd_analyze(args):
+    from analyzer import analyze_all, available_charts
+
+    if args.list:
+        for name in available_charts():
+            print(name)
+        return 0
+    paths = analyze_all(day=args.day, extra=args.extra or ())
+    for path in paths:
+        print(path)
+    return 0 if paths else 1
+
+
+def cmd_notify(args):
+    from pipeline import run_notify
+
+    summary = run_notify(day=args.day, since=args.since)
+    print(f"[INFO] Dopasowania fraz: {summary['matching']}, obniżki cen: {summary['price_drops']}, "
+          f"nowych do powiadomienia: {summary['queued']}")
+    if summary["queued"]:
+        _flush_notifications()
+    return 0
+
+
+def cmd_export(args):
+    from utils import export_offers_to_excel
+
+    print(export_offers_to_excel(args.day, args.path))
+    return 0
+
+
+def _offer_line(offer):
+    return (f"{offer.get('price', '')} | {offer.get('Liczba pokoi', '-')} pok. | "
+            f"{offer.get('Powierzchnia', '-')} | {offer.get('title', '')} | {offer.get('url', '')}")
+
+
+def _query_filters(args):
+    filters = {}
+    for key in ("day", "since", "location", "min_price", "max_price", "rooms"):
+        value = getattr(args, key, None)
+        if value is not None:
+            filters[key] = value
+    return filters
+
+
+def cmd_search(args):
+    import time
+    from utils import search_offers
+
+    start = time.perf_counter()
+    try:
+        offers, total = search_offers(args.query, args.limit, **_query_filters(args))
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return 2
+    for offer in offers:
+        print(_offer_line(offer))
+    print(f"[INFO] Znaleziono {total} ofert, pokazano {len(offers)} "
+          f"({(time.perf_counter() - start) * 1000:.1f} ms)")
+    return 0
+
+
+def cmd_tag(args):
+    from pipeline import run_retag
+
+    summary = run_retag(args.phrase, notify=args.notify, fold_diacritics=args.fold,
+                        whole_words=args.whole_words, **_query_filters(args))
+    for offer in summary["offers"]:
+        print(f"{', '.join(offer['tags'])} | {_offer_line(offer)}")
+    print(f"[INFO] Zapisanych ofert z frazami: {summary['matching']}, "
+          f"nowych do powiadomienia: {summary['queued']}")
+    if summary["queued"]:
+        _flush_notifications()
+    return 0
+
+
+def _add_query_filters(p):
+    p.add_argument("--day", help="tylko oferty widziane w dniu RRRR-MM-DD")
+    p.add_argument("--since", help="tylko oferty widziane od (ISO data/czas)")
+    p.add_argument("--location", help="prefiks lokalizacji, np. mazowieckie/warszawa")
+    p.add_argument("--min-price", type=int, help="cena od (zł)")
+    p.add_argument("--max-price", type=int, help="cena do (zł)")
+    p.add_argument("--rooms", type=int, help="liczba pokoi")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Otodom Scraper – interfejs wiersza poleceń")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("scrape", help="pobierz oferty dla lokalizacji z config.txt (lub --location)")
+    p.add_argument("--location", action="append", help="lokalizacja (można podać kilka razy)")
+    p.add_argument("--tags", help="frazy dla --location, oddzielone przecinkami")
+    p.add_argument("--full", action="store_true", help="pobierz wszystkie ogłoszenia, nie tylko nowe/zmienione")
+    p.add_argument("--serial", action="store_true", help="lokalizacje po kolei zamiast w osobnych procesach")
+    p.add_argument("--max-pages", type=int, help="najwyżej tyle stron wyników na lokalizację")
+    p.add_argument("--base-url", help="adres serwisu (np. lokalny serwer testowy z bench_server.py)")
+    p.add_argument("--cache", action="store_true", help="użyj dyskowej pamięci podręcznej HTTP")
+    p.add_argument("--no-notify", action="store_true", help="nie wysyłaj powiadomień")
+    p.add_argument("--durable", action="store_true",
+                   help="crawl przez trwałą kolejkę zadań (wznawianie po przerwaniu, pracownicy 'worker')")
+    p.add_argument("--profile", choices=["cprofile", "tracemalloc"], help="profiluj ten przebieg")
+    p.set_defaults(func=cmd_scrape)
+
+    p = sub.add_parser("worker", help="dołącz do niezakończonych crawli z trwałej kolejki (scrape --durable)")
+    p.add_argument("--concurrency", type=int, help="ile podstron pobierać jednocześnie")
+    p.add_argument("--rate-limit", type=float, help="maks. zapytań/s tego pracownika")
+    p.add_argument("--no-wait", action="store_true", help="zakończ, gdy w kolejce nie ma wolnych zadań")
+    p.add_argument("--no-notify", action="store_true", help="nie wysyłaj powiadomień")
+    p.add_argument("--profile", choices=["cprofile", "tracemalloc"], help="profiluj ten przebieg")
+    p.set_defaults(func=cmd_worker)
+
+    p = sub.add_parser("analyze", help="wygeneruj wykresy z zapisanych ofert")
+    p.add_argument("--day", help="dzień RRRR-MM-DD (domyślnie dziś)")
+    p.add_argument("--extra", action="append", help="dodatkowy wykres z wtyczek (można podać kilka razy)")
+    p.add_argument("--list", action="store_true", help="pokaż dostępne wykresy")
+    p.set_defaults(func=cmd_analyze)
+
+    p = sub.add_parser("notify", help="wyślij powiadomienia z zapisanych ofert i historii cen")
+    p.add_argument("--day", help="dzień RRRR-MM-DD (domyślnie dziś)")
+    p.add_argument("--since", help="obniżki cen od (ISO data/czas, domyślnie ostatnie 24 h)")
+    p.set_defaults(func=cmd_notify)
+
+    p = sub.add_parser("export", help="eksportuj oferty do pliku Excel")
+    p.add_argument("--day", help="dzień RRRR-MM-DD (domyślnie dziś)")
+    p.add_argument("--path", help="ścieżka pliku (domyślnie data/oferty_<dzień>.xlsx)")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("search", help="wyszukiwanie pełnotekstowe w zapisanych ofertach")
+    p.add_argument("query", help='zapytanie, np. "blisko metra" AND balkon*, metr*, garaż NOT parter')
+    p.add_argument("--limit", type=int, default=20, help="ile ofert pokazać (domyślnie 20)")
+    _add_query_filters(p)
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser("tag", help="dopasuj nowe frazy do ofert już zapisanych (bez scrapowania)")
+    p.add_argument("phrase", nargs="+", help="fraza (można podać kilka)")
+    p.add_argument("--fold", action="store_true", help="ignoruj polskie znaki we frazach")
+    p.add_argument("--whole-words", action="store_true", help="frazy tylko jako całe słowa")
+    p.add_argument("--notify", action="store_true", help="wyślij powiadomienia o znalezionych ofertach")
+    _add_query_filters(p)
+    p.set_defaults(func=cmd_tag)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
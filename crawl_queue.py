@@ -0,0 +1,408 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from contextlib import contextmanager
+from scraper import (BASE_URL, DEFAULT_CONCURRENCY, DEFAULT_RATE_LIMIT, NOT_MODIFIED, apply_seen,
+                     fetch_detail, format_report, http_get, make_session, parse_listing_cards, search_url)
+from seen_index import SeenIndex
+from http_cache import CacheMiss
+from request_policy import AdaptiveRateLimiter, RequestPolicy
+from utils import save_offers, matches_location
+import metrics
+
+QUEUE_PATH = "data/crawl_queue.db"
+LEASE_SECONDS = 60          # s – po tylu sekundach bez odnowienia zadanie wraca do kolejki
+                            # (pracownik odnawia dzierżawę co LEASE_SECONDS / 3, póki pracuje)
+BATCH_SIZE = 72             # ile zadań pracownik bierze naraz i zatwierdza jednym zapisem
+MAX_ATTEMPTS = 3            # po tylu nieudanych próbach zadanie trafia do "failed"
+POLL_INTERVAL = 2.0         # s – co ile czekający pracownik sprawdza kolejkę
+PRUNE_DAYS = 7              # zadania zakończonych crawli starszych niż tyle dni są usuwane
+
+LISTING = "listing"         # strona wyników
+DETAIL = "detail"           # podstrona ogłoszenia
+
+
+class CrawlQueue:
+    """
+    Trwała kolejka zadań crawla w SQLite (data/crawl_queue.db):
+      - crawls – jeden wpis na crawl lokalizacji (niezakończony crawl tej samej
+                 lokalizacji jest wznawiany, a nie zaczynany od strony 1),
+      - tasks  – zadania "listing" (strona wyników) i "detail" (podstrona ogłoszenia);
+                 (crawl, rodzaj, url) jest unikalne, więc to samo ogłoszenie nie trafi
+                 do kolejki dwa razy.
+    Pracownik dzierżawi partię zadań (lease) na LEASE_SECONDS i odnawia dzierżawę
+    (renew), póki nad nimi pracuje; zadania przerwanego pracownika dostaje kolejny
+    najpóźniej po LEASE_SECONDS.
+    Z kolejki może naraz korzystać wiele procesów – także na kilku maszynach,
+    jeśli plik bazy leży na wspólnym dysku z poprawnym blokowaniem plików.
+    Czas dzierżawy liczymy z zegara ściennego, więc zegary maszyn muszą być zgodne.
+    """
+
+    def __init__(self, path=QUEUE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Transakcje otwieramy sami (BEGIN IMMEDIATE), żeby dzierżawa była atomowa między procesami
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS crawls (
+                id INTEGER PRIMARY KEY,
+                location TEXT,
+                base_url TEXT,
+                max_pages INTEGER,
+                incremental INTEGER,
+                started_at REAL,
+                finished_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY,
+                crawl_id INTEGER,
+                kind TEXT,
+                url TEXT,
+                payload TEXT,
+                status TEXT DEFAULT 'pending',
+                attempts INTEGER DEFAULT 0,
+                lease_owner TEXT,
+                lease_until REAL,
+                error TEXT,
+                UNIQUE (crawl_id, kind, url)
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, crawl_id);
+            """
+        )
+
+    @contextmanager
+    def _write(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self._conn
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def start_crawl(self, location, base_url=BASE_URL, max_pages=None, incremental=True):
+        """
+        Zwraca id crawla lokalizacji: niezakończonego (wznowienie od ostatniego
+        zatwierdzonego stanu, z jego pierwotnymi max_pages/incremental) albo nowego,
+        z zadaniem pierwszej strony wyników.
+        """
+        with self._write() as conn:
+            conn.execute(
+                """
+                DELETE FROM tasks WHERE crawl_id IN (
+                    SELECT id FROM crawls WHERE finished_at < ?
+                )
+                """,
+                (time.time() - PRUNE_DAYS * 86400,)
+            )
+            row = conn.execute(
+                """
+                SELECT id FROM crawls WHERE location = ? AND base_url = ? AND finished_at IS NULL
+                ORDER BY id DESC LIMIT 1
+                """,
+                (location, base_url)
+            ).fetchone()
+            if row is not None:
+                crawl_id = row[0]
+            else:
+                crawl_id = conn.execute(
+                    "INSERT INTO crawls (location, base_url, max_pages, incremental, started_at) VALUES (?, ?, ?, ?, ?)",
+                    (location, base_url, max_pages, int(bool(incremental)), time.time())
+                ).lastrowid
+                self._insert(conn, [(crawl_id, LISTING, search_url(location, 1, base_url),
+                                     {"page": 1, "previous": []})])
+        if row is not None:
+            progress = self.progress(crawl_id)
+            print(f"[INFO] Wznawiam crawl #{crawl_id} ({location}): wykonane zadania "
+                  f"{progress.get('done', 0)}/{sum(progress.values())}")
+        return crawl_id
+
+    def crawl(self, crawl_id):
+        """
+        Ustawienia crawla jako słownik {id, location, base_url, max_pages, incremental}.
+        """
+        row = self._conn.execute(
+            "SELECT id, location, base_url, max_pages, incremental FROM crawls WHERE id = ?", (crawl_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"Nie ma crawla #{crawl_id}")
+        return dict(zip(("id", "location", "base_url", "max_pages", "incremental"), row))
+
+    def lease(self, worker, limit=BATCH_SIZE, crawl_ids=None, lease_seconds=LEASE_SECONDS):
+        """
+        Dzierżawi do 'limit' zadań (oczekujących albo z wygasłą dzierżawą) dla
+        pracownika 'worker'; strony wyników mają pierwszeństwo, żeby kolejne zadania
+        trafiały do kolejki jak najwcześniej. Zwraca listę słowników
+        {id, crawl_id, kind, url, payload}.
+        """
+        now = time.time()
+        crawl_filter, params = self._crawl_filter(crawl_ids)
+        with self._write() as conn:
+            # Zadanie, przy którym pracownik ginął MAX_ATTEMPTS razy, nie wraca do kolejki
+            conn.execute(
+                f"""
+                UPDATE tasks SET status = 'failed', error = 'dzierżawa wygasła', lease_owner = NULL
+                WHERE status = 'leased' AND lease_until < ? AND attempts >= ? {crawl_filter}
+                """,
+                [now, MAX_ATTEMPTS] + params
+            )
+            rows = conn.execute(
+                f"""
+                SELECT id, crawl_id, kind, url, payload FROM tasks
+                WHERE (status = 'pending' OR (status = 'leased' AND lease_until < ?)) {crawl_filter}
+                ORDER BY kind = '{LISTING}' DESC, id
+                LIMIT ?
+                """,
+                [now] + params + [limit]
+            ).fetchall()
+            conn.executemany(
+                "UPDATE tasks SET status = 'leased', lease_owner = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                [(worker, now + lease_seconds, row[0]) for row in rows]
+            )
+        return [
+            {"id": task_id, "crawl_id": crawl_id, "kind": kind, "url": url, "payload": json.loads(payload)}
+            for task_id, crawl_id, kind, url, payload in rows
+        ]
+
+    def renew(self, worker, task_ids, lease_seconds=LEASE_SECONDS):
+        """
+        Przedłuża dzierżawę zadań 'task_ids' pracownika 'worker'.
+        """
+        with self._write() as conn:
+            conn.executemany(
+                "UPDATE tasks SET lease_until = ? WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                [(time.time() + lease_seconds, task_id, worker) for task_id in task_ids]
+            )
+
+    def commit(self, worker, done=(), retry=(), new_tasks=()):
+        """
+        Zatwierdza wyniki partii jednym zapisem (punkt kontrolny crawla):
+          - done      – id wykonanych zadań,
+          - retry     – pary (id, błąd): zadanie wraca do kolejki albo, po MAX_ATTEMPTS
+                        próbach, trafia do "failed",
+          - new_tasks – krotki (crawl_id, rodzaj, url, payload) – np. następna strona
+                        wyników i podstrony ogłoszeń; znane zadania są pomijane.
+        Zmiany dotyczą tylko zadań wciąż dzierżawionych przez 'worker' (po wygaśnięciu
+        dzierżawy zadanie mógł już przejąć inny pracownik).
+        """
+        with self._write() as conn:
+            conn.executemany(
+                """
+                UPDATE tasks SET status = 'done', lease_owner = NULL, lease_until = NULL
+                WHERE id = ? AND lease_owner = ? AND status = 'leased'
+                """,
+                [(task_id, worker) for task_id in done]
+            )
+            conn.executemany(
+                f"""
+                UPDATE tasks SET status = CASE WHEN attempts >= {MAX_ATTEMPTS} THEN 'failed' ELSE 'pending' END,
+                                 error = ?, lease_owner = NULL, lease_until = NULL
+                WHERE id = ? AND lease_owner = ? AND status = 'leased'
+                """,
+                [(str(error), task_id, worker) for task_id, error in retry]
+            )
+            self._insert(conn, new_tasks)
+
+    def active_crawls(self, crawl_ids=None):
+        """
+        Oznacza jako zakończone crawle bez oczekujących i dzierżawionych zadań;
+        zwraca id pozostałych (niezakończonych).
+        """
+        crawl_filter, params = self._crawl_filter(crawl_ids, column="id")
+        with self._write() as conn:
+            conn.execute(
+                f"""
+                UPDATE crawls SET finished_at = ?
+                WHERE finished_at IS NULL {crawl_filter} AND NOT EXISTS (
+                    SELECT 1 FROM tasks WHERE tasks.crawl_id = crawls.id AND status IN ('pending', 'leased')
+                )
+                """,
+                [time.time()] + params
+            )
+            return [crawl_id for (crawl_id,) in conn.execute(
+                f"SELECT id FROM crawls WHERE finished_at IS NULL {crawl_filter} ORDER BY id", params
+            )]
+
+    def progress(self, crawl_id):
+        """
+        Liczba zadań crawla według stanu: {"pending": ..., "leased": ..., "done": ..., "failed": ...}.
+        """
+        return dict(self._conn.execute(
+            "SELECT status, COUNT(*) FROM tasks WHERE crawl_id = ? GROUP BY status", (crawl_id,)
+        ))
+
+    @staticmethod
+    def _crawl_filter(crawl_ids, column="crawl_id"):
+        if crawl_ids is None:
+            return "", []
+        crawl_ids = list(crawl_ids)
+        return f"AND {column} IN ({','.join('?' * len(crawl_ids)) or 'NULL'})", crawl_ids
+
+    @staticmethod
+    def _insert(conn, tasks):
+        conn.executemany(
+            "INSERT OR IGNORE INTO tasks (crawl_id, kind, url, payload) VALUES (?, ?, ?, ?)",
+            [(crawl_id, kind, url, json.dumps(payload)) for crawl_id, kind, url, payload in tasks]
+        )
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _fetch_listing(session, limiter, url, base_url, cache, policy):
+    # Wołane w wątku roboczym; błąd strony wyników → wyjątek (zadanie wraca do kolejki)
+    try:
+        resp = http_get(session, limiter, url, cache, policy=policy)
+    except CacheMiss:
+        return []
+    if resp.status_code != 200:
+        raise RuntimeError(f"HTTP {resp.status_code} dla {url}")
+    with metrics.timer("parse_seconds", page="listing"):
+        return parse_listing_cards(resp.text, base_url)
+
+
+def _listing_tasks(task, crawl, cards, index, stats):
+    """
+    Nowe zadania ze strony wyników: następna strona (jeśli ta nie jest pusta ani nie
+    powtarza poprzedniej, i nie przekroczono max_pages) oraz podstrony pasujących
+    ogłoszeń – w crawlu przyrostowym tylko nowych i zmienionych (jak scraper.iter_offers).
+    """
+    page = task["payload"]["page"]
+    previous = set(task["payload"]["previous"])
+    new_cards = [card for card in cards if card["url"] not in previous]
+    if not new_cards:
+        return []
+    tasks = []
+    if crawl["max_pages"] is None or page < crawl["max_pages"]:
+        tasks.append((crawl["id"], LISTING, search_url(crawl["location"], page + 1, crawl["base_url"]),
+                      {"page": page + 1, "previous": [card["url"] for card in cards]}))
+    for card in new_cards:
+        if not matches_location(card["list_location"], crawl["location"]):
+            continue
+        stats["cards"] += 1
+        if crawl["incremental"]:
+            entry = index.get(card["url"])
+            if entry and entry["fingerprint"] == card["fingerprint"]:
+                index.stage_unchanged(card["url"])
+                stats["skipped"] += 1
+                continue
+        tasks.append((crawl["id"], DETAIL, card["url"], card))
+    return tasks
+
+
+def run_worker(queue, crawl_ids=None, worker=None, concurrency=DEFAULT_CONCURRENCY,
+               rate_limit=DEFAULT_RATE_LIMIT, batch_size=BATCH_SIZE, on_batch=None, stats=None,
+               cache=None, limiter=None, policy=None, wait=True):
+    """
+    Pracownik kolejki crawla: dzierżawi partie zadań (crawle 'crawl_ids', domyślnie
+    wszystkie niezakończone), wykonuje je pulą 'concurrency' wątków i po każdej partii:
+      1. zapisuje pobrane oferty (save_offers) i woła on_batch(location, oferty),
+      2. zapisuje zmiany indeksu widzianych ogłoszeń z tej partii (apply_seen) –
+         po błędzie zapisu są porzucane, a nie zatwierdzane,
+      3. zatwierdza partię w kolejce (wykonane zadania + nowe zadania).
+    Przerwany pracownik traci najwyżej bieżącą partię – jej zadania po wygaśnięciu
+    dzierżawy wykona ponownie ten lub inny pracownik (zapis ofert jest idempotentny).
+    Gdy kolejka chwilowo jest pusta, a inni pracownicy mają zadania w toku, czeka
+    (wait=True) – ich strony wyników mogą dodać nowe zadania.
+    Limit 'rate_limit' dotyczy jednego pracownika.
+    Liczniki w 'stats' jak w scraper.iter_offers. Zwraca liczbę zapisanych ofert.
+    """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    concurrency = max(1, int(concurrency))
+    session = make_session(concurrency)
+    limiter = limiter or AdaptiveRateLimiter(rate_limit)
+    policy = policy or RequestPolicy()
+    stats = stats if stats is not None else {}
+    for key in ("cards", "fetched", "skipped", "not_modified", "errors"):
+        stats.setdefault(key, 0)
+    index = SeenIndex()
+    crawls = {}
+    total = 0
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while True:
+                tasks = queue.lease(worker, batch_size, crawl_ids)
+                if not tasks:
+                    if not queue.active_crawls(crawl_ids) or not wait:
+                        break
+                    time.sleep(POLL_INTERVAL)
+                    continue
+
+                futures = []
+                for task in tasks:
+                    if task["crawl_id"] not in crawls:
+                        crawls[task["crawl_id"]] = queue.crawl(task["crawl_id"])
+                    crawl = crawls[task["crawl_id"]]
+                    if task["kind"] == LISTING:
+                        futures.append(pool.submit(_fetch_listing, session, limiter, task["url"],
+                                                   crawl["base_url"], cache, policy))
+                        continue
+                    entry = index.get(task["url"]) if crawl["incremental"] else None
+                    futures.append(pool.submit(fetch_detail, session, limiter, task["payload"],
+                                               index.conditional_headers(entry), cache,
+                                               entry is not None, policy))
+
+                # Długa partia (ponowienia, wolny serwer) nie traci dzierżawy
+                while wait_futures(futures, timeout=LEASE_SECONDS / 3).not_done:
+                    queue.renew(worker, [task["id"] for task in tasks])
+
+                done, retry, new_tasks, offers = [], [], [], {}
+                for task, future in zip(tasks, futures):
+                    crawl = crawls[task["crawl_id"]]
+                    if task["kind"] == LISTING:
+                        try:
+                            cards = future.result()
+                        except Exception as e:
+                            metrics.count_error("listing_page", e)
+                            print(f"[WARN] Strona wyników {task['url']} nie została pobrana: {e}")
+                            retry.append((task["id"], e))
+                            continue
+                        new_tasks.extend(_listing_tasks(task, crawl, cards, index, stats))
+                        done.append(task["id"])
+                        continue
+
+                    offer, resp_headers = future.result()
+                    if offer is None:
+                        stats["errors"] += 1
+                        retry.append((task["id"], "błąd pobrania podstrony"))
+                        continue
+                    stats["not_modified" if offer is NOT_MODIFIED else "fetched"] += 1
+                    if crawl["incremental"]:
+                        card = task["payload"]
+                        index.stage(card["url"], card["fingerprint"], card["price"],
+                                    resp_headers.get("ETag"), resp_headers.get("Last-Modified"))
+                        if offer is NOT_MODIFIED:
+                            index.stage_unchanged(card["url"])
+                    if offer is not NOT_MODIFIED:
+                        offers.setdefault(crawl["location"], []).append(offer)
+                    done.append(task["id"])
+
+                for location, batch in offers.items():
+                    save_offers(batch)
+                    if on_batch is not None:
+                        on_batch(location, batch)
+                    total += len(batch)
+                apply_seen(index, index.take_staged())
+                queue.commit(worker, done, retry, new_tasks)
+                metrics.inc("crawl_queue_tasks_total", len(done), result="done")
+                metrics.inc("crawl_queue_tasks_total", len(retry), result="retry")
+    except BaseException:
+        # Oferty z bieżącej partii nie zostały zapisane – ich zmian w indeksie też nie zatwierdzamy
+        index.rollback()
+        raise
+    finally:
+        session.close()
+        index.close()
+        print(format_report(stats))
+    return total
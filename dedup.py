@@ -0,0 +1,225 @@
+import hashlib
+import os
+import re
+import sqlite3
+import unicodedata
+import zlib
+from offer_model import parse_area, parse_number
+import metrics
+
+DEDUP_PATH = "data/dedup.db"
+NUM_PERM = 64               # długość sygnatury MinHash
+BANDS = 16                  # LSH: 16 pasm po 4 wartości → kandydaci od podobieństwa ok. 0.5
+TEXT_THRESHOLD = 0.8        # podobieństwo tekstu wystarczające do uznania za duplikat
+SPEC_THRESHOLD = 0.5        # niższy próg, gdy zgadza się też powierzchnia i cena
+AREA_TOLERANCE = 0.03       # ±3% powierzchni
+PRICE_TOLERANCE = 0.15      # ±15% ceny (ten sam lokal bywa wystawiany z różną prowizją)
+MAX_CANDIDATES = 200        # najwyżej tylu kandydatów sprawdzamy dla jednej oferty
+SHINGLE_SIZE = 2            # n-gramy słów
+
+_PRIME = 4294967311         # liczba pierwsza > 2^32 (permutacje MinHash: (a·h + b) mod p)
+_POLISH = str.maketrans("łŁ", "lL")
+
+
+def _fold(text):
+    # "Słoneczne ŁÓDŹ" → "sloneczne lodz" (bez znaków diakrytycznych, małe litery)
+    text = unicodedata.normalize("NFKD", str(text).translate(_POLISH))
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def shingles(offer):
+    """
+    Zbiór n-gramów słów (SHINGLE_SIZE) z tytułu i opisu oferty, po ujednoliceniu
+    wielkości liter i znaków diakrytycznych.
+    """
+    description = offer.get("description") or ""
+    if description == "brak":
+        description = ""
+    words = re.findall(r"\w+", _fold(f"{offer.get('title', '')} {description}"))
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+class NearDuplicateIndex:
+    """
+    Wykrywanie tego samego mieszkania pod różnymi adresami (inne biuro, ponowne
+    wystawienie): MinHash z n-gramów tytułu i opisu + indeks LSH w SQLite (data/dedup.db).
+      - docs  – jedna sygnatura na ogłoszenie (url) z ceną, powierzchnią i cluster_id,
+      - bands – klucze pasm LSH (indeks główny), więc kandydatów dla nowej oferty
+                szukamy kilkunastoma odczytami indeksu, a nie porównaniem ze wszystkimi.
+    Kandydat jest duplikatem, gdy podobieństwo tekstu (ułamek zgodnych wartości
+    sygnatury) ≥ TEXT_THRESHOLD, albo ≥ SPEC_THRESHOLD przy zgodnej powierzchni i cenie;
+    różna powierzchnia wyklucza duplikat. cluster_id to id pierwszego ogłoszenia
+    w grupie – stały także po zmianie treści ogłoszenia.
+    """
+
+    def __init__(self, path=DEDUP_PATH, num_perm=NUM_PERM, bands=BANDS, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm musi być wielokrotnością bands")
+        import numpy as np   # tylko przy wykrywaniu duplikatów (szybki start CLI)
+        self._np = np
+        self.num_perm = num_perm
+        self.bands = bands
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY,
+                url TEXT UNIQUE,
+                cluster_id INTEGER,
+                price INTEGER,
+                area REAL,
+                fingerprint TEXT,
+                signature BLOB
+            );
+            CREATE INDEX IF NOT EXISTS idx_docs_cluster ON docs(cluster_id);
+            CREATE TABLE IF NOT EXISTS bands (
+                key INTEGER,
+                doc_id INTEGER,
+                PRIMARY KEY (key, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_bands_doc ON bands(doc_id);
+            """
+        )
+        self._conn.commit()
+
+    def signature(self, shingle_set):
+        """
+        Sygnatura MinHash (tablica NUM_PERM liczb) zbioru n-gramów.
+        """
+        np = self._np
+        if not shingle_set:
+            return np.full(self.num_perm, _PRIME, dtype=np.uint64)
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingle_set),
+                             dtype=np.uint64, count=len(shingle_set))
+        # (a·h + b) mieści się w uint64, bo a, b, h < 2^32
+        return ((np.outer(hashes, self._a) + self._b) % _PRIME).min(axis=0)
+
+    def _band_keys(self, sig):
+        rows = self.num_perm // self.bands
+        return [
+            int.from_bytes(hashlib.blake2b(bytes([band]) + sig[band * rows:(band + 1) * rows].tobytes(),
+                                           digest_size=8).digest(), "little", signed=True)
+            for band in range(self.bands)
+        ]
+
+    def assign(self, offers):
+        """
+        Nadaje ofertom z partii "cluster_id" (to samo mieszkanie = ten sam cluster_id),
+        a duplikatom także "duplicate_of" (url pierwszego ogłoszenia w grupie).
+        Oferty z partii trafiają od razu do indeksu, więc wykrywamy też duplikaty
+        w obrębie jednej partii. Zwraca liczbę wykrytych duplikatów.
+        """
+        duplicates = 0
+        with metrics.timer("dedup_seconds"), self._conn:
+            for offer in offers:
+                url = offer.get("url")
+                if not url:
+                    continue
+                cluster_id, canonical = self._assign_one(offer, url)
+                offer["cluster_id"] = cluster_id
+                if canonical != url:
+                    offer["duplicate_of"] = canonical
+                    duplicates += 1
+        metrics.inc("duplicate_offers_total", duplicates)
+        return duplicates
+
+    def _assign_one(self, offer, url):
+        price = parse_number(offer.get("price"))
+        area = parse_area(offer.get("Powierzchnia"))
+        shingle_set = shingles(offer)
+        fingerprint = hashlib.blake2b(
+            "\n".join(sorted(shingle_set) + [str(price), str(area)]).encode("utf-8"), digest_size=16
+        ).hexdigest()
+
+        row = self._conn.execute("SELECT id, cluster_id, fingerprint FROM docs WHERE url = ?", (url,)).fetchone()
+        if row is not None and row[2] == fingerprint:
+            return row[1], self._canonical(row[1])
+
+        sig = self.signature(shingle_set)
+        keys = self._band_keys(sig)
+        if row is not None:
+            # Zmieniona treść: nowa sygnatura, ta sama grupa
+            doc_id, cluster_id = row[0], row[1]
+            self._conn.execute(
+                "UPDATE docs SET price = ?, area = ?, fingerprint = ?, signature = ? WHERE id = ?",
+                (price, area, fingerprint, sig.tobytes(), doc_id)
+            )
+            self._conn.execute("DELETE FROM bands WHERE doc_id = ?", (doc_id,))
+        else:
+            cluster_id = self._match(sig, keys, price, area) if shingle_set else None
+            doc_id = self._conn.execute(
+                "INSERT INTO docs (url, cluster_id, price, area, fingerprint, signature) VALUES (?, ?, ?, ?, ?, ?)",
+                (url, cluster_id, price, area, fingerprint, sig.tobytes())
+            ).lastrowid
+            if cluster_id is None:
+                cluster_id = doc_id
+                self._conn.execute("UPDATE docs SET cluster_id = ? WHERE id = ?", (doc_id, doc_id))
+        if shingle_set:
+            self._conn.executemany("INSERT OR IGNORE INTO bands (key, doc_id) VALUES (?, ?)",
+                                   [(key, doc_id) for key in keys])
+        return cluster_id, self._canonical(cluster_id)
+
+    def _match(self, sig, keys, price, area):
+        # Najlepszy kandydat z pasm LSH spełniający progi → jego cluster_id (albo None)
+        np = self._np
+        rows = self._conn.execute(
+            f"""
+            SELECT d.cluster_id, d.price, d.area, d.signature FROM docs d
+            WHERE d.id IN (SELECT DISTINCT doc_id FROM bands WHERE key IN ({','.join('?' * len(keys))})
+                           ORDER BY doc_id DESC LIMIT {MAX_CANDIDATES})
+            """,
+            keys
+        ).fetchall()
+        metrics.observe("dedup_candidates", len(rows))
+        best, best_score = None, 0.0
+        for cluster_id, other_price, other_area, blob in rows:
+            if area and other_area and abs(area - other_area) > AREA_TOLERANCE * max(area, other_area):
+                continue
+            score = float(np.mean(np.frombuffer(blob, dtype=np.uint64) == sig))
+            specs_match = (area and other_area and price and other_price
+                           and abs(price - other_price) <= PRICE_TOLERANCE * max(price, other_price))
+            if score >= (SPEC_THRESHOLD if specs_match else TEXT_THRESHOLD) and score > best_score:
+                best, best_score = cluster_id, score
+        return best
+
+    def _canonical(self, cluster_id):
+        row = self._conn.execute("SELECT url FROM docs WHERE id = ?", (cluster_id,)).fetchone()
+        return row[0] if row else None
+
+    def cluster(self, url):
+        """
+        Wszystkie znane adresy tego samego mieszkania (łącznie z 'url'), od najstarszego.
+        """
+        return [u for (u,) in self._conn.execute(
+            "SELECT url FROM docs WHERE cluster_id = (SELECT cluster_id FROM docs WHERE url = ?) ORDER BY id",
+            (url,)
+        )]
+
+    def backfill(self, days):
+        """
+        Jednorazowo indeksuje oferty zapisane w magazynie w podanych dniach
+        (kolejno, od najstarszego). Zwraca liczbę wykrytych duplikatów.
+        """
+        from storage import get_store
+        duplicates = 0
+        with get_store() as store:
+            for day in days:
+                duplicates += self.assign(store.read_offers(day))
+        return duplicates
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
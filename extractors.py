@@ -0,0 +1,312 @@
+import html as html_lib
+import json
+import os
+import re
+import threading
+import time
+from bs4 import BeautifulSoup
+import metrics
+
+try:
+    import lxml.html
+except ImportError:  # lxml jest opcjonalny – bez niego zostaje ścieżka BeautifulSoup
+    lxml = None
+
+REFERENCE = "soup"
+# Kolejność wybrana przez calibrate_extractors na nagranych stronach (patrz EXTRACTOR_ORDER)
+ORDER_PATH = "data/extractor_order.json"
+
+# Statystyki czasu parsowania z bieżącego procesu: nazwa → [liczba stron, sekundy]
+_parse_stats = {}
+_stats_lock = threading.Lock()
+
+_NEXT_DATA_RE = re.compile(
+    r'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.DOTALL
+)
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def extract_soup(html):
+    """
+    Ścieżka referencyjna – selektory CSS BeautifulSoup ("html.parser").
+    Zwraca słownik pól: title, price, price_per_m2, location (lub None), description, details.
+    """
+    det_soup = BeautifulSoup(html, "html.parser")
+
+    # 2.1. Tytuł ogłoszenia
+    title_el = det_soup.select_one('h1[data-cy="adPageAdTitle"]')
+    title = title_el.get_text(strip=True) if title_el else "brak"
+
+    # 2.2. Cena
+    price_el = det_soup.select_one('strong[data-cy="adPageHeaderPrice"]')
+    price = price_el.get_text(strip=True) if price_el else "brak"
+
+    # 2.3. Cena za m²
+    price_m2_el = det_soup.select_one('div[aria-label="Cena za metr kwadratowy"]')
+    price_per_m2 = price_m2_el.get_text(strip=True) if price_m2_el else "brak"
+
+    # 2.4. Dokładna lokalizacja (MapLink → <a> wewnątrz)
+    maplink_el = det_soup.select_one('div[data-sentry-component="MapLink"] a')
+    location = maplink_el.get_text(strip=True) if maplink_el else None
+
+    # 2.5. Opis ogłoszenia
+    desc_container = det_soup.select_one('div[data-cy="adPageAdDescription"]')
+    description = desc_container.get_text(" ", strip=True) if desc_container else "brak"
+
+    # 2.6. Specyfikacja – wszystkie etykieta→wartość z ItemGridContainer
+    #     Każdy wiersz to <div data-sentry-element="ItemGridContainer">
+    #       <p data-sentry-element="Item">Label:</p>
+    #       <p class="...">Value</p>
+    #     </div>
+    details = {}
+    for container in det_soup.select('div[data-sentry-element="ItemGridContainer"]'):
+        ps = container.select('p')
+        if len(ps) >= 2:
+            label = ps[0].get_text(strip=True).rstrip(":").strip()
+            # ps[1] może zawierać &nbsp; lub kolejne fragmenty, zbierz cały tekst
+            value = ps[1].get_text(" ", strip=True)
+            details[label] = value
+
+    return {
+        "title": title,
+        "price": price,
+        "price_per_m2": price_per_m2,
+        "location": location,
+        "description": description,
+        "details": details,
+    }
+
+
+def _lxml_strings(el):
+    # Odpowiednik tekstu z bs4: bez komentarzy, skryptów i stylów
+    if isinstance(el.tag, str) and el.tag not in ("script", "style") and el.text:
+        yield el.text
+    for child in el:
+        yield from _lxml_strings(child)
+        if child.tail:
+            yield child.tail
+
+
+def _lxml_text(el, separator=""):
+    # Jak bs4 get_text(separator, strip=True)
+    return separator.join(s.strip() for s in _lxml_strings(el) if s.strip())
+
+
+def _lxml_first(root, xpath):
+    found = root.xpath(xpath)
+    return found[0] if found else None
+
+
+def extract_lxml(html):
+    """
+    Szybka ścieżka: te same selektory co extract_soup, ale przez parser lxml i XPath.
+    Zwraca None, jeśli lxml nie jest zainstalowany.
+    """
+    if lxml is None:
+        return None
+    root = lxml.html.fromstring(html)
+
+    title_el = _lxml_first(root, '//h1[@data-cy="adPageAdTitle"]')
+    price_el = _lxml_first(root, '//strong[@data-cy="adPageHeaderPrice"]')
+    price_m2_el = _lxml_first(root, '//div[@aria-label="Cena za metr kwadratowy"]')
+    maplink_el = _lxml_first(root, '//div[@data-sentry-component="MapLink"]//a')
+    desc_container = _lxml_first(root, '//div[@data-cy="adPageAdDescription"]')
+
+    details = {}
+    for container in root.xpath('//div[@data-sentry-element="ItemGridContainer"]'):
+        ps = container.xpath('.//p')
+        if len(ps) >= 2:
+            label = _lxml_text(ps[0]).rstrip(":").strip()
+            details[label] = _lxml_text(ps[1], " ")
+
+    return {
+        "title": _lxml_text(title_el) if title_el is not None else "brak",
+        "price": _lxml_text(price_el) if price_el is not None else "brak",
+        "price_per_m2": _lxml_text(price_m2_el) if price_m2_el is not None else "brak",
+        "location": _lxml_text(maplink_el) if maplink_el is not None else None,
+        "description": _lxml_text(desc_container, " ") if desc_container is not None else "brak",
+        "details": details,
+    }
+
+
+def _html_to_text(fragment):
+    # Tekst z fragmentu HTML (opis w JSON-ie) jak bs4 get_text(" ", strip=True):
+    # przycięte fragmenty tekstu między znacznikami, połączone pojedynczą spacją
+    strings = (html_lib.unescape(s).strip() for s in _TAG_RE.split(fragment or ""))
+    return " ".join(s for s in strings if s)
+
+
+def extract_next_data(html):
+    """
+    Najszybsza ścieżka: stan strony osadzony w <script id="__NEXT_DATA__"> (Next.js).
+    Zwraca None, jeśli strona nie zawiera tego skryptu albo ogłoszenia w nim,
+    wtedy używany jest kolejny ekstraktor. Układ props.pageProps.ad nie pochodzi
+    z dokumentacji, dlatego ścieżka jest używana dopiero, gdy calibrate_extractors
+    potwierdzi na nagranych stronach zgodność z referencją.
+    """
+    match = _NEXT_DATA_RE.search(html)
+    if not match:
+        return None
+    try:
+        ad = json.loads(match.group(1))["props"]["pageProps"]["ad"]
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not ad or not ad.get("title"):
+        return None
+
+    characteristics = {}
+    details = {}
+    for item in ad.get("characteristics") or []:
+        value = item.get("localizedValue") or item.get("value") or ""
+        characteristics[item.get("key")] = value
+        if item.get("key") not in ("price", "price_per_m") and item.get("label"):
+            details[item["label"]] = value
+
+    address = (ad.get("location") or {}).get("address") or {}
+    street = address.get("street") or {}
+    parts = [
+        " ".join(p for p in (street.get("name"), street.get("number")) if p),
+        (address.get("district") or {}).get("name"),
+        (address.get("city") or {}).get("name"),
+        (address.get("province") or {}).get("name"),
+    ]
+    location = ", ".join(p for p in parts if p) or None
+
+    return {
+        "title": ad["title"].strip(),
+        "price": characteristics.get("price") or "brak",
+        "price_per_m2": characteristics.get("price_per_m") or "brak",
+        "location": location,
+        "description": _html_to_text(ad.get("description")) or "brak",
+        "details": details,
+    }
+
+
+EXTRACTORS = {
+    "next_data": extract_next_data,
+    "lxml": extract_lxml,
+    "soup": extract_soup,
+}
+
+
+def _load_order():
+    # Bez kalibracji tylko ścieżka referencyjna – szybsze ekstraktory włącza dopiero
+    # calibrate_extractors, gdy na nagranych stronach dają identyczne pola
+    try:
+        with open(ORDER_PATH, encoding="utf-8") as f:
+            order = [name for name in json.load(f)["order"] if name in EXTRACTORS]
+    except (OSError, ValueError, KeyError, TypeError):
+        order = []
+    return order if REFERENCE in order else order + [REFERENCE]
+
+
+# Kolejność, w jakiej próbujemy ekstraktorów; pierwszy, który zwróci wynik, wygrywa.
+EXTRACTOR_ORDER = _load_order()
+
+
+def register_extractor(name, func, position=None):
+    """
+    Dodaje własny ekstraktor func(html) → słownik pól albo None.
+    'position' – miejsce w EXTRACTOR_ORDER (domyślnie przed ścieżką referencyjną).
+    """
+    EXTRACTORS[name] = func
+    if name not in EXTRACTOR_ORDER:
+        if position is None:
+            position = EXTRACTOR_ORDER.index(REFERENCE) if REFERENCE in EXTRACTOR_ORDER else len(EXTRACTOR_ORDER)
+        EXTRACTOR_ORDER.insert(position, name)
+
+
+def extract_fields(html, order=None):
+    """
+    Próbuje ekstraktorów w kolejności 'order' (domyślnie EXTRACTOR_ORDER)
+    i zwraca (nazwa, pola) pierwszego, który zwrócił wynik.
+    Czas parsowania trafia do statystyk parse_time_report().
+    """
+    for name in order or EXTRACTOR_ORDER:
+        start = time.perf_counter()
+        fields = EXTRACTORS[name](html)
+        elapsed = time.perf_counter() - start
+        if fields is not None:
+            _record(name, elapsed)
+            return name, fields
+    raise ValueError("Żaden ekstraktor nie rozpoznał strony")
+
+
+def _record(name, elapsed):
+    metrics.observe("parse_seconds", elapsed, page="detail", backend=name)
+    with _stats_lock:
+        entry = _parse_stats.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+
+
+def parse_time_report(reset=False):
+    """
+    Zwraca statystyki parsowania z bieżącego procesu:
+    {nazwa: {"pages": n, "total_s": s, "per_page_ms": ms}}.
+    """
+    with _stats_lock:
+        report = {
+            name: {
+                "pages": count,
+                "total_s": round(seconds, 4),
+                "per_page_ms": round(1000 * seconds / count, 3) if count else 0.0,
+            }
+            for name, (count, seconds) in _parse_stats.items()
+        }
+        if reset:
+            _parse_stats.clear()
+    return report
+
+
+def compare_extractors(pages, reference=REFERENCE):
+    """
+    Uruchamia każdy ekstraktor na tych samych stronach HTML ('pages') i porównuje
+    wyniki ze ścieżką referencyjną. Zwraca raport:
+      {nazwa: {"pages": ile rozpoznał, "per_page_ms": ..., "identical": bool}}
+    oraz klucz "fastest_identical" – najszybszy ekstraktor zgodny z referencją.
+    """
+    expected = [EXTRACTORS[reference](page) for page in pages]
+    report = {}
+    for name, func in EXTRACTORS.items():
+        start = time.perf_counter()
+        results = [func(page) for page in pages]
+        elapsed = time.perf_counter() - start
+        recognized = [r for r in results if r is not None]
+        report[name] = {
+            "pages": len(recognized),
+            "per_page_ms": round(1000 * elapsed / max(1, len(pages)), 3),
+            "identical": bool(recognized) and all(
+                r is None or r == e for r, e in zip(results, expected)
+            ),
+        }
+    candidates = [n for n, r in report.items() if r["identical"] and r["pages"] == len(pages)]
+    report["fastest_identical"] = min(candidates, key=lambda n: report[n]["per_page_ms"]) if candidates else None
+    return report
+
+
+def calibrate_extractors(pages, path=ORDER_PATH):
+    """
+    Wybiera kolejność ekstraktorów na podstawie compare_extractors na nagranych
+    stronach ('pages', np. podstrony z HttpCache.pages("detail")): najpierw, od
+    najszybszego, te, które dały pola identyczne z referencją na każdej rozpoznanej
+    stronie, na końcu ścieżka referencyjna. Ustawia EXTRACTOR_ORDER, zapisuje
+    kolejność i raport do 'path' (wczytywane przy imporcie) i zwraca raport
+    compare_extractors z dodatkowym kluczem "order".
+    """
+    pages = list(pages)
+    if not pages:
+        raise ValueError("Brak nagranych stron do kalibracji ekstraktorów")
+    report = compare_extractors(pages)
+    verified = sorted(
+        (name for name, row in report.items()
+         if name not in ("fastest_identical", REFERENCE) and row["identical"]),
+        key=lambda name: report[name]["per_page_ms"]
+    )
+    EXTRACTOR_ORDER[:] = verified + [REFERENCE]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"order": EXTRACTOR_ORDER, "pages": len(pages), "report": report}, f,
+                  ensure_ascii=False, indent=2)
+    report["order"] = list(EXTRACTOR_ORDER)
+    return report
@@ -1,73 +1,107 @@
 import tkinter as tk
-from tkinter import scrolledtext
-from utils import save_config, load_config, read_saved_offers
-import threading
-import schedule
-import time
-from scraper import get_offers
-from analyzer import tag_offers
-from notifier import send_email
+import webbrowser
+from tkinter import ttk
+from utils import save_config, load_config, read_offers_page, export_offers_to_excel, format_location_line
+from job_scheduler import JobScheduler
+from pipeline import run_scrape, schedule_scrapes
+from http_cache import HttpCache
+from tasks import TaskRunner
+import metrics
 import datetime
 import os
 
-running = False
+scheduler = None   # harmonogram scrapera (job_scheduler.JobScheduler), jeden na cały GUI
+http_cache = None  # pamięć podręczna odpowiedzi HTTP, wspólna dla wszystkich zadań scrapera
 
+PAGE_SIZE = 50   # wierszy na stronę w podglądzie ofert
 
-def start_scraper_loop(status_label):
+
+def start_scraper_loop(status_label, runner=None):
     """
-    Funkcja uruchamiana w tle (w dodatkowym wątku), która:
-      - natychmiast pobiera oferty (job()),
-      - potem co 1 godzinę ponawia job().
-    W każdej iteracji job():
-      - pobiera konfigurację (location, tags, email),
-      - wywołuje get_offers(location),
-      - filtruje tag_offers(offers, tags),
-      - wysyła e-maila, jeśli znalazło się coś dopasowanego,
-      - aktualizuje status_label w GUI.
+    Uruchamia harmonogram scrapera w tle (job_scheduler.JobScheduler):
+      - osobne zadanie dla każdej lokalizacji z konfiguracji, z jej własnym odstępem
+        ("lokalizacja | frazy | 30m", domyślnie co 1 godzinę) i losowym rozrzutem terminów,
+      - lokalizacja bez zapisanego stanu rusza od razu, pozostałe wracają do swoich
+        terminów z data/scheduler.db (ponowne otwarcie GUI nie scrapuje wszystkiego od nowa),
+      - ponowne "Start" tylko aktualizuje zadania (nie dubluje ich), a przebieg danej
+        lokalizacji nigdy nie nakłada się na poprzedni.
+    Każdy przebieg:
+      - wywołuje wspólny przebieg pipeline.run_scrape dla swojej lokalizacji: crawl_offers
+        (wszystkie strony wyników, zapis partiami, podstrony tylko dla nowych lub zmienionych
+        ogłoszeń), tag_offers dla każdej partii, obniżki cen z historii cen
+        i powiadomienie e-mail w tle o nowych dopasowanych ofertach,
+      - aktualizuje status_label w GUI (przez runner.post – wątek roboczy nie dotyka
+        widżetów bezpośrednio) i na bieżąco pokazuje postęp po każdej partii.
+    Odpowiedzi HTTP trafiają do dyskowej pamięci podręcznej (jednej na cały GUI –
+    kolejne "Start" jej nie otwierają ponownie), więc ponowny start scrapera chwilę
+    po zatrzymaniu nie pobiera tych samych stron jeszcze raz.
     """
-    def job():
-        if not running:
-            return
-        try:
-            config = load_config()
-            status_label.config(text="⏳ Pobieranie ofert...")
-            offers = get_offers(config["location"])
-
-            if not offers:
-                status_label.config(text="⚠️ Brak ofert (lista była pusta).")
-                return
-
-            tagged = tag_offers(offers, config["tags"])
-            matching = [o for o in tagged if o.get("tags")]
-
-            if matching:
-                body = "\n\n".join([f"{o['title']}\n{o['url']}" for o in matching])
-                send_email(
-                    "Nowe oferty Otodom",
-                    body,
-                    config["notify_email"],
-                    config["login_email"],
-                    config["email_password"]
-                )
-                status_label.config(text=f"✅ Wysłano {len(matching)} ofert spełniających kryteria.")
-            else:
-                status_label.config(text=f"ℹ️ Pobrano {len(offers)} ofert, brak dopasowań.")
-
-        except Exception as e:
-            status_label.config(text=f"❌ Błąd scrapera: {str(e)}")
-
-    def run():
-        job()  # natychmiast na start
-        schedule.every(1).hours.do(job)
-        while running:
-            schedule.run_pending()
-            time.sleep(60)
-
-    threading.Thread(target=run, daemon=True).start()
+    global scheduler, http_cache
+    if http_cache is None:
+        http_cache = HttpCache()
+    cache = http_cache
+
+    def set_status(text):
+        if runner is not None:
+            runner.post(status_label.config, text=text)
+        else:
+            status_label.config(text=text)
+
+    def make_job(entry):
+        location = entry["location"]
+
+        def job():
+            try:
+                set_status(f"⏳ {location}: pobieranie ofert...")
+
+                def progress(location, stats, matching):
+                    set_status(f"⏳ {location}: pobrano {stats.get('fetched', 0)} ofert, "
+                               f"{matching} pasuje do fraz...")
+
+                summary = run_scrape(locations=[entry], parallel=False, incremental=True,
+                                     cache=cache, on_progress=progress)
+
+                if not summary["cards"]:
+                    set_status(f"⚠️ {location}: brak ofert (lista była pusta).")
+                elif summary["matching"]:
+                    set_status(f"✅ {location}: {summary['matching']} ofert spełnia kryteria, "
+                               f"{summary['queued']} nowych do powiadomienia.")
+                else:
+                    set_status(f"ℹ️ {location}: pobrano {summary['offers']} ofert "
+                               f"(pominięto {summary['skipped']} bez zmian), brak dopasowań.")
+
+            except Exception as e:
+                set_status(f"❌ Błąd scrapera ({location}): {str(e)}")
+                raise   # błąd zlicza i loguje harmonogram
+            finally:
+                metrics.export(event="job", location=location)
+        return job
+
+    if scheduler is None:
+        scheduler = JobScheduler()
+    try:
+        schedule_scrapes(scheduler, make_job)
+    except (OSError, IndexError, ValueError) as e:
+        set_status(f"❌ Błąd konfiguracji: {e}")
+        return
+    scheduler.start()
+
+
+def stop_scraper_loop():
+    # Kolejne terminy nie wystartują; trwający przebieg kończy się normalnie
+    if scheduler is not None:
+        scheduler.stop()
+
+
+def close_http_cache():
+    # Przy zamykaniu GUI: zapisuje zaległe czasy użycia wpisów i zamyka bazę
+    global http_cache
+    if http_cache is not None:
+        http_cache.close()
+        http_cache = None
 
 
 def start_gui():
-    global running
 
     # Wczytaj istniejącą konfigurację (lub puste domyślne wartości)
     if os.path.exists("config.txt"):
@@ -78,11 +112,13 @@ def start_gui():
             "tags": [],
             "notify_email": "",
             "login_email": "",
-            "email_password": ""
+            "email_password": "",
+            "locations": []
         }
 
     root = tk.Tk()
     root.title("Otodom Scraper")
+    runner = TaskRunner(root)
 
     # ======= POLA KONFIGURACJI =======
     tk.Label(root, text="Lokalizacja (np. mazowieckie/warszawa):").pack()
@@ -95,6 +131,12 @@ def start_gui():
     tags_entry.insert(0, ", ".join(config.get("tags", [])))
     tags_entry.pack()
 
+    tk.Label(root, text="Dodatkowe lokalizacje (jedna na linię, np. malopolskie/krakow | balkon, winda | 30m):").pack()
+    locations_text = tk.Text(root, width=50, height=3)
+    extra_locations = config.get("locations", [])[1 if config.get("location", "").strip() else 0:]
+    locations_text.insert("1.0", "\n".join(format_location_line(loc) for loc in extra_locations))
+    locations_text.pack()
+
     tk.Label(root, text="Email do powiadomień:").pack()
     email_entry = tk.Entry(root, width=50)
     email_entry.insert(0, config.get("notify_email", ""))
@@ -116,7 +158,8 @@ def start_gui():
             tags_entry.get(),
             email_entry.get(),
             login_entry.get(),
-            password_entry.get()
+            password_entry.get(),
+            locations_text.get("1.0", tk.END).splitlines()
         )
         info_label.config(text="✅ Zapisano konfigurację.")
 
@@ -129,72 +172,162 @@ def start_gui():
     status_label.pack()
 
     def start_scraper(status_label=status_label):
-        global running
-        running = True
         info_label.config(text="🟢 Scrapowanie rozpoczęte")
-        start_scraper_loop(status_label)
+        start_scraper_loop(status_label, runner)
 
     def stop_scraper():
-        global running
-        running = False
+        stop_scraper_loop()
         info_label.config(text="🔴 Scrapowanie zatrzymane")
 
     tk.Button(root, text="▶ Start scrapera", command=start_scraper).pack()
     tk.Button(root, text="■ Stop scrapera", command=stop_scraper).pack()
 
-    # ======= PODGLĄD OSTATNICH OFERT =======
-    def show_offers():
-        offers = read_saved_offers()
-        output.delete(1.0, tk.END)
+    # ======= PODGLĄD OFERT (STRONICOWANY) =======
+    # Widok wczytuje z magazynu tylko bieżącą stronę (PAGE_SIZE wierszy, najnowsze
+    # pierwsze) w tle, więc działa płynnie także przy dziesiątkach tysięcy ofert.
+    # Filtry i sortowanie (kliknięcie nagłówka) wykonuje zapytanie po indeksach magazynu;
+    # pole "Szukaj" przeszukuje indeks pełnotekstowy tytułów i opisów.
+    filters_frame = tk.Frame(root)
+    filter_entries = {}
+    for key, label, width in (("min_price", "Cena od:", 9), ("max_price", "do:", 9), ("rooms", "Pokoje:", 3),
+                              ("location", "Lokalizacja:", 20), ("tag", "Fraza:", 14),
+                              ("text", "Szukaj:", 20)):
+        tk.Label(filters_frame, text=label).pack(side=tk.LEFT)
+        filter_entries[key] = tk.Entry(filters_frame, width=width)
+        filter_entries[key].pack(side=tk.LEFT)
+    filters_frame.pack()
+
+    columns = ("title", "location", "price", "rooms", "area")
+    headings = ("Tytuł", "Lokalizacja", "Cena", "Pokoje", "Powierzchnia")
+    offers_frame = tk.Frame(root)
+    offers_tree = ttk.Treeview(offers_frame, columns=columns, show="headings", height=12)
+    # Kolumna widoku → kolumna sortowania w magazynie (storage.QUERY_COLUMNS)
+    sort_columns = {"title": "title", "location": "location_key", "price": "price",
+                    "rooms": "rooms", "area": "area"}
+    for col, heading, width in zip(columns, headings, (280, 180, 100, 60, 90)):
+        offers_tree.heading(col, text=heading, command=lambda col=col: sort_offers(col))
+        offers_tree.column(col, width=width, anchor=tk.W)
+    offers_scroll = ttk.Scrollbar(offers_frame, orient=tk.VERTICAL, command=offers_tree.yview)
+    offers_tree.configure(yscrollcommand=offers_scroll.set)
+    offers_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    offers_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+
+    page_state = {"page": 0, "total": 0, "sort": None}
+    row_urls = {}
+
+    def current_filters():
+        # Wątek GUI: odczyt pól filtrów; niepoprawne liczby są pomijane
+        values = {key: entry.get().strip() for key, entry in filter_entries.items()}
+        filters = {}
+        for key in ("min_price", "max_price", "rooms"):
+            if values[key].replace(" ", "").isdigit():
+                filters[key] = int(values[key].replace(" ", ""))
+        if values["location"]:
+            filters["location"] = values["location"]
+        if values["tag"]:
+            filters["tags"] = [values["tag"]]
+        if values["text"]:
+            # Indeks pełnotekstowy: "blisko metra", metr*, balkon OR taras, garaż NOT parter
+            filters["text"] = values["text"]
+        return filters
+
+    def load_page(progress, page, sort, filters):
+        offers, total = read_offers_page(offset=page * PAGE_SIZE, limit=PAGE_SIZE, sort=sort, **filters)
+        return page, offers, total
+
+    def show_page(result):
+        page, offers, total = result
+        page_state.update(page=page, total=total)
+        offers_tree.delete(*offers_tree.get_children())
+        row_urls.clear()
+        for o in offers:
+            item = offers_tree.insert("", tk.END, values=(
+                o.get("title", ""), o.get("location", ""), o.get("price", ""),
+                o.get("Liczba pokoi", ""), o.get("Powierzchnia", "")
+            ))
+            row_urls[item] = o.get("url", "")
+        pages = max(1, -(-total // PAGE_SIZE))
+        page_label.config(text=f"Strona {page + 1} z {pages} ({total} ofert)")
         if not offers:
-            output.insert(tk.END, "Brak ofert do wyświetlenia.")
-            return
-
-        # Wyświetlamy np. 10 ostatnich wierszy
-        for o in offers[-10:]:
-            # Pokazujemy kilka najważniejszych pól: tytuł, lokalizacja, cena, pokoi, powierzchnia, url
-            line = (
-                f"{o.get('title','')}\n"
-                f"Lokalizacja: {o.get('location','')}\n"
-                f"Cena: {o.get('price','')} | Pokoje: {o.get('Liczba pokoi','')} | "
-                f"Powierzchnia: {o.get('Powierzchnia','')}\n"
-                f"URL: {o.get('url','')}\n\n"
-            )
-            output.insert(tk.END, line)
-
-    tk.Button(root, text="📄 Pokaż ostatnie ogłoszenia", command=show_offers).pack()
-    output = scrolledtext.ScrolledText(root, height=15, width=80)
-    output.pack()
+            page_label.config(text="Brak ofert do wyświetlenia.")
+
+    def show_offers(page=0):
+        pages = max(1, -(-page_state["total"] // PAGE_SIZE))
+        page = max(0, min(page, pages - 1)) if page_state["total"] else 0
+        page_label.config(text="⏳ Wczytywanie...")
+        runner.submit(load_page, page, page_state["sort"], current_filters(), on_done=show_page, name="offers",
+                      on_error=lambda e: page_label.config(text=f"❌ Błąd odczytu: {e}"))
+
+    def sort_offers(col):
+        # Kolejne kliknięcie tego samego nagłówka odwraca kierunek
+        column = sort_columns[col]
+        page_state["sort"] = f"-{column}" if page_state["sort"] == column else column
+        show_offers(0)
+
+    def open_offer(event):
+        url = row_urls.get(offers_tree.focus())
+        if url:
+            webbrowser.open(url)
+
+    offers_tree.bind("<Double-1>", open_offer)
+
+    def export_excel():
+        info_label.config(text="⏳ Eksport do Excela...")
+        runner.submit(lambda progress: export_offers_to_excel(), name="export",
+                      on_done=lambda path: info_label.config(text=f"✅ Wyeksportowano oferty do {path}"),
+                      on_error=lambda e: info_label.config(text=f"❌ Błąd eksportu: {e}"))
+
+    nav = tk.Frame(root)
+    tk.Button(nav, text="📄 Pokaż ostatnie ogłoszenia", command=show_offers).pack(side=tk.LEFT)
+    tk.Button(nav, text="◀", command=lambda: show_offers(page_state["page"] - 1)).pack(side=tk.LEFT)
+    tk.Button(nav, text="▶", command=lambda: show_offers(page_state["page"] + 1)).pack(side=tk.LEFT)
+    page_label = tk.Label(nav, text="")
+    page_label.pack(side=tk.LEFT)
+    nav.pack()
+    tk.Button(root, text="💾 Eksportuj do Excela", command=export_excel).pack()
+    offers_frame.pack(fill=tk.BOTH, expand=True)
 
     # ======= ANALIZA DANYCH I WYKRESY =======
-    def analyze_and_show():
+    def render_charts(progress, extra):
+        # Wątek roboczy: analiza (pandas + seaborn); niezmienione wykresy są brane
+        # z pamięci podręcznej, a wszystkie mają już rozmiar wyświetlania
         from analyzer import analyze_all
-        analyze_all()  # nie przekazujemy argumentu
 
-        from PIL import Image, ImageTk
+        progress("⏳ Analiza danych...")
+        return analyze_all(extra=extra)
 
+    def show_charts(paths):
+        # Wątek GUI: tylko wczytanie gotowych PNG i okno (bez skalowania)
+        info_label.config(text="✅ Analiza zakończona.")
+        if not paths:
+            info_label.config(text="⚠️ Brak danych do wykresów.")
+            return
         top = tk.Toplevel(root)
         top.title("Wykresy analizy")
+        for path in paths:
+            tk_img = tk.PhotoImage(file=path)
+            lbl = tk.Label(top, image=tk_img)
+            lbl.image = tk_img
+            lbl.pack()
 
-        # Lista plików wygenerowanych przez analyzer.py
-        filenames = [
-            "1_price_vs_rooms.png",
-            "2_rooms_vs_price_per_room.png",
-            "3_floor_distribution.png",
-        ]
-        for fname in filenames:
-            path = f"wykresy/{fname}"
-            if os.path.exists(path):
-                img = Image.open(path)
-                img = img.resize((500, 300))
-                tk_img = ImageTk.PhotoImage(img)
-                lbl = tk.Label(top, image=tk_img)
-                lbl.image = tk_img
-                lbl.pack()
+    extra_charts_var = tk.BooleanVar(value=False)
 
+    def analyze_and_show():
+        extra = ("price_per_m2_by_district", "time_on_market") if extra_charts_var.get() else ()
+        started = runner.submit(render_charts, extra, name="analyze", on_done=show_charts,
+                                on_progress=lambda text: info_label.config(text=text),
+                                on_error=lambda e: info_label.config(text=f"❌ Błąd analizy: {e}"))
+        if not started:
+            info_label.config(text="⏳ Analiza już trwa...")
+
+    tk.Checkbutton(root, text="Dodatkowe wykresy (dzielnice, czas na rynku)",
+                   variable=extra_charts_var).pack()
     tk.Button(root, text="📊 Analizuj dane", command=analyze_and_show).pack()
 
     root.mainloop()
+    runner.close()
+    stop_scraper_loop()
+    close_http_cache()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,228 @@
+import datetime
+import glob
+import os
+import sqlite3
+from offer_model import parse_number
+from seen_index import INDEX_PATH
+
+HISTORY_PATH = "data/history.db"
+
+
+class PriceHistory:
+    """
+    Historia cen ogłoszeń między dniami (SQLite, data/history.db):
+      - listings     – jeden wiersz na ogłoszenie (url): pierwsze i ostatnie widzenie,
+                       ostatnia cena, tytuł, lokalizacja,
+      - observations – szereg czasowy (url, observed_at, price, price_per_m2);
+                       nowy wiersz dopisujemy tylko przy nowym ogłoszeniu albo zmianie
+                       ceny, więc kolejne przebiegi bez zmian nic nie dopisują.
+    Zapytania price_changes(since) i gone_since(since) korzystają z indeksów
+    (url, observed_at) i last_seen, bez wczytywania dziennych plików.
+    """
+
+    def __init__(self, path=HISTORY_PATH, seen_index_path=INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.seen_index_path = seen_index_path
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS listings (
+                url TEXT PRIMARY KEY,
+                first_seen TEXT,
+                last_seen TEXT,
+                price INTEGER,
+                price_per_m2 INTEGER,
+                title TEXT,
+                location TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_listings_last_seen ON listings(last_seen);
+            CREATE TABLE IF NOT EXISTS observations (
+                id INTEGER PRIMARY KEY,
+                url TEXT,
+                observed_at TEXT,
+                price INTEGER,
+                price_per_m2 INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_observations_url ON observations(url, observed_at);
+            CREATE INDEX IF NOT EXISTS idx_observations_time ON observations(observed_at);
+            """
+        )
+        self._conn.commit()
+
+    def record(self, offers, observed_at=None):
+        """
+        Zapisuje obserwacje z partii ofert (dopisuje tylko zmiany).
+        Oferta ze zmienioną ceną dostaje klucz "price_change" = {"old", "new", "old_per_m2",
+        "new_per_m2", "since"}; ta sama lista zmian jest zwracana.
+        """
+        observed_at = observed_at or datetime.datetime.now().isoformat(timespec="seconds")
+        by_url = {o["url"]: o for o in offers if o.get("url")}
+        if not by_url:
+            return []
+
+        known = {}
+        urls = list(by_url)
+        for i in range(0, len(urls), 500):
+            chunk = urls[i:i + 500]
+            rows = self._conn.execute(
+                f"SELECT url, last_seen, price, price_per_m2 FROM listings "
+                f"WHERE url IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            known.update((url, (last_seen, price, per_m2)) for url, last_seen, price, per_m2 in rows)
+
+        new_observations = []
+        changes = []
+        for url, offer in by_url.items():
+            price = parse_number(offer.get("price"))
+            per_m2 = parse_number(offer.get("price_per_m2"))
+            previous = known.get(url)
+            if previous is None:
+                new_observations.append((url, observed_at, price, per_m2))
+            elif (price, per_m2) != previous[1:]:
+                new_observations.append((url, observed_at, price, per_m2))
+                if price is not None and previous[1] is not None and price != previous[1]:
+                    change = {"old": previous[1], "new": price, "old_per_m2": previous[2],
+                              "new_per_m2": per_m2, "since": previous[0]}
+                    offer["price_change"] = change
+                    changes.append(dict(change, url=url, title=offer.get("title", "")))
+
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO observations (url, observed_at, price, price_per_m2) VALUES (?, ?, ?, ?)",
+                new_observations
+            )
+            self._conn.executemany(
+                """
+                INSERT INTO listings (url, first_seen, last_seen, price, price_per_m2, title, location)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    last_seen = excluded.last_seen,
+                    price = excluded.price,
+                    price_per_m2 = excluded.price_per_m2,
+                    title = excluded.title,
+                    location = excluded.location
+                """,
+                [
+                    (url, observed_at, observed_at, parse_number(o.get("price")),
+                     parse_number(o.get("price_per_m2")), o.get("title", ""), o.get("location", ""))
+                    for url, o in by_url.items()
+                ]
+            )
+        return changes
+
+    def price_changes(self, since):
+        """
+        Zmiany cen zaobserwowane od 'since' (ISO data/czas):
+        lista słowników {url, title, observed_at, old, new, change_pct}, najnowsze pierwsze.
+        """
+        rows = self._conn.execute(
+            """
+            SELECT c.url, c.observed_at, c.prev_price, c.price, l.title FROM (
+                SELECT url, observed_at, price,
+                       LAG(price) OVER (PARTITION BY url ORDER BY observed_at, id) AS prev_price
+                FROM observations
+                WHERE url IN (SELECT url FROM observations WHERE observed_at >= ?)
+            ) c
+            LEFT JOIN listings l ON l.url = c.url
+            WHERE c.observed_at >= ? AND c.prev_price IS NOT NULL AND c.price IS NOT NULL
+              AND c.price != c.prev_price
+            ORDER BY c.observed_at DESC
+            """,
+            (since, since)
+        )
+        return [
+            {"url": url, "title": title, "observed_at": at, "old": old, "new": new,
+             "change_pct": round((new - old) / old * 100, 2) if old else None}
+            for url, at, old, new, title in rows
+        ]
+
+    def gone_since(self, since):
+        """
+        Ogłoszenia, których nie widzieliśmy od 'since' (ISO data/czas): lista słowników
+        {url, title, location, first_seen, last_seen, price, days_on_market}.
+        Uwzględnia też indeks widzianych ogłoszeń (seen_index) – w trybie przyrostowym
+        niezmienione ogłoszenia nie są pobierane, ale są tam odnotowane.
+        """
+        query = "SELECT l.url, l.title, l.location, l.first_seen, l.last_seen, l.price FROM listings l"
+        params = [since]
+        attached = os.path.exists(self.seen_index_path)
+        if attached:
+            self._conn.execute("ATTACH DATABASE ? AS seen_db", (self.seen_index_path,))
+            query += " LEFT JOIN seen_db.seen s ON s.url = l.url"
+        query += " WHERE l.last_seen < ?"
+        if attached:
+            query += " AND (s.last_seen IS NULL OR s.last_seen < ?)"
+            params.append(since)
+        try:
+            rows = self._conn.execute(query + " ORDER BY l.last_seen DESC", params).fetchall()
+        finally:
+            if attached:
+                self._conn.execute("DETACH DATABASE seen_db")
+        return [
+            {"url": url, "title": title, "location": location, "first_seen": first, "last_seen": last,
+             "price": price, "days_on_market": _days_between(first, last)}
+            for url, title, location, first, last, price in rows
+        ]
+
+    def observations(self, url):
+        """
+        Pełna historia jednego ogłoszenia: lista (observed_at, price, price_per_m2).
+        """
+        return self._conn.execute(
+            "SELECT observed_at, price, price_per_m2 FROM observations WHERE url = ? ORDER BY observed_at, id",
+            (url,)
+        ).fetchall()
+
+    def backfill_excel(self, pattern="data/oferty_*.xlsx"):
+        """
+        Jednorazowo odtwarza historię z dawnych dziennych plików Excel (w kolejności dni).
+        Zwraca liczbę wczytanych wierszy.
+        """
+        import pandas as pd
+        total = 0
+        for path in sorted(glob.glob(pattern)):
+            day = os.path.basename(path)[len("oferty_"):-len(".xlsx")]
+            df = pd.read_excel(path)
+            offers = [
+                {key: val for key, val in row.items() if not pd.isna(val)}
+                for row in df.to_dict(orient="records")
+            ]
+            self.record(offers, observed_at=f"{day}T00:00:00")
+            total += len(offers)
+            print(f"[INFO] Historia cen: wczytano {path}")
+        return total
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def price_drops(offers, min_drop_pct=0.0):
+    """
+    Oferty z partii, których cena spadła (co najmniej o 'min_drop_pct' %) – wyzwalacz
+    powiadomień obok dopasowań fraz. Każda zwrócona oferta ma własny "notify_key"
+    (url + nowa cena), więc o każdej kolejnej obniżce powiadamiamy osobno.
+    """
+    drops = []
+    for offer in offers:
+        change = offer.get("price_change")
+        if not change or change["new"] >= change["old"]:
+            continue
+        if (change["old"] - change["new"]) / change["old"] * 100 < min_drop_pct:
+            continue
+        drops.append(dict(offer, notify_key=f"{offer['url']}#price={change['new']}"))
+    return drops
+
+
+def _days_between(first, last):
+    try:
+        return (datetime.datetime.fromisoformat(last) - datetime.datetime.fromisoformat(first)).days
+    except (TypeError, ValueError):
+        return None
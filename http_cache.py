@@ -0,0 +1,217 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+CACHE_DIR = "cache/http"
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024   # łączny limit rozmiaru skompresowanych treści
+
+# Czas ważności wpisu (sekundy) dla klas adresów; None = bez wygasania
+DEFAULT_TTLS = {
+    "search": 15 * 60,        # strony wyników zmieniają się często
+    "detail": 24 * 60 * 60,   # podstrony ogłoszeń rzadko
+}
+
+
+class CacheMiss(Exception):
+    """
+    Brak strony w pamięci podręcznej w trybie replay_only.
+    """
+
+
+class CachedResponse:
+    """
+    Minimalny odpowiednik requests.Response zwracany z pamięci podręcznej.
+    """
+
+    def __init__(self, url, text, status_code=200, headers=None):
+        self.url = url
+        self.text = text
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.from_cache = True
+
+
+def url_class(url):
+    """
+    Klasa adresu do wyboru TTL: "search" (strona wyników) albo "detail".
+    """
+    return "search" if "/pl/wyniki/" in url else "detail"
+
+
+class HttpCache:
+    """
+    Dyskowa pamięć podręczna odpowiedzi HTTP (treść adresowana skrótem SHA-256).
+      - treści są zapisywane skompresowane (zlib) w plikach cache/http/ab/abcd...,
+        identyczne treści pod różnymi URL-ami zajmują miejsce tylko raz,
+      - indeks URL → treść jest w SQLite (cache/http/index.db),
+      - wpisy wygasają po TTL zależnym od klasy adresu (DEFAULT_TTLS),
+      - gdy łączny rozmiar przekroczy max_bytes, usuwane są najdawniej używane wpisy (LRU);
+        czasy użycia z get() są zbierane w pamięci i zapisywane razem z put(), close()
+        albo co 'commit_every' trafień (jak SeenIndex), a nie przy każdym trafieniu,
+      - replay_only=True: żadnych zapytań do sieci, ignorujemy TTL, a brak wpisu
+        kończy się wyjątkiem CacheMiss (do powtarzalnych przebiegów i benchmarków).
+    Bezpieczna dla wielu wątków.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, ttls=None, replay_only=False,
+                 commit_every=100):
+        self.directory = directory
+        self.commit_every = commit_every
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.replay_only = replay_only
+        self.hits = 0
+        self.misses = 0
+        self._accessed = {}   # url → czas ostatniego trafienia, jeszcze niezapisany
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                body_hash TEXT,
+                size INTEGER,
+                stored_at REAL,
+                last_access REAL,
+                url_class TEXT
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)")
+        self._conn.commit()
+        self._total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT body_hash, size FROM entries)"
+        ).fetchone()[0]
+
+    def get(self, url):
+        """
+        Zwraca CachedResponse dla 'url' albo None (brak wpisu lub wpis wygasł).
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body_hash, stored_at, url_class FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+            if row is not None:
+                body_hash, stored_at, klass = row
+                ttl = self.ttls.get(klass)
+                if not self.replay_only and ttl is not None and time.time() - stored_at > ttl:
+                    row = None
+            if row is None:
+                self.misses += 1
+                return None
+            try:
+                with open(self._body_path(body_hash), "rb") as f:
+                    text = zlib.decompress(f.read()).decode("utf-8")
+            except (OSError, zlib.error):
+                self.misses += 1
+                return None
+            self._accessed[url] = time.time()
+            if len(self._accessed) >= self.commit_every:
+                self._flush_access()
+                self._conn.commit()
+            self.hits += 1
+        return CachedResponse(url, text)
+
+    def put(self, url, text):
+        """
+        Zapisuje treść odpowiedzi dla 'url' i w razie potrzeby usuwa najstarsze wpisy.
+        """
+        data = text.encode("utf-8")
+        body_hash = hashlib.sha256(data).hexdigest()
+        path = self._body_path(body_hash)
+        now = time.time()
+        with self._lock:
+            if not os.path.exists(path):
+                compressed = zlib.compress(data, 6)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(compressed)
+                os.replace(tmp_path, path)
+                size = len(compressed)
+                self._total += size
+            else:
+                size = os.path.getsize(path)
+            old = self._conn.execute("SELECT body_hash FROM entries WHERE url = ?", (url,)).fetchone()
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO entries (url, body_hash, size, stored_at, last_access, url_class)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (url, body_hash, size, now, now, url_class(url))
+            )
+            if old and old[0] != body_hash:
+                self._drop_body_if_unused(old[0])
+            self._accessed.pop(url, None)
+            self._flush_access()
+            self._evict()
+            self._conn.commit()
+
+    def pages(self, klass=None):
+        """
+        Treści wszystkich zapisanych stron (opcjonalnie tylko klasy 'klass': "search"
+        albo "detail") – np. nagrane podstrony do extractors.calibrate_extractors.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT body_hash FROM entries WHERE ? IS NULL OR url_class = ? ORDER BY url",
+                (klass, klass)
+            ).fetchall()
+        for (body_hash,) in rows:
+            try:
+                with open(self._body_path(body_hash), "rb") as f:
+                    yield zlib.decompress(f.read()).decode("utf-8")
+            except (OSError, zlib.error):
+                continue
+
+    def stats(self):
+        """
+        Liczniki trafień/chybień i bieżący rozmiar pamięci podręcznej.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "bytes": self._total}
+
+    def close(self):
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._conn.close()
+
+    def _flush_access(self):
+        # Zaległe czasy użycia – przed zatwierdzeniem i przed usuwaniem LRU
+        if self._accessed:
+            self._conn.executemany("UPDATE entries SET last_access = ? WHERE url = ?",
+                                   [(at, url) for url, at in self._accessed.items()])
+            self._accessed.clear()
+
+    def _evict(self):
+        # LRU: usuwamy najdawniej używane wpisy, aż zejdziemy do 90% limitu
+        if self._total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute("SELECT url, body_hash FROM entries ORDER BY last_access").fetchall()
+        for url, body_hash in rows:
+            if self._total <= target:
+                break
+            self._conn.execute("DELETE FROM entries WHERE url = ?", (url,))
+            self._drop_body_if_unused(body_hash)
+
+    def _drop_body_if_unused(self, body_hash):
+        used = self._conn.execute(
+            "SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1", (body_hash,)
+        ).fetchone()
+        if used:
+            return
+        path = self._body_path(body_hash)
+        try:
+            self._total -= os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _body_path(self, body_hash):
+        return os.path.join(self.directory, body_hash[:2], body_hash)
@@ -0,0 +1,277 @@
+import math
+import os
+import random
+import sqlite3
+import threading
+import time
+import metrics
+
+STATE_PATH = "data/scheduler.db"
+DEFAULT_INTERVAL = 3600     # s – domyślny odstęp między przebiegami zadania
+DEFAULT_JITTER = 0.1        # ± ułamek odstępu, o który losowo przesuwamy każdy termin
+MAX_WAIT = 300              # s – najdłuższe jednorazowe czekanie (zegar ścienny mógł się przestawić,
+                            # np. po uśpieniu komputera)
+
+CATCH_UP_ONCE = "once"      # zaległe terminy → jeden przebieg od razu
+CATCH_UP_SKIP = "skip"      # zaległe terminy → czekamy na najbliższy przyszły termin
+
+
+class Job:
+    """
+    Zadanie cykliczne harmonogramu. 'slot' to planowany termin przebiegu (bez rozrzutu),
+    'next_run' – ten sam termin przesunięty o losowy rozrzut (jitter × interval).
+    """
+
+    def __init__(self, name, func, interval=DEFAULT_INTERVAL, jitter=DEFAULT_JITTER,
+                 catch_up=CATCH_UP_ONCE):
+        if catch_up not in (CATCH_UP_ONCE, CATCH_UP_SKIP):
+            raise ValueError(f"Nieznana reguła nadrabiania: {catch_up!r}")
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.catch_up = catch_up
+        self.slot = None
+        self.next_run = None
+        self.running = False
+        self.triggered = False
+        self.last_start = None
+        self.last_end = None
+        self.last_status = None
+        self.last_error = None
+
+
+class JobScheduler:
+    """
+    Harmonogram zadań cyklicznych (np. scrapowanie każdej lokalizacji osobno):
+      - czeka na najbliższy termin (Condition.wait do terminu), a nie sprawdza co minutę;
+        dodanie/usunięcie zadania, trigger() i stop() budzą go od razu,
+      - każde zadanie ma własny odstęp i losowy rozrzut terminów (jitter), więc
+        lokalizacje nie startują jednocześnie; rozrzut nie kumuluje się (terminy liczymy
+        od planowanego 'slot', nie od faktycznego startu),
+      - zadanie nigdy nie biegnie dwa razy naraz: termin, który minie w trakcie przebiegu,
+        jest rozliczany po jego zakończeniu według reguły nadrabiania zadania
+        (CATCH_UP_ONCE – jeden przebieg od razu, CATCH_UP_SKIP – następny przyszły termin),
+      - stan zadań (ostatni termin, start, koniec, wynik) jest zapisywany w SQLite
+        (data/scheduler.db), więc po restarcie harmonogram wraca do swoich terminów
+        zamiast od razu scrapować wszystko od nowa; nowe zadanie rusza od razu.
+    Przebiegi wykonują się w wątkach w tle, najwyżej 'max_workers' naraz.
+    """
+
+    def __init__(self, state_path=STATE_PATH, max_workers=1, seed=None):
+        os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(state_path, timeout=30, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                name TEXT PRIMARY KEY,
+                slot REAL,
+                next_run REAL,
+                last_start REAL,
+                last_end REAL,
+                last_status TEXT,
+                last_error TEXT
+            )
+            """
+        )
+        self._conn.commit()
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._workers = threading.BoundedSemaphore(max_workers)
+        self._generation = 0
+        self._closed = False
+        self._random = random.Random(seed)
+
+    def add(self, name, func, interval=None, jitter=DEFAULT_JITTER, catch_up=CATCH_UP_ONCE):
+        """
+        Dodaje zadanie albo podmienia ustawienia istniejącego o tej samej nazwie
+        (trwający przebieg i zaplanowany termin zostają). Pierwszy termin nowego zadania
+        wynika z zapisanego stanu (ostatni termin + odstęp, z regułą nadrabiania);
+        zadanie bez zapisanego stanu rusza od razu.
+        """
+        interval = interval or DEFAULT_INTERVAL
+        with self._cond:
+            job = self._jobs.get(name)
+            if job is not None:
+                changed = job.interval != interval
+                job.func, job.interval, job.jitter, job.catch_up = func, interval, jitter, catch_up
+                if changed and not job.running:
+                    self._clamp_slot(job)
+                    self._plan(job, time.time())
+                self._cond.notify_all()
+                return job
+
+            job = Job(name, func, interval, jitter, catch_up)
+            row = self._conn.execute(
+                "SELECT slot, last_start, last_end, last_status, last_error FROM jobs WHERE name = ?",
+                (name,)
+            ).fetchone()
+            if row is None:
+                job.slot = job.next_run = time.time()
+            else:
+                job.slot, job.last_start, job.last_end, job.last_status, job.last_error = row
+                self._clamp_slot(job)
+                self._plan(job, time.time())
+            self._jobs[name] = job
+            self._save(job)
+            self._cond.notify_all()
+            return job
+
+    def remove(self, name):
+        # Trwający przebieg kończy się normalnie; stan w bazie zostaje na wypadek powrotu zadania
+        with self._cond:
+            self._jobs.pop(name, None)
+            self._cond.notify_all()
+
+    def job_names(self):
+        with self._cond:
+            return list(self._jobs)
+
+    def trigger(self, name):
+        """
+        Przebieg zadania od razu (albo zaraz po trwającym). Kolejne terminy bez zmian.
+        """
+        with self._cond:
+            job = self._jobs[name]
+            job.triggered = job.running
+            job.next_run = min(job.next_run, time.time())
+            self._cond.notify_all()
+
+    def status(self):
+        """
+        Stan zadań: lista słowników {name, interval, running, next_run, last_start,
+        last_end, last_status, last_error} (czasy jako znaczniki czasu Unix).
+        """
+        with self._cond:
+            return [
+                {"name": job.name, "interval": job.interval, "running": job.running,
+                 "next_run": job.next_run, "last_start": job.last_start, "last_end": job.last_end,
+                 "last_status": job.last_status, "last_error": job.last_error}
+                for job in sorted(self._jobs.values(), key=lambda j: j.next_run)
+            ]
+
+    def start(self):
+        """
+        Uruchamia harmonogram w wątku w tle. Ponowny start po stop() nie dubluje pętli
+        (poprzednia kończy się przy najbliższym przebudzeniu).
+        """
+        with self._cond:
+            self._generation += 1
+            generation = self._generation
+            self._cond.notify_all()
+        threading.Thread(target=self._loop, args=(generation,), daemon=True,
+                         name="job-scheduler").start()
+
+    def run_forever(self):
+        # Jak start(), ale pętla działa w bieżącym wątku (scheduler.py)
+        with self._cond:
+            self._generation += 1
+            generation = self._generation
+        self._loop(generation)
+
+    def stop(self):
+        """
+        Zatrzymuje pętlę harmonogramu; trwające przebiegi kończą się normalnie.
+        """
+        with self._cond:
+            self._generation += 1
+            self._cond.notify_all()
+
+    def close(self):
+        self.stop()
+        with self._cond:
+            self._closed = True
+            self._conn.close()
+
+    def _loop(self, generation):
+        with self._cond:
+            while generation == self._generation:
+                now = time.time()
+                for job in list(self._jobs.values()):
+                    if not job.running and job.next_run <= now:
+                        self._dispatch(job, now)
+                waiting = [job.next_run for job in self._jobs.values() if not job.running]
+                timeout = MAX_WAIT if not waiting else min(MAX_WAIT, max(0.0, min(waiting) - now))
+                self._cond.wait(timeout)
+
+    def _dispatch(self, job, now):
+        # Wołane pod self._cond
+        job.running = True
+        metrics.observe("scheduler_lag_seconds", max(0.0, now - job.next_run), job=job.name)
+        threading.Thread(target=self._run, args=(job,), daemon=True,
+                         name=f"job-{job.name}").start()
+
+    def _run(self, job):
+        with self._workers:
+            with self._cond:
+                job.last_start = time.time()
+                job.last_status = "running"
+                self._save(job)
+            status, error = "ok", None
+            try:
+                job.func()
+            except Exception as e:
+                status, error = "error", str(e)
+                metrics.count_error("scheduled_job", e)
+                print(f"[ERROR] Zadanie {job.name} nie powiodło się: {e}")
+            metrics.inc("scheduler_runs_total", job=job.name, result=status)
+
+        with self._cond:
+            job.running = False
+            job.last_end = time.time()
+            job.last_status, job.last_error = status, error
+            job.slot += job.interval
+            self._plan(job, job.last_end)
+            if job.triggered:
+                job.triggered = False
+                job.next_run = job.last_end
+            if self._jobs.get(job.name) is job:
+                self._save(job)
+            self._cond.notify_all()
+
+    def _clamp_slot(self, job):
+        # Po skróceniu odstępu nie czekamy na termin wyliczony ze starego
+        if job.last_start is not None:
+            job.slot = min(job.slot, job.last_start + job.interval)
+
+    def _plan(self, job, now):
+        """
+        Wyznacza next_run z job.slot (termin kolejnego przebiegu bez rozrzutu):
+        termin w przyszłości → slot + rozrzut; termin spóźniony o mniej niż jeden odstęp
+        (np. długi przebieg) → od razu; więcej zaległych terminów → reguła nadrabiania.
+        """
+        if job.slot > now:
+            job.next_run = job.slot + self._random.uniform(-job.jitter, job.jitter) * job.interval
+            return
+        missed = math.floor((now - job.slot) / job.interval)
+        if missed:
+            metrics.inc("scheduler_missed_runs_total", missed, job=job.name)
+            print(f"[INFO] Zadanie {job.name}: pominięte terminy: {missed}")
+        if missed and job.catch_up == CATCH_UP_SKIP:
+            job.slot += (missed + 1) * job.interval
+            job.next_run = job.slot + self._random.uniform(-job.jitter, job.jitter) * job.interval
+        else:
+            # Jeden przebieg teraz rozlicza wszystkie zaległe terminy
+            job.slot += missed * job.interval
+            job.next_run = now
+
+    def _save(self, job):
+        # Wołane pod self._cond
+        if self._closed:
+            return
+        with self._conn:
+            self._conn.execute(
+                """
+                INSERT INTO jobs (name, slot, next_run, last_start, last_end, last_status, last_error)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    slot = excluded.slot,
+                    next_run = excluded.next_run,
+                    last_start = excluded.last_start,
+                    last_end = excluded.last_end,
+                    last_status = excluded.last_status,
+                    last_error = excluded.last_error
+                """,
+                (job.name, job.slot, job.next_run, job.last_start, job.last_end,
+                 job.last_status, job.last_error)
+            )
@@ -0,0 +1,257 @@
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+LOG_PATH = "logs/metrics.jsonl"          # strukturalne logi (jedna linia JSON na zdarzenie)
+PROM_PATH = "logs/otodom.prom"           # plik w formacie Prometheus (textfile collector)
+PROFILE_DIR = "logs"
+PROFILE_ENV = "OTODOM_PROFILE"           # "cprofile" albo "tracemalloc" – profilowanie jednego przebiegu
+PREFIX = "otodom_"
+
+
+class Metrics:
+    """
+    Rejestr metryk bieżącego procesu (bezpieczny wątkowo):
+      - liczniki:  inc("http_bytes_total", n, kind="detail"),
+      - czasy:     observe("http_request_seconds", s) albo with timer(...): ...
+                   (liczba, suma i maksimum na zestaw etykiet).
+    snapshot()/merge() pozwalają zebrać metryki z procesów roboczych (parallel.py).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timers = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            entry = self._timers.setdefault(key, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self, reset=False):
+        """
+        Stan rejestru jako dane JSON:
+        {"counters": [{name, labels, value}], "timers": [{name, labels, count, sum, max}]}.
+        """
+        with self._lock:
+            snap = {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+                "timers": [
+                    {"name": name, "labels": dict(labels), "count": count,
+                     "sum": round(total, 6), "max": round(peak, 6)}
+                    for (name, labels), (count, total, peak) in sorted(self._timers.items())
+                ],
+            }
+            if reset:
+                self._counters.clear()
+                self._timers.clear()
+        return snap
+
+    def merge(self, snap):
+        """
+        Dolicza snapshot() z innego procesu.
+        """
+        for row in snap.get("counters", []):
+            self.inc(row["name"], row["value"], **row["labels"])
+        with self._lock:
+            for row in snap.get("timers", []):
+                key = (row["name"], _label_key(row["labels"]))
+                entry = self._timers.setdefault(key, [0, 0.0, 0.0])
+                entry[0] += row["count"]
+                entry[1] += row["sum"]
+                entry[2] = max(entry[2], row["max"])
+
+    def prometheus_text(self):
+        """
+        Metryki w formacie tekstowym Prometheus (liczniki jako counter, czasy jako
+        summary; maksimum czasu jako osobny gauge *_max – nie należy do summary).
+        """
+        snap = self.snapshot()
+        lines = []
+        declared = set()
+        for row in snap["counters"]:
+            name = PREFIX + row["name"]
+            if name not in declared:
+                lines.append(f"# TYPE {name} counter")
+                declared.add(name)
+            lines.append(f"{name}{_prom_labels(row['labels'])} {row['value']}")
+        # Próbki jednej rodziny metryk muszą stać razem: najpierw summary, potem gauge *_max
+        timers = {}
+        for row in snap["timers"]:
+            timers.setdefault(PREFIX + row["name"], []).append(row)
+        for name, rows in timers.items():
+            lines.append(f"# TYPE {name} summary")
+            for row in rows:
+                labels = _prom_labels(row["labels"])
+                lines.append(f"{name}_count{labels} {row['count']}")
+                lines.append(f"{name}_sum{labels} {row['sum']}")
+            lines.append(f"# TYPE {name}_max gauge")
+            for row in rows:
+                lines.append(f"{name}_max{_prom_labels(row['labels'])} {row['max']}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _prom_labels(labels):
+    if not labels:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items()))
+    return "{" + body + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = Metrics()
+inc = registry.inc
+observe = registry.observe
+timer = registry.timer
+
+
+def timed(name, **labels):
+    """
+    Dekorator: mierzy czas każdego wywołania funkcji (metryka 'name'),
+    a wyjątki zlicza w errors_total{stage=name, type=...}.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                with registry.timer(name, **labels):
+                    return func(*args, **kwargs)
+            except Exception as e:
+                registry.inc("errors_total", stage=name, type=type(e).__name__)
+                raise
+        return wrapper
+    return decorator
+
+
+def count_error(stage, error):
+    registry.inc("errors_total", stage=stage, type=type(error).__name__)
+
+
+def log_event(event, path=LOG_PATH, **fields):
+    """
+    Dopisuje strukturalny log: jedna linia JSON {"ts", "event", ...pola}.
+    """
+    record = {"ts": datetime.datetime.now().isoformat(timespec="milliseconds"), "event": event}
+    record.update(fields)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+
+def export(json_path=LOG_PATH, prom_path=PROM_PATH, event="metrics", **fields):
+    """
+    Zapisuje bieżące metryki: linię JSON do 'json_path' i plik Prometheus do 'prom_path'
+    (podmieniany atomowo, gotowy dla node_exporter --collector.textfile).
+    """
+    log_event(event, json_path, metrics=registry.snapshot(), **fields)
+    if prom_path:
+        os.makedirs(os.path.dirname(prom_path) or ".", exist_ok=True)
+        tmp_path = prom_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(registry.prometheus_text())
+        os.replace(tmp_path, prom_path)
+
+
+def serve(port=9108, host="127.0.0.1"):
+    """
+    Uruchamia w tle endpoint HTTP /metrics (format Prometheus). Zwraca serwer
+    (server.shutdown() go zatrzymuje).
+    """
+    # Importy na żądanie – moduł metrics jest importowany przez każde polecenie CLI
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[INFO] Metryki Prometheus: http://{host}:{server.server_port}/metrics")
+    return server
+
+
+@contextmanager
+def profile(mode=None, top=20):
+    """
+    Opcjonalne profilowanie jednego przebiegu: mode="cprofile" (czas CPU per funkcja,
+    zapis do logs/profile_<czas>.prof) albo "tracemalloc" (największe alokacje i szczyt
+    pamięci). Domyślnie tryb ze zmiennej środowiskowej OTODOM_PROFILE; brak = nic nie robi.
+    """
+    mode = (mode or os.environ.get(PROFILE_ENV, "")).lower()
+    if mode not in ("cprofile", "tracemalloc"):
+        yield
+        return
+    import cProfile
+    import io
+    import pstats
+    import tracemalloc
+
+    stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = os.path.join(PROFILE_DIR, f"profile_{stamp}.prof")
+            profiler.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+            print(out.getvalue())
+            print(f"[INFO] Profil cProfile zapisany w {path}")
+    else:
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"[INFO] tracemalloc: szczyt pamięci {peak / 1024 / 1024:.1f} MB")
+            for stat in snapshot.statistics("lineno")[:top]:
+                print(f"[INFO]   {stat}")
+            log_event("tracemalloc", peak_bytes=peak,
+                      top=[str(stat) for stat in snapshot.statistics("lineno")[:top]])
@@ -0,0 +1,140 @@
+import datetime
+import glob
+import os
+import pandas as pd
+from storage import get_store, SQLiteOfferStore
+
+TYPED_CACHE_DIR = "data/cache"
+
+# Surowe kolumny tekstowe potrzebne do analizy
+RAW_COLUMNS = ["price", "Liczba pokoi", "Powierzchnia", "Piętro", "price_per_m2"]
+
+# Kolumna surowa → kolumna liczbowa; w SQLite liczby są zapisane już przy scrapowaniu
+# (storage.TYPED_COLUMNS), więc typed_from_store nie parsuje napisów ponownie
+STORED_NUMERIC = {
+    "price": ("price", "price_num", "float64"),
+    "Liczba pokoi": ("rooms", "rooms_int", "Int64"),
+    "Powierzchnia": ("area", "area_m2", "float64"),
+    "Piętro": ("floor", "floor_int", "Int64"),
+    "price_per_m2": ("price_per_m2", "price_per_m2_num", "float64"),
+}
+
+# Pamięć podręczna w procesie: (dzień, wersja danych) → DataFrame
+_memory_cache = {}
+
+
+def _column(df, name):
+    # Kolumna jako tekst; brakująca kolumna → same NaN
+    if name not in df.columns:
+        return pd.Series(pd.NA, index=df.index, dtype="string")
+    return df[name].astype("string")
+
+
+def normalize_offers(df):
+    """
+    Zamienia tekstowe pola ofert na kolumny liczbowe (w pełni wektorowo, bez apply):
+      - price_num        ("439 000 zł"   → 439000.0),
+      - rooms_int        ("3"            → 3, Int64),
+      - area_m2          ("63,86 m²"     → 63.86),
+      - floor_int        ("parter/8" → 0, "2/5" → 2, Int64),
+      - price_per_m2_num ("6 875 zł/m²"  → 6875.0),
+      - price_per_room   (price_num / rooms_int).
+    Wiersze nie są usuwane – nieczytelne wartości to NaN/<NA>.
+    Zwraca nowy DataFrame z kolumnami "url" i "cluster_id" (jeśli są) i kolumnami liczbowymi;
+    lista kolumn źródłowych jest w .attrs["source_columns"].
+    """
+    typed = pd.DataFrame(index=df.index)
+    if "url" in df.columns:
+        typed["url"] = df["url"]
+    if "cluster_id" in df.columns:
+        typed["cluster_id"] = pd.to_numeric(df["cluster_id"], errors="coerce").astype("Int64")
+
+    typed["price_num"] = pd.to_numeric(
+        _column(df, "price").str.replace(r"[^\d]", "", regex=True), errors="coerce"
+    ).astype("float64")
+
+    typed["rooms_int"] = pd.to_numeric(
+        _column(df, "Liczba pokoi").str.extract(r"(\d+)", expand=False), errors="coerce"
+    ).astype("Int64")
+
+    typed["area_m2"] = pd.to_numeric(
+        _column(df, "Powierzchnia")
+        .str.replace(r"[^\d,\.]", "", regex=True)
+        .str.replace(",", ".", regex=False),
+        errors="coerce"
+    ).astype("float64")
+
+    floor_txt = _column(df, "Piętro").str.lower()
+    floor_num = pd.to_numeric(floor_txt.str.extract(r"(\d+)", expand=False), errors="coerce")
+    typed["floor_int"] = floor_num.mask(floor_txt.str.contains("parter", na=False), 0).astype("Int64")
+
+    typed["price_per_m2_num"] = pd.to_numeric(
+        _column(df, "price_per_m2").str.replace(r"[^\d]", "", regex=True), errors="coerce"
+    ).astype("float64")
+
+    typed["price_per_room"] = typed["price_num"] / typed["rooms_int"].astype("float64")
+
+    typed.attrs["source_columns"] = list(df.columns)
+    return typed
+
+
+def typed_from_store(store, day):
+    """
+    To samo co normalize_offers(store.read_frame(day)), ale z kolumn liczbowych
+    magazynu SQLite (query_columns) – bez dekodowania JSON i wyrażeń regularnych.
+    """
+    stored = ["url", "cluster_id"] + [column for column, _, _ in STORED_NUMERIC.values()]
+    data = {column: [] for column in stored}
+    for batch in store.query_columns(stored, sort="rowid", day=day, batch_size=10000):
+        for column in stored:
+            data[column].extend(batch[column])
+
+    typed = pd.DataFrame({"url": data["url"]})
+    typed["cluster_id"] = pd.array(data["cluster_id"], dtype="Int64")
+    for column, name, dtype in STORED_NUMERIC.values():
+        typed[name] = pd.array(data[column], dtype="float64" if dtype == "float64" else "Int64")
+    typed["price_per_room"] = typed["price_num"] / typed["rooms_int"].astype("float64")
+    typed.attrs["source_columns"] = [raw for raw, (_, name, _) in STORED_NUMERIC.items()
+                                     if typed[name].notna().any()]
+    return typed
+
+
+def load_typed_offers(day=None, store=None):
+    """
+    Zwraca znormalizowane oferty z danego dnia (normalize_offers), korzystając
+    z pamięci podręcznej kluczowanej wersją danych w magazynie:
+      1. w pamięci procesu,
+      2. na dysku (data/cache/typed_<dzień>_<wersja>.pkl),
+      3. dopiero w razie braku – odczyt z magazynu: kolumny liczbowe SQLite
+         (typed_from_store) albo normalizacja napisów (normalize_offers, Excel).
+    Po każdym zapisie do magazynu wersja się zmienia, więc wynik jest zawsze aktualny.
+    """
+    day = day or datetime.date.today().isoformat()
+    own_store = store is None
+    store = store or get_store()
+    try:
+        version = store.data_version(day)
+        key = (day, version)
+        if key in _memory_cache:
+            return _memory_cache[key]
+
+        path = os.path.join(TYPED_CACHE_DIR, f"typed_{day}_{version}.pkl")
+        if os.path.exists(path):
+            typed = pd.read_pickle(path)
+        else:
+            if isinstance(store, SQLiteOfferStore):
+                typed = typed_from_store(store, day)
+            else:
+                typed = normalize_offers(store.read_frame(day))
+            os.makedirs(TYPED_CACHE_DIR, exist_ok=True)
+            # Usuń nieaktualne wersje dla tego dnia
+            for old in glob.glob(os.path.join(TYPED_CACHE_DIR, f"typed_{day}_*.pkl")):
+                os.remove(old)
+            typed.to_pickle(path)
+    finally:
+        if own_store:
+            store.close()
+
+    _memory_cache.clear()
+    _memory_cache[key] = typed
+    return typed
@@ -1,21 +1,234 @@
+import datetime
+import os
 import smtplib
+import sqlite3
+import threading
 from email.mime.text import MIMEText
+import metrics
 
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 465
+NOTIFIED_PATH = "data/notified.db"
+FLUSH_INTERVAL = 30      # co ile sekund wątek wysyłający zbiera oczekujące oferty w zbiorczy e-mail
+MAX_ATTEMPTS = 3         # po tylu nieudanych próbach porzucamy partię
 
-def send_email(subject, body, to_email, login_email, password):
+
+def _build_message(subject, body, to_email, login_email):
+    msg = MIMEText(body, _charset="utf-8")
+    msg["Subject"] = subject
+    msg["From"] = login_email
+    msg["To"] = to_email
+    return msg
+
+
+def _connect(login_email, password, host=SMTP_HOST, port=SMTP_PORT, use_ssl=True):
+    """
+    Otwiera połączenie SMTP i loguje się (bez logowania, jeśli nie podano hasła –
+    np. lokalny serwer testowy aiosmtpd).
+    """
+    server = smtplib.SMTP_SSL(host, port) if use_ssl else smtplib.SMTP(host, port)
+    if login_email and password:
+        server.login(login_email, password)
+    return server
+
+
+def send_email(subject, body, to_email, login_email, password, host=SMTP_HOST, port=SMTP_PORT,
+               use_ssl=True):
     """
     Wysyła wiadomość e-mail z tematem 'subject' i treścią 'body'
     na adres 'to_email', używając konta 'login_email' (hasło: 'password').
     Serwer: smtp.gmail.com:465
     """
-    msg = MIMEText(body, _charset="utf-8")
-    msg["Subject"] = subject
-    msg["From"] = login_email
-    msg["To"] = to_email
+    msg = _build_message(subject, body, to_email, login_email)
 
     try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-            server.login(login_email, password)
-            server.send_message(msg)
+        with metrics.timer("smtp_send_seconds"):
+            with _connect(login_email, password, host, port, use_ssl) as server:
+                server.send_message(msg)
+        metrics.inc("emails_sent_total")
     except Exception as e:
+        metrics.count_error("smtp", e)
         print(f"[ERROR] Nie udało się wysłać e-maila: {e}")
+
+
+def format_digest(offers):
+    """
+    Treść zbiorczego e-maila: tytuł, adres i dopasowane frazy każdej oferty
+    (albo informacja o obniżce ceny).
+    """
+    return "\n\n".join(f"{o.get('title', '')}\n{o.get('url', '')}\n{_digest_reason(o)}" for o in offers)
+
+
+def _digest_reason(offer):
+    change = offer.get("price_change")
+    if change and "#price=" in str(offer.get("notify_key", "")):
+        return f"Obniżka ceny: {change['old']} zł → {change['new']} zł"
+    return str(offer.get("tags", []))
+
+
+class NotifiedStore:
+    """
+    Trwały zbiór ogłoszeń, o których już wysłano powiadomienie (SQLite, klucz = URL
+    albo notify_key oferty).
+    """
+
+    def __init__(self, path=NOTIFIED_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS notified (url TEXT PRIMARY KEY, notified_at TEXT)")
+        self._conn.commit()
+
+    def __contains__(self, url):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM notified WHERE url = ?", (url,)).fetchone() is not None
+
+    def add_many(self, urls):
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO notified (url, notified_at) VALUES (?, ?)",
+                [(url, now) for url in urls]
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class NotificationQueue:
+    """
+    Kolejka powiadomień wysyłanych przez wątek w tle, żeby wolny serwer SMTP
+    nie blokował cyklu scrapowania:
+      - enqueue() od razu wraca; pomija oferty, o których już powiadomiono
+        (NotifiedStore) lub które już czekają w kolejce; kluczem jest "notify_key"
+        oferty (np. obniżka ceny), a domyślnie jej url,
+      - co FLUSH_INTERVAL sekund (albo po flush()) oczekujące oferty są łączone
+        w jeden zbiorczy e-mail na odbiorcę, a wszystkie e-maile dla tego samego
+        konta nadawcy idą przez jedno zalogowane połączenie,
+      - ogłoszenie trafia do NotifiedStore dopiero po udanej wysyłce,
+        więc każde wywoła najwyżej jedno powiadomienie.
+    host/port/use_ssl pozwalają użyć lokalnego serwera testowego (np. aiosmtpd).
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, use_ssl=True, flush_interval=FLUSH_INTERVAL,
+                 store=None):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.flush_interval = flush_interval
+        self.store = store or NotifiedStore()
+        self.sent_messages = 0
+        # (login_email, password, to_email, subject) → {url: oferta}
+        self._pending = {}
+        self._attempts = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def enqueue(self, offers, to_email, login_email, password, subject="Nowe oferty Otodom"):
+        """
+        Dodaje oferty do najbliższego zbiorczego e-maila. Zwraca liczbę nowych ofert.
+        """
+        key = (login_email, password, to_email, subject)
+        added = 0
+        with self._lock:
+            pending = self._pending.setdefault(key, {})
+            for offer in offers:
+                url = offer.get("notify_key") or offer.get("url")
+                if not url or url in pending or url in self.store:
+                    continue
+                pending[url] = offer
+                added += 1
+            if added:
+                self._idle.clear()
+        return added
+
+    def flush(self, timeout=None):
+        """
+        Wysyła oczekujące oferty od razu i czeka (najwyżej 'timeout' s) na zakończenie.
+        """
+        self._wake.set()
+        return self._idle.wait(timeout)
+
+    def close(self, timeout=None):
+        self.flush(timeout)
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._send_pending()
+
+    def _send_pending(self):
+        with self._lock:
+            batches = {key: offers for key, offers in self._pending.items() if offers}
+            self._pending = {}
+        if not batches:
+            self._idle.set()
+            return
+
+        # Jedno połączenie na konto nadawcy, jeden e-mail na odbiorcę i temat
+        by_account = {}
+        for (login_email, password, to_email, subject), offers in batches.items():
+            by_account.setdefault((login_email, password), []).append((to_email, subject, offers))
+
+        for (login_email, password), messages in by_account.items():
+            try:
+                with metrics.timer("smtp_send_seconds"), \
+                        _connect(login_email, password, self.host, self.port, self.use_ssl) as server:
+                    for to_email, subject, offers in messages:
+                        body = format_digest(offers.values())
+                        msg = _build_message(f"{subject} ({len(offers)})", body, to_email, login_email)
+                        server.send_message(msg)
+                        self.sent_messages += 1
+                        metrics.inc("emails_sent_total")
+                        metrics.inc("notified_offers_total", len(offers))
+                        self.store.add_many(offers.keys())
+                        self._attempts.pop((login_email, password, to_email, subject), None)
+                        offers.clear()
+            except Exception as e:
+                metrics.count_error("smtp", e)
+                print(f"[ERROR] Nie udało się wysłać e-maila: {e}")
+                self._requeue(login_email, password, messages)
+
+        with self._lock:
+            if not any(self._pending.values()):
+                self._idle.set()
+
+    def _requeue(self, login_email, password, messages):
+        # Niewysłane oferty wracają do kolejki (do MAX_ATTEMPTS prób)
+        with self._lock:
+            for to_email, subject, offers in messages:
+                if not offers:
+                    continue
+                key = (login_email, password, to_email, subject)
+                self._attempts[key] = self._attempts.get(key, 0) + 1
+                if self._attempts[key] >= MAX_ATTEMPTS:
+                    print(f"[ERROR] Porzucono powiadomienie o {len(offers)} ofertach dla {to_email}")
+                    self._attempts.pop(key)
+                    continue
+                self._pending.setdefault(key, {}).update(offers)
+
+
+_default_queue = None
+_default_lock = threading.Lock()
+
+
+def get_notification_queue():
+    """
+    Wspólna dla całego procesu kolejka powiadomień (tworzona przy pierwszym użyciu).
+    """
+    global _default_queue
+    with _default_lock:
+        if _default_queue is None:
+            _default_queue = NotificationQueue()
+        return _default_queue
@@ -0,0 +1,343 @@
+import datetime
+import re
+import sys
+import time
+from array import array
+from collections.abc import MutableMapping
+
+# Pole specyfikacji zapisywane tylko jako liczba, gdy tekst da się z niej odtworzyć
+# bajt w bajt – pozostałe wartości specyfikacji powtarzają się między ogłoszeniami
+# i są internowane
+AREA_KEY = "Powierzchnia"
+ROOMS_KEY = "Liczba pokoi"
+FLOOR_KEY = "Piętro"
+MISSING = "brak"
+# Jednostki, z którymi widok słownika formatuje liczby z pól cenowych
+MONEY_UNITS = {"price": "zł", "price_per_m2": "zł/m²"}
+MONEY_KEYS = tuple(MONEY_UNITS)
+
+BASE_KEYS = ("title", "price", "price_per_m2", "location", "description", "url", "date")
+NUMERIC_COLUMNS = ("price", "price_per_m2", "area", "rooms", "floor")
+
+# Wspólne krotki nazw pól specyfikacji: ogłoszenia z tym samym zestawem pól
+# (zwykle prawie wszystkie) dzielą jedną krotkę kluczy
+_spec_schemas = {}
+
+
+def _schema(keys):
+    keys = tuple(sys.intern(key) for key in keys)
+    return _spec_schemas.setdefault(keys, keys)
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def parse_number(value):
+    """
+    Liczba całkowita z tekstu ceny lub liczby pokoi: "439 000 zł" → 439000,
+    "6 875 zł/m²" → 6875; tekst bez cyfr → None.
+    """
+    digits = re.sub(r"[^\d]", "", str(value or ""))
+    return int(digits) if digits else None
+
+
+def parse_area(value):
+    """
+    Powierzchnia w m²: "63,86 m²" → 63.86; brak → None.
+    """
+    match = re.search(r"\d+(?:[.,]\d+)?", str(value or ""))
+    return float(match.group(0).replace(",", ".")) if match else None
+
+
+def parse_floor(value):
+    """
+    Piętro: "parter/4" → 0, "2/10" → 2, "> 10" → 10; brak → None.
+    """
+    text = str(value or "").lower()
+    if text.startswith("parter"):
+        return 0
+    return parse_number(text.split("/")[0])
+
+
+def _format_money(value, unit):
+    return MISSING if value is None else f"{value:,}".replace(",", " ") + f" {unit}"
+
+
+def _money_text(raw, value, unit):
+    # Tekst ceny, którego nie da się odtworzyć z liczby bajt w bajt ("120 000 €",
+    # "Zapytaj o cenę", "450\xa0000 zł") – trzymamy go w całości (internowany);
+    # zwykłe "439 000 zł" odtwarza _format_money (None)
+    if not isinstance(raw, str) or raw == _format_money(value, unit):
+        return None
+    return _intern(raw)
+
+
+def _format_area(value):
+    return f"{value:g}".replace(".", ",") + " m²"
+
+
+class Offer(MutableMapping):
+    """
+    Oferta z typowanymi polami zamiast słownika napisów:
+      - price, price_per_m2, rooms, floor (int) i area (float) są parsowane raz, przy
+        scrapowaniu (None = brak), a scraped_at to znacznik czasu Unix,
+      - pozostałe pola specyfikacji są internowane, a ich nazwy trzymane we wspólnej
+        krotce dla ogłoszeń z tym samym zestawem pól,
+      - dopisywane później klucze (tags, price_change, cluster_id, ...) trafiają do
+        słownika tworzonego dopiero przy pierwszym zapisie,
+      - tekst ceny jest zachowywany tylko wtedy, gdy liczba go nie odtwarza (inna
+        waluta, "Zapytaj o cenę") – offer["price"] zwraca wtedy oryginał.
+    Dla zgodności z resztą kodu oferta jest też słownikiem (MutableMapping) o dawnych
+    kluczach i wartościach: offer["price"] → "439 000 zł", offer["date"] → data jako
+    tekst, offer["Powierzchnia"] → "63,86 m²"; dict(offer) daje dawny słownik.
+    Liczby są w atrybutach: offer.price → 439000.
+    """
+
+    __slots__ = ("url", "title", "description", "location", "price", "price_per_m2", "area",
+                 "rooms", "floor", "scraped_at", "_price_text", "_spec_keys", "_spec_values", "_extra")
+
+    def __init__(self, url, title=MISSING, description=MISSING, location=MISSING, price=None,
+                 price_per_m2=None, specs=None, scraped_at=None):
+        self.url = url
+        self.title = title
+        self.description = description
+        self.location = _intern(location)
+        self._price_text = None
+        self._set_money("price", price)
+        self._set_money("price_per_m2", price_per_m2)
+        self.scraped_at = time.time() if scraped_at is None else scraped_at
+        specs = specs or {}
+        self.area = parse_area(specs.get(AREA_KEY))
+        self.rooms = parse_number(specs.get(ROOMS_KEY))
+        self.floor = parse_floor(specs.get(FLOOR_KEY))
+        self._spec_keys = _schema(specs)
+        self._spec_values = tuple(
+            None if key == AREA_KEY and self.area is not None and value == _format_area(self.area)
+            else _intern(value)
+            for key, value in specs.items()
+        )
+        self._extra = None
+
+    @classmethod
+    def from_fields(cls, fields, url, list_location=""):
+        """
+        Oferta z pól zwróconych przez ekstraktor (extractors.extract_fields).
+        """
+        location = fields["location"] if fields["location"] is not None else list_location or MISSING
+        return cls(url, fields["title"], fields["description"], location, fields["price"],
+                   fields["price_per_m2"], fields["details"])
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Oferta z dawnego słownika (np. odczytanego z magazynu); nieznane klucze
+        trafiają do pól dopisanych.
+        """
+        specs = {key: value for key, value in data.items()
+                 if key not in BASE_KEYS and isinstance(value, str) and key[:1].isupper()}
+        try:
+            scraped_at = datetime.datetime.fromisoformat(str(data["date"])).timestamp()
+        except (KeyError, ValueError):
+            scraped_at = None
+        offer = cls(data.get("url"), data.get("title", MISSING), data.get("description", MISSING),
+                    data.get("location", MISSING), data.get("price"), data.get("price_per_m2"),
+                    specs, scraped_at)
+        for key, value in data.items():
+            if key not in BASE_KEYS and key not in specs:
+                offer[key] = value
+        return offer
+
+    def _set_money(self, key, raw):
+        value = parse_number(raw) if isinstance(raw, str) else raw
+        setattr(self, key, value)
+        text = _money_text(raw, value, MONEY_UNITS[key])
+        i = MONEY_KEYS.index(key)
+        if text is not None or (self._price_text is not None and self._price_text[i] is not None):
+            texts = list(self._price_text or (None, None))
+            texts[i] = text
+            self._price_text = tuple(texts) if texts != [None, None] else None
+
+    # --- widok słownika (dawne klucze i napisy) ---
+
+    def __getitem__(self, key):
+        if key in ("url", "title", "description", "location"):
+            return getattr(self, key)
+        if key in MONEY_UNITS:
+            text = self._price_text[MONEY_KEYS.index(key)] if self._price_text is not None else None
+            return text if text is not None else _format_money(getattr(self, key), MONEY_UNITS[key])
+        if key == "date":
+            return str(datetime.datetime.fromtimestamp(self.scraped_at))
+        try:
+            i = self._spec_keys.index(key)
+        except ValueError:
+            if self._extra is not None and key in self._extra:
+                return self._extra[key]
+            raise KeyError(key) from None
+        value = self._spec_values[i]
+        if value is None and key == AREA_KEY and self.area is not None:
+            return _format_area(self.area)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in ("url", "title", "description", "location"):
+            setattr(self, key, value)
+        elif key in MONEY_UNITS:
+            self._set_money(key, value)
+        elif key == "date":
+            self.scraped_at = datetime.datetime.fromisoformat(str(value)).timestamp()
+        elif key in self._spec_keys:
+            # Rzadkie: zmiana pola specyfikacji – parsujemy specyfikację od nowa
+            specs = {k: self[k] for k in self._spec_keys}
+            specs[key] = value
+            extra = self._extra
+            self.__init__(self.url, self.title, self.description, self.location, self["price"],
+                          self["price_per_m2"], specs, self.scraped_at)
+            self._extra = extra
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if self._extra is None or key not in self._extra:
+            raise KeyError(f"Nie można usunąć pola {key!r}")
+        del self._extra[key]
+
+    def __iter__(self):
+        yield from BASE_KEYS
+        yield from self._spec_keys
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return len(BASE_KEYS) + len(self._spec_keys) + (len(self._extra) if self._extra else 0)
+
+    def __repr__(self):
+        return f"Offer({self.url!r}, price={self.price}, area={self.area}, rooms={self.rooms})"
+
+    def __reduce__(self):
+        # Zwięzłe przesyłanie między procesami (parallel.py)
+        return _rebuild, (self.url, self.title, self.description, self.location, self.price,
+                          self.price_per_m2, self.area, self.rooms, self.floor, self.scraped_at,
+                          self._spec_keys, self._spec_values, self._extra, self._price_text)
+
+
+def _rebuild(url, title, description, location, price, price_per_m2, area, rooms, floor, scraped_at,
+             spec_keys, spec_values, extra, price_text=None):
+    offer = Offer.__new__(Offer)
+    offer.url, offer.title, offer.description = url, title, description
+    offer.location = _intern(location)
+    offer.price, offer.price_per_m2, offer.area, offer.rooms, offer.floor = price, price_per_m2, area, rooms, floor
+    offer.scraped_at = scraped_at
+    offer._price_text = price_text
+    offer._spec_keys = _schema(spec_keys)
+    offer._spec_values = tuple(_intern(value) for value in spec_values)
+    offer._extra = extra
+    return offer
+
+
+class OfferBatch:
+    """
+    Partia ofert w układzie kolumnowym:
+      - kolumny liczbowe (NUMERIC_COLUMNS) w tablicach array('d') – brak to NaN,
+      - url, title, description, location jako listy napisów,
+      - pola specyfikacji zakodowane słownikowo: dla każdego pola lista wartości
+        (kategorii) i tablica kodów array('i') (-1 = brak pola w ogłoszeniu).
+    to_pandas()/to_arrow() budują ramkę z tych tablic bez tworzenia obiektu
+    na każdy wiersz (kolumny liczbowe i kody są przekazywane bez kopiowania).
+    """
+
+    TEXT_COLUMNS = ("url", "title", "description", "location")
+
+    def __init__(self):
+        self.numeric = {name: array("d") for name in NUMERIC_COLUMNS}
+        self.scraped_at = array("d")
+        self.text = {name: [] for name in self.TEXT_COLUMNS}
+        self.spec_codes = {}        # pole → array('i')
+        self.spec_categories = {}   # pole → {wartość: kod}
+        self._rows = 0
+
+    @classmethod
+    def from_offers(cls, offers):
+        batch = cls()
+        batch.extend(offers)
+        return batch
+
+    def __len__(self):
+        return self._rows
+
+    def extend(self, offers):
+        nan = float("nan")
+        for offer in offers:
+            if not isinstance(offer, Offer):
+                offer = Offer.from_dict(offer)
+            for name in NUMERIC_COLUMNS:
+                value = getattr(offer, name)
+                self.numeric[name].append(nan if value is None else value)
+            self.scraped_at.append(offer.scraped_at)
+            for name in self.TEXT_COLUMNS:
+                self.text[name].append(getattr(offer, name))
+            seen = set()
+            for key, value in zip(offer._spec_keys, offer._spec_values):
+                if key == AREA_KEY:
+                    continue
+                codes = self.spec_codes.get(key)
+                if codes is None:
+                    codes = self.spec_codes[key] = array("i", [-1]) * self._rows
+                    self.spec_categories[key] = {}
+                categories = self.spec_categories[key]
+                codes.append(categories.setdefault(value, len(categories)) if value is not None else -1)
+                seen.add(key)
+            for key, codes in self.spec_codes.items():
+                if key not in seen:
+                    codes.append(-1)
+            self._rows += 1
+
+    def to_pandas(self):
+        """
+        pandas.DataFrame: kolumny liczbowe jako float64 (NaN = brak), scraped_at jako
+        datetime64, teksty jako object, pola specyfikacji jako Categorical.
+        """
+        import numpy as np
+        import pandas as pd
+
+        columns = {name: np.frombuffer(self.numeric[name], dtype=np.float64) for name in NUMERIC_COLUMNS}
+        columns["scraped_at"] = pd.to_datetime(np.frombuffer(self.scraped_at, dtype=np.float64), unit="s")
+        for name in self.TEXT_COLUMNS:
+            columns[name] = self.text[name]
+        for key, codes in self.spec_codes.items():
+            columns[key] = pd.Categorical.from_codes(
+                np.frombuffer(codes, dtype=np.int32), list(self.spec_categories[key])
+            )
+        return pd.DataFrame(columns, copy=False)
+
+    def to_arrow(self):
+        """
+        pyarrow.Table z tymi samymi kolumnami co to_pandas() (pola specyfikacji
+        jako DictionaryArray). Wymaga pakietu pyarrow.
+        """
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("OfferBatch.to_arrow wymaga pakietu pyarrow (pip install pyarrow)") from e
+        import numpy as np
+
+        arrays, names = [], []
+        for name in NUMERIC_COLUMNS:
+            values = np.frombuffer(self.numeric[name], dtype=np.float64)
+            arrays.append(pa.array(values, mask=np.isnan(values)))
+            names.append(name)
+        arrays.append(pa.array(np.frombuffer(self.scraped_at, dtype=np.float64) * 1e6,
+                               type=pa.float64()).cast(pa.int64()).cast(pa.timestamp("us")))
+        names.append("scraped_at")
+        for name in self.TEXT_COLUMNS:
+            arrays.append(pa.array(self.text[name], type=pa.string()))
+            names.append(name)
+        for key, codes in self.spec_codes.items():
+            indices = np.frombuffer(codes, dtype=np.int32)
+            arrays.append(pa.DictionaryArray.from_arrays(
+                pa.array(indices, mask=indices < 0), pa.array(list(self.spec_categories[key]), type=pa.string())
+            ))
+            names.append(key)
+        return pa.Table.from_arrays(arrays, names=names)
@@ -0,0 +1,217 @@
+import math
+import multiprocessing
+import queue as queue_lib
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from scraper import crawl_offers, apply_seen, DEFAULT_CONCURRENCY, DEFAULT_RATE_LIMIT
+from seen_index import SeenIndex
+from utils import save_offers
+import metrics
+
+DEFAULT_PROCESSES = 4
+QUEUE_BATCHES = 32   # ile partii może czekać na zapis (ogranicza pamięć procesu głównego)
+
+# Stan procesu roboczego ustawiany przez _init_worker
+_worker = {}
+
+
+class CrawlAborted(Exception):
+    """
+    Proces główny przerwał crawl (np. zapis partii się nie powiódł) – proces roboczy
+    nie wysyła kolejnych partii.
+    """
+
+
+class SharedBudget:
+    """
+    Limiter współdzielony przez wszystkie procesy robocze:
+      - semafor ogranicza łączną liczbę zapytań w locie (globalna współbieżność),
+      - wspólny "następny slot" w pamięci dzielonej ogranicza łączną liczbę zapytań/s.
+    Ma ten sam interfejs co scraper.HostRateLimiter (wait, slot), a on_throttle
+    (wywoływane przez request_policy.RequestPolicy) wstrzymuje wspólny slot.
+    """
+
+    def __init__(self, semaphore, next_slot, slot_lock, interval):
+        self.semaphore = semaphore
+        self.next_slot = next_slot
+        self.slot_lock = slot_lock
+        self.interval = interval
+
+    def wait(self, url):
+        if not self.interval:
+            return
+        with self.slot_lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.value)
+            self.next_slot.value = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    @contextmanager
+    def slot(self, url):
+        with self.semaphore:
+            self.wait(url)
+            yield
+
+    def on_throttle(self, url, delay=None):
+        # 429/503 w dowolnym procesie wstrzymuje wszystkie procesy (Retry-After albo 1 s)
+        with self.slot_lock:
+            pause_until = time.monotonic() + (delay or max(1.0, self.interval))
+            self.next_slot.value = max(self.next_slot.value, pause_until)
+
+
+def _init_worker(semaphore, next_slot, slot_lock, interval, batches, abort):
+    _worker["limiter"] = SharedBudget(semaphore, next_slot, slot_lock, interval)
+    _worker["batches"] = batches
+    _worker["abort"] = abort
+    # Po fork() proces roboczy dziedziczy metryki rodzica – zaczynamy od zera
+    metrics.registry.snapshot(reset=True)
+
+
+def _crawl_location(location, concurrency, incremental, crawl_kwargs):
+    """
+    Zadanie procesu roboczego: crawl jednej lokalizacji. Partie ofert (listy) i po
+    każdej z nich zmiany indeksu widzianych ogłoszeń (słownik) trafiają do kolejki,
+    a zapisuje je wyłącznie proces główny; na końcu znacznik (location, None).
+    Po sygnale 'abort' od procesu głównego kolejna partia kończy crawl (CrawlAborted).
+    """
+    batches = _worker["batches"]
+    abort = _worker["abort"]
+    stats = {}
+    start = time.perf_counter()
+
+    def send(payload):
+        if abort.is_set():
+            raise CrawlAborted(location)
+        batches.put((location, payload))
+
+    try:
+        # Zadanie mogło trafić do procesu już po przerwaniu (pula kolejkuje je z wyprzedzeniem)
+        if abort.is_set():
+            raise CrawlAborted(location)
+        total = crawl_offers(location, save=False, incremental=incremental, stats=stats,
+                             on_batch=send, on_seen=send,
+                             concurrency=concurrency, limiter=_worker["limiter"], **crawl_kwargs)
+    finally:
+        batches.put((location, None))
+    return {
+        "location": location,
+        "offers": total,
+        "seconds": round(time.perf_counter() - start, 2),
+        "stats": stats,
+        # Metryki procesu roboczego od poprzedniego zadania – proces główny je dolicza
+        "metrics": metrics.registry.snapshot(reset=True),
+    }
+
+
+def _drain(batches, futures, running):
+    # Po błędzie w procesie głównym: odbieramy (i porzucamy) partie, aż każdy proces
+    # roboczy wyśle znacznik końca – inaczej zablokowany na pełnej kolejce put()
+    # nie pozwoliłby zamknąć puli (shutdown(wait=True))
+    while running:
+        try:
+            _, batch = batches.get(timeout=1)
+        except queue_lib.Empty:
+            if all(f.done() for f in futures):
+                return
+            continue
+        if batch is None:
+            running -= 1
+
+
+def crawl_locations(locations, processes=DEFAULT_PROCESSES, concurrency=DEFAULT_CONCURRENCY * 2,
+                    rate_limit=DEFAULT_RATE_LIMIT, incremental=True, on_batch=None, **crawl_kwargs):
+    """
+    Crawluje wiele lokalizacji równolegle w puli 'processes' procesów.
+    'concurrency' i 'rate_limit' (zapytań/s) to wspólny budżet dla wszystkich procesów.
+    Procesy robocze tylko pobierają i parsują; partie ofert wracają kolejką do procesu
+    głównego, który jako jedyny zapisuje je do magazynu (brak konfliktów zapisu)
+    i wywołuje on_batch(location, batch); zmiany indeksu widzianych ogłoszeń zapisuje
+    dopiero po zapisaniu partii, z których pochodzą.
+    Zwraca listę podsumowań {"location", "offers", "seconds", "stats"} i drukuje je.
+    """
+    locations = list(locations)
+    if not locations:
+        return []
+    processes = max(1, min(processes, len(locations)))
+    per_worker = max(1, math.ceil(concurrency / processes))
+
+    semaphore = multiprocessing.BoundedSemaphore(max(1, concurrency))
+    next_slot = multiprocessing.Value("d", 0.0, lock=False)
+    slot_lock = multiprocessing.Lock()
+    interval = 1.0 / rate_limit if rate_limit else 0.0
+    batches = multiprocessing.Queue(maxsize=QUEUE_BATCHES)
+    abort = multiprocessing.Event()
+
+    start = time.perf_counter()
+    index = SeenIndex() if incremental else None
+    try:
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                 initargs=(semaphore, next_slot, slot_lock, interval, batches, abort)) as pool:
+            futures = [pool.submit(_crawl_location, location, per_worker, incremental, crawl_kwargs)
+                       for location in locations]
+            running = len(locations)
+            try:
+                while running:
+                    try:
+                        location, batch = batches.get(timeout=1)
+                    except queue_lib.Empty:
+                        # Proces roboczy mógł zginąć, zanim wysłał znacznik końca
+                        if all(f.done() for f in futures):
+                            break
+                        continue
+                    if batch is None:
+                        running -= 1
+                        continue
+                    if isinstance(batch, dict):
+                        # Partie tej lokalizacji sprzed tych zmian są już zapisane (kolejka FIFO)
+                        apply_seen(index, batch)
+                        continue
+                    save_offers(batch)
+                    if on_batch is not None:
+                        on_batch(location, batch)
+            except BaseException:
+                # Niezapisana partia: zatrzymujemy procesy robocze i czekamy na ich koniec
+                abort.set()
+                for future in futures:
+                    future.cancel()
+                _drain(batches, futures, running)
+                raise
+
+            summaries = []
+            for location, future in zip(locations, futures):
+                try:
+                    summary = future.result()
+                    metrics.registry.merge(summary.pop("metrics"))
+                    summaries.append(summary)
+                except Exception as e:
+                    print(f"[ERROR] Crawl lokalizacji {location} nie powiódł się: {e}")
+                    summaries.append({"location": location, "offers": 0, "seconds": None,
+                                      "stats": {}, "error": str(e)})
+    except BaseException:
+        # Niezapisane partie → ich zmiany indeksu też nie mogą zostać zatwierdzone
+        if index is not None:
+            index.rollback()
+        raise
+    finally:
+        if index is not None:
+            index.close()
+
+    print_summary(summaries, time.perf_counter() - start)
+    return summaries
+
+
+def print_summary(summaries, total_seconds=None):
+    """
+    Drukuje podsumowanie przebiegu z czasem każdej lokalizacji.
+    """
+    for s in summaries:
+        if s.get("error"):
+            print(f"[INFO] {s['location']}: błąd – {s['error']}")
+            continue
+        print(f"[INFO] {s['location']}: {s['offers']} ofert w {s['seconds']} s "
+              f"(pominięto bez zmian {s['stats'].get('skipped', 0)}, błędy {s['stats'].get('errors', 0)})")
+    if total_seconds is not None:
+        total = sum(s["offers"] for s in summaries)
+        print(f"[INFO] Razem: {total} ofert z {len(summaries)} lokalizacji w {total_seconds:.1f} s")
@@ -0,0 +1,207 @@
+import datetime
+from utils import load_config, query_offers, matches_location
+from tag_matcher import tag_offers, tag_stored_offers
+from history import PriceHistory, price_drops
+from notifier import get_notification_queue
+import metrics
+
+# Wspólny rdzeń dla interfejsów (cli.py, gui.py, scheduler.py): jeden przebieg
+# scrapowania z tagowaniem i powiadomieniami oraz powiadomienia z zapisanych danych.
+# Ciężkie moduły (requests, bs4, multiprocessing) są importowane dopiero w run_scrape.
+
+DEFAULT_SUBJECT = "Nowe oferty Otodom"
+
+
+def _by_flat(offers):
+    # Duplikat (to samo mieszkanie pod innym adresem) jest powiadamiany pod kluczem
+    # pierwszego ogłoszenia z grupy – o tym samym mieszkaniu powiadamiamy tylko raz
+    return [dict(o, notify_key=o["duplicate_of"]) if o.get("duplicate_of") else o for o in offers]
+
+
+def _matching(batch, tags):
+    # Oferty pasujące do fraz i oferty z obniżoną ceną (historia cen zapisana razem z partią)
+    tagged = tag_offers(batch, tags)
+    return _by_flat(o for o in tagged if o.get("tags")) + price_drops(batch)
+
+
+def _enqueue(config, matching, subject):
+    if not matching:
+        return 0
+    return get_notification_queue().enqueue(
+        matching, config["notify_email"], config["login_email"], config["email_password"], subject
+    )
+
+
+def run_scrape(config=None, locations=None, parallel=None, incremental=True, notify=True,
+               subject=DEFAULT_SUBJECT, cache=None, on_progress=None, durable=False, **crawl_kwargs):
+    """
+    Jeden przebieg scrapowania:
+      - crawl każdej lokalizacji z 'locations' (lista {"location", "tags"}; domyślnie
+        config["locations"]) – równolegle w procesach (parallel.crawl_locations), gdy
+        lokalizacji jest kilka, albo po kolei (crawl_offers, z pamięcią podręczną 'cache'),
+      - durable=True: przez trwałą kolejkę zadań (crawl_queue.py) – przerwany przebieg
+        wznawia się od ostatniej zatwierdzonej partii, a do crawla mogą dołączyć
+        kolejni pracownicy (run_queue_worker, także w innych procesach),
+      - tagowanie każdej partii frazami jej lokalizacji i wykrywanie obniżek cen,
+      - kolejkowanie powiadomienia e-mail (notify=True; wysyłka w tle – patrz notifier).
+    on_progress(location, stats, matching_count) jest wołane po każdej partii.
+    Zwraca podsumowanie {"offers", "cards", "skipped", "errors", "matching", "queued"}.
+    """
+    config = config or load_config()
+    entries = config["locations"] if locations is None else locations
+    tags_by_location = {entry["location"]: entry["tags"] for entry in entries}
+    if parallel is None:
+        parallel = len(entries) > 1 and cache is None and not durable
+    matching = []
+    stats = {}
+
+    if durable:
+        from crawl_queue import CrawlQueue, run_worker
+
+        def collect(location, batch):
+            matching.extend(_matching(batch, tags_by_location[location]))
+            if on_progress is not None:
+                on_progress(location, stats, len(matching))
+
+        with CrawlQueue() as queue:
+            crawl_ids = [queue.start_crawl(location, incremental=incremental,
+                                           **_crawl_settings(crawl_kwargs))
+                         for location in tags_by_location]
+            total = run_worker(queue, crawl_ids, on_batch=collect, stats=stats, cache=cache,
+                               **_worker_settings(crawl_kwargs))
+    elif parallel:
+        from parallel import crawl_locations
+
+        def collect(location, batch):
+            matching.extend(_matching(batch, tags_by_location[location]))
+            if on_progress is not None:
+                on_progress(location, stats, len(matching))
+
+        summaries = crawl_locations(list(tags_by_location), on_batch=collect,
+                                    incremental=incremental, **crawl_kwargs)
+        total = sum(s["offers"] for s in summaries)
+        for s in summaries:
+            for key, value in s["stats"].items():
+                stats[key] = stats.get(key, 0) + value
+    else:
+        from scraper import crawl_offers
+
+        total = 0
+        for location, tags in tags_by_location.items():
+            def collect(batch, location=location, tags=tags):
+                matching.extend(_matching(batch, tags))
+                if on_progress is not None:
+                    on_progress(location, stats, len(matching))
+
+            total += crawl_offers(location, on_batch=collect, incremental=incremental,
+                                  stats=stats, cache=cache, **crawl_kwargs)
+
+    queued = _enqueue(config, matching, subject) if notify else 0
+    return _summary(total, stats, matching, queued)
+
+
+def _summary(total, stats, matching, queued):
+    return {
+        "offers": total,
+        "cards": stats.get("cards", 0),
+        "skipped": stats.get("skipped", 0),
+        "errors": stats.get("errors", 0),
+        "matching": len(matching),
+        "queued": queued,
+    }
+
+
+def _crawl_settings(crawl_kwargs):
+    # Ustawienia zapisywane z crawlem w kolejce (wspólne dla wszystkich pracowników)
+    return {key: crawl_kwargs[key] for key in ("base_url", "max_pages") if key in crawl_kwargs}
+
+
+def _worker_settings(crawl_kwargs):
+    return {key: crawl_kwargs[key] for key in ("concurrency", "rate_limit", "batch_size") if key in crawl_kwargs}
+
+
+def run_queue_worker(config=None, notify=True, subject=DEFAULT_SUBJECT, cache=None, **worker_kwargs):
+    """
+    Dołącza do niezakończonych crawli z trwałej kolejki (crawl_queue.py), np. jako
+    kolejny proces lub maszyna obok run_scrape(durable=True). Oferty są tagowane
+    frazami swojej lokalizacji z konfiguracji (nieznana lokalizacja – config["tags"]).
+    Zwraca podsumowanie jak run_scrape.
+    """
+    from crawl_queue import CrawlQueue, run_worker
+
+    config = config or load_config()
+    tags_by_location = {entry["location"]: entry["tags"] for entry in config["locations"]}
+    matching = []
+    stats = {}
+
+    def collect(location, batch):
+        matching.extend(_matching(batch, tags_by_location.get(location, config["tags"])))
+
+    with CrawlQueue() as queue:
+        total = run_worker(queue, on_batch=collect, stats=stats, cache=cache, **worker_kwargs)
+    queued = _enqueue(config, matching, subject) if notify else 0
+    return _summary(total, stats, matching, queued)
+
+
+def run_notify(config=None, day=None, since=None, subject=DEFAULT_SUBJECT):
+    """
+    Powiadomienia z danych już zapisanych (bez sieci): oferty z dnia 'day' pasujące do
+    fraz swojej lokalizacji oraz obniżki cen z historii od 'since' (domyślnie ostatnie
+    24 h). O każdej ofercie/obniżce powiadamiamy najwyżej raz (NotifiedStore).
+    Zwraca podsumowanie {"matching", "price_drops", "queued"}.
+    """
+    config = config or load_config()
+    day = day or datetime.date.today().isoformat()
+    matching = []
+    for entry in config["locations"]:
+        if not entry["tags"]:
+            continue
+        # Z magazynu tylko oferty z dnia zawierające którąś z fraz (zapytanie z filtrem)
+        candidates = query_offers(day=day, tags=entry["tags"])
+        local = [o for o in candidates if matches_location(str(o.get("location", "")), entry["location"])]
+        matching.extend(_by_flat(o for o in tag_offers(local, entry["tags"]) if o.get("tags")))
+
+    since = since or (datetime.datetime.now() - datetime.timedelta(days=1)).isoformat(timespec="seconds")
+    with PriceHistory() as history:
+        changes = history.price_changes(since)
+    drops = price_drops([
+        {"url": c["url"], "title": c["title"], "price_change": {"old": c["old"], "new": c["new"]}}
+        for c in changes
+    ])
+    matching.extend(drops)
+    queued = _enqueue(config, matching, subject)
+    metrics.inc("notify_runs_total")
+    return {"matching": len(matching) - len(drops), "price_drops": len(drops), "queued": queued}
+
+
+def run_retag(tags, config=None, notify=False, subject=DEFAULT_SUBJECT, **filters):
+    """
+    Nowe frazy 'tags' dla ofert już zapisanych (tag_stored_offers; 'filters' jak
+    w utils.query_offers). notify=True kolejkuje powiadomienia o znalezionych ofertach
+    (jak zwykle najwyżej raz na ogłoszenie/mieszkanie).
+    Zwraca {"offers": znalezione oferty, "matching": ich liczba, "queued"}.
+    """
+    matching = _by_flat(tag_stored_offers(tags, **filters))
+    queued = _enqueue(config or load_config(), matching, subject) if notify else 0
+    return {"offers": matching, "matching": len(matching), "queued": queued}
+
+
+def schedule_scrapes(scheduler, make_job, config=None):
+    """
+    Rejestruje w harmonogramie (job_scheduler.JobScheduler) osobne zadanie
+    "scrape:<lokalizacja>" dla każdej lokalizacji z konfiguracji, z jej własnym odstępem
+    (config.txt: "lokalizacja | frazy | 30m"; domyślnie job_scheduler.DEFAULT_INTERVAL).
+    make_job(entry) zwraca funkcję bez argumentów wykonującą jeden przebieg.
+    Ponowne wywołanie aktualizuje zadania (np. po zmianie konfiguracji) i usuwa zadania
+    lokalizacji, których już nie ma. Zwraca nazwy zadań.
+    """
+    config = config or load_config()
+    names = []
+    for entry in config["locations"]:
+        name = f"scrape:{entry['location']}"
+        scheduler.add(name, make_job(entry), entry.get("interval"))
+        names.append(name)
+    for name in scheduler.job_names():
+        if name.startswith("scrape:") and name not in names:
+            scheduler.remove(name)
+    return names
@@ -0,0 +1,254 @@
+import email.utils
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlparse
+import requests
+import metrics
+
+DEFAULT_TIMEOUT = 10                         # s – każde zapytanie do Otodom ma limit czasu
+RETRY_STATUSES = {429, 500, 502, 503, 504}   # odpowiedzi, które warto ponowić
+THROTTLE_STATUSES = {429, 503}               # sygnał "zwolnij" dla limitera
+UNLIMITED_FALLBACK_RATE = 10.0               # zapytań/s po pierwszym 429, gdy limitu nie było
+
+
+class CircuitOpen(Exception):
+    """
+    Bezpiecznik dla hosta jest otwarty – zapytanie nie zostało wysłane.
+    """
+
+
+def _host(url):
+    return urlparse(url).netloc
+
+
+def retry_after_seconds(resp):
+    """
+    Wartość nagłówka Retry-After w sekundach (liczba sekund albo data HTTP) lub None.
+    """
+    value = resp.headers.get("Retry-After") if resp is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class AdaptiveRateLimiter:
+    """
+    Limiter zapytań/s na hosta, który dostosowuje tempo do odpowiedzi serwera (AIMD):
+      - każda udana odpowiedź zwiększa tempo addytywnie (ok. +increase zapytań/s na sekundę),
+        najwyżej do max_rate,
+      - 429/503 zmniejsza tempo multiplikatywnie (× decrease), najniżej do min_rate,
+        i wstrzymuje wszystkie wątki dla hosta na czas z Retry-After; seria odrzuceń
+        z tego samego okna (wiele wątków naraz) zmniejsza tempo tylko raz.
+    Ma ten sam interfejs co scraper.HostRateLimiter (wait, slot) oraz on_success/on_throttle
+    wywoływane przez RequestPolicy. max_rate=None – bez górnego limitu.
+    """
+
+    def __init__(self, max_rate, min_rate=0.5, increase=2.0, decrease=0.5):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self._rate = {}         # host → bieżące tempo (None = bez limitu)
+        self._next_slot = {}
+        self._hold_until = {}   # host → do kiedy ignorujemy kolejne odrzucenia
+        self._lock = threading.Lock()
+
+    def rate(self, url):
+        with self._lock:
+            return self._rate.get(_host(url), self.max_rate)
+
+    def wait(self, url):
+        host = _host(url)
+        with self._lock:
+            rate = self._rate.get(host, self.max_rate)
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + (1.0 / rate if rate else 0.0)
+        if slot > now:
+            time.sleep(slot - now)
+
+    @contextmanager
+    def slot(self, url):
+        self.wait(url)
+        yield
+
+    def on_success(self, url):
+        host = _host(url)
+        with self._lock:
+            rate = self._rate.get(host, self.max_rate)
+            if not rate:
+                return
+            rate += self.increase / rate
+            if self.max_rate:
+                rate = min(rate, self.max_rate)
+            self._rate[host] = rate
+
+    def on_throttle(self, url, delay=None):
+        host = _host(url)
+        now = time.monotonic()
+        with self._lock:
+            if delay:
+                # Wszystkie wątki czekają na koniec okna z Retry-After
+                self._next_slot[host] = max(self._next_slot.get(host, 0.0), now + delay)
+            if now < self._hold_until.get(host, 0.0):
+                return
+            rate = self._rate.get(host, self.max_rate) or UNLIMITED_FALLBACK_RATE / self.decrease
+            rate = max(self.min_rate, rate * self.decrease)
+            self._rate[host] = rate
+            self._hold_until[host] = now + max(delay or 0.0, 1.0)
+        metrics.inc("rate_decreases_total")
+
+
+class CircuitBreaker:
+    """
+    Bezpiecznik na hosta: gdy w ostatnich 'window' zapytaniach co najmniej
+    'failure_ratio' zakończyło się błędem (min. 'min_calls' zapytań), host jest
+    "otwarty" przez 'cooldown' s i zapytania od razu kończą się CircuitOpen.
+    Po tym czasie przepuszczamy jedno zapytanie próbne: sukces zamyka bezpiecznik,
+    błąd otwiera go ponownie na dwa razy dłużej (najwyżej max_cooldown).
+    """
+
+    def __init__(self, window=20, min_calls=10, failure_ratio=0.5, cooldown=30.0, max_cooldown=600.0):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._outcomes = {}     # host → deque(bool)
+        self._open_until = {}   # host → monotonic
+        self._cooldown = {}
+        self._probing = set()
+        self._lock = threading.Lock()
+
+    def before(self, url):
+        host = _host(url)
+        with self._lock:
+            open_until = self._open_until.get(host)
+            if open_until is None:
+                return
+            if time.monotonic() < open_until or host in self._probing:
+                raise CircuitOpen(f"Bezpiecznik otwarty dla {host}")
+            self._probing.add(host)   # półotwarty: jedno zapytanie próbne
+
+    def record(self, url, ok):
+        host = _host(url)
+        with self._lock:
+            if host in self._probing:
+                self._probing.discard(host)
+                if ok:
+                    self._close(host)
+                else:
+                    self._open(host, min(self.max_cooldown, 2 * self._cooldown.get(host, self.cooldown)))
+                return
+            outcomes = self._outcomes.setdefault(host, deque(maxlen=self.window))
+            outcomes.append(ok)
+            failures = outcomes.count(False)
+            if (host not in self._open_until and len(outcomes) >= self.min_calls
+                    and failures >= self.failure_ratio * len(outcomes)):
+                self._open(host, self.cooldown)
+
+    def release(self, url):
+        # Zapytanie próbne bez wyniku dla bezpiecznika (429, nieoczekiwany wyjątek) –
+        # zwalniamy miejsce na kolejną próbę zamiast blokować hosta na zawsze
+        with self._lock:
+            self._probing.discard(_host(url))
+
+    def is_open(self, url):
+        with self._lock:
+            return _host(url) in self._open_until
+
+    def _open(self, host, cooldown):
+        self._cooldown[host] = cooldown
+        self._open_until[host] = time.monotonic() + cooldown
+        self._outcomes.pop(host, None)
+        metrics.inc("circuit_opened_total")
+        print(f"[WARN] Serwer {host} odpowiada błędami – wstrzymano zapytania na {cooldown:.0f} s")
+
+    def _close(self, host):
+        self._open_until.pop(host, None)
+        self._cooldown.pop(host, None)
+        self._outcomes.pop(host, None)
+        print(f"[INFO] Serwer {host} znów odpowiada – wznowiono zapytania")
+
+
+class RequestPolicy:
+    """
+    Polityka wysyłania zapytań dla http_get:
+      - ponawia błędy sieci i odpowiedzi z RETRY_STATUSES (najwyżej 'max_retries' razy)
+        z wykładniczym opóźnieniem z losowym rozrzutem ("full jitter"),
+        a przy nagłówku Retry-After czeka tyle, ile prosi serwer (dłuższe okno niż
+        max_retry_after kończy ponawianie – nie blokujemy wątku na wiele minut),
+      - przekazuje limiterowi informację zwrotną (on_success/on_throttle), jeśli ją obsługuje
+        (AdaptiveRateLimiter) – tempo zapytań dopasowuje się do odsetka błędów,
+      - korzysta z bezpiecznika (CircuitBreaker), gdy serwer wyraźnie niedomaga
+        (błędy sieci i 5xx; 429 tylko spowalnia limiter).
+    max_retries=0 i breaker=False daje dawne zachowanie (jedna próba).
+    """
+
+    def __init__(self, max_retries=4, backoff_base=0.5, backoff_max=30.0, max_retry_after=120.0,
+                 breaker=None, seed=None):
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker() if breaker is None else (breaker or None)
+        self._random = random.Random(seed)
+
+    def backoff(self, attempt):
+        return self._random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def send(self, url, limiter, request):
+        """
+        Wysyła request() (w slocie limitera) zgodnie z polityką. Zwraca ostatnią
+        odpowiedź albo rzuca ostatni błąd requests (RequestException) / CircuitOpen.
+        """
+        for attempt in range(self.max_retries + 1):
+            if self.breaker is not None:
+                self.breaker.before(url)
+            error = resp = None
+            recorded = False
+            try:
+                try:
+                    with limiter.slot(url):
+                        resp = request()
+                except requests.RequestException as e:
+                    error = e
+
+                if resp is not None and resp.status_code not in RETRY_STATUSES:
+                    if self.breaker is not None:
+                        self.breaker.record(url, ok=True)
+                        recorded = True
+                    if hasattr(limiter, "on_success"):
+                        limiter.on_success(url)
+                    return resp
+
+                # 429 to prośba o zwolnienie (obsługuje ją limiter), a nie awaria serwera
+                if self.breaker is not None and (resp is None or resp.status_code != 429):
+                    self.breaker.record(url, ok=False)
+                    recorded = True
+            finally:
+                if self.breaker is not None and not recorded:
+                    self.breaker.release(url)
+            retry_after = retry_after_seconds(resp)
+            if resp is not None and resp.status_code in THROTTLE_STATUSES and hasattr(limiter, "on_throttle"):
+                limiter.on_throttle(url, retry_after)
+            if attempt == self.max_retries or (retry_after or 0) > self.max_retry_after:
+                break
+            reason = resp.status_code if resp is not None else type(error).__name__
+            metrics.inc("http_retries_total", reason=reason)
+            time.sleep(retry_after if retry_after is not None else self.backoff(attempt))
+
+        if error is not None:
+            raise error
+        return resp
@@ -1,24 +1,27 @@
-import time
-import schedule
-from scraper import get_offers
-from analyzer import tag_offers
-from notifier import send_email
-from utils import load_config, read_saved_offers
+from job_scheduler import JobScheduler
+from pipeline import run_scrape, schedule_scrapes
+import metrics
 
-def job():
-    config = load_config()
-    offers = get_offers(config['location'])
-    tagged = tag_offers(offers, config['tags'])
-    matching = [o for o in tagged if o['tags']]
-    
-    if matching:
-        message = "\n\n".join([f"{o['title']}\n{o['url']}\n{o['tags']}" for o in matching])
-        send_email("Nowe oferty!", message, config['notify_email'], config['login_email'], config['email_password'])
+CONFIG_RELOAD_INTERVAL = 300   # s – co ile sprawdzamy zmiany lokalizacji/fraz w config.txt
+
+
+def make_job(entry):
+    def job():
+        # OTODOM_PROFILE=cprofile|tracemalloc włącza profilowanie przebiegu
+        with metrics.profile():
+            # Jedna lokalizacja na zadanie (własny odstęp i rozrzut terminów); podstrony
+            # pobieramy tylko dla nowych lub zmienionych ogłoszeń, a powiadomienia
+            # (dopasowania fraz i obniżki cen) idą w tle, zbiorczo, najwyżej raz na ogłoszenie
+            run_scrape(locations=[entry], parallel=False, incremental=True, subject="Nowe oferty!")
+        # Metryki przebiegu: linia JSON w logs/metrics.jsonl i plik logs/otodom.prom
+        metrics.export(event="job", location=entry["location"])
+    return job
 
-schedule.every(1).hours.do(job)
 
 if __name__ == "__main__":
-    job()  # uruchomienie na start
-    while True:
-        schedule.run_pending()
-        time.sleep(60)
\ No newline at end of file
+    scheduler = JobScheduler()
+    # Lokalizacje bez zapisanego stanu ruszają od razu, pozostałe wracają do swoich
+    # terminów (restart/wdrożenie nie wywołuje scrapowania wszystkiego od nowa)
+    schedule_scrapes(scheduler, make_job)
+    scheduler.add("config", lambda: schedule_scrapes(scheduler, make_job), CONFIG_RELOAD_INTERVAL)
+    scheduler.run_forever()
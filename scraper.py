@@ -1,116 +1,520 @@
 # scraper.py
 
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
-import datetime
-from urllib.parse import urljoin
-from utils import save_offers_to_excel, load_config
+import hashlib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+from utils import save_offers, touch_offers, load_config, matches_location
+from seen_index import SeenIndex
+from extractors import extract_fields, parse_time_report
+from offer_model import Offer
+from http_cache import CacheMiss, url_class
+from request_policy import AdaptiveRateLimiter, RequestPolicy, DEFAULT_TIMEOUT
+import metrics
 
 HEADERS = {"User-Agent": "Mozilla/5.0"}
+BASE_URL = "https://www.otodom.pl"
 
+# Domyślne ustawienia trybu współbieżnego
+DEFAULT_CONCURRENCY = 8     # ile podstron ogłoszeń pobieramy jednocześnie
+DEFAULT_RATE_LIMIT = 4.0    # maks. liczba zapytań na sekundę do jednego hosta (None = bez limitu)
 
-def get_offers(location_filter):
+# Wynik pobrania podstrony, gdy serwer odpowiedział 304 Not Modified
+NOT_MODIFIED = "not_modified"
+
+
+class HostRateLimiter:
     """
-    Pobiera oferty z Otodom dla danej lokalizacji (location_filter).
-    Krok 1: Ze strony wyników zbiera tylko podstawowe dane (link do detail page).
-    Krok 2: Wejdzie na każdą podstronę ogłoszenia i zbiera:
-       - tytuł (h1[data-cy="adPageAdTitle"]),
-       - cenę (strong[data-cy="adPageHeaderPrice"]),
-       - cenę za m² (div[aria-label="Cena za metr kwadratowy"]),
-       - lokalizację (MapLink → <a> wewnątrz),
-       - wszystkie etykieta→wartość z sekcji <div data-sentry-element="ItemGridContainer">,
-       - opis (div[data-cy="adPageAdDescription"]).
-    Na koniec zapisuje listę słowników do pliku Excel i zwraca ją.
+    Ogranicza liczbę zapytań na sekundę osobno dla każdego hosta.
+    Kolejne zapytania do tego samego hosta dostają "sloty" co 1/rate sekundy,
+    więc limiter działa poprawnie także przy wielu wątkach naraz.
+    rate=None (lub 0) wyłącza ograniczenie.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    @contextmanager
+    def slot(self, url):
+        """
+        Okno na jedno zapytanie: czeka na swój slot; inne limitery (np.
+        parallel.SharedBudget) mogą tu dodatkowo ograniczać liczbę zapytań w locie.
+        """
+        self.wait(url)
+        yield
+
+
+def make_session(pool_size=DEFAULT_CONCURRENCY):
+    """
+    Tworzy requests.Session z pulą połączeń keep-alive o rozmiarze 'pool_size',
+    współdzieloną przez wszystkie wątki pobierające podstrony.
+    """
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(1, pool_size))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def http_get(session, limiter, url, cache=None, refresh=False, policy=None, **kwargs):
+    """
+    GET przez wspólną sesję z limitem zapytań na hosta i opcjonalną pamięcią
+    podręczną (http_cache.HttpCache). refresh=True pomija odczyt z pamięci
+    podręcznej (np. gdy wiemy, że ogłoszenie się zmieniło).
+    W trybie cache.replay_only brak wpisu kończy się wyjątkiem CacheMiss.
+    'policy' (request_policy.RequestPolicy) – ponawianie 429/5xx z opóźnieniem,
+    Retry-After, informacja zwrotna dla limitera i bezpiecznik; bez niej jedna próba.
+    Domyślny limit czasu zapytania: DEFAULT_TIMEOUT s.
+    Czas zapytania, liczba pobranych bajtów, kody odpowiedzi i trafienia pamięci
+    podręcznej trafiają do metryk (metrics.py).
+    """
+    kind = url_class(url)
+    if cache is not None:
+        cached = None if refresh and not cache.replay_only else cache.get(url)
+        if cached is not None:
+            metrics.inc("http_cache_hits_total", kind=kind)
+            return cached
+        metrics.inc("http_cache_misses_total", kind=kind)
+        if cache.replay_only:
+            raise CacheMiss(url)
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+
+    def request():
+        with metrics.timer("http_request_seconds", kind=kind):
+            response = session.get(url, **kwargs)
+        metrics.inc("http_responses_total", kind=kind, status=response.status_code)
+        return response
+
+    if policy is not None:
+        resp = policy.send(url, limiter, request)
+    else:
+        with limiter.slot(url):
+            resp = request()
+    metrics.inc("http_bytes_total", len(resp.content), kind=kind)
+    if cache is not None and resp.status_code == 200:
+        cache.put(url, resp.text)
+    return resp
+
+
+def search_url(location_filter, page=1, base_url=BASE_URL):
     """
-    # 1. Otwieramy listę wyników
-    search_url = f"https://www.otodom.pl/pl/wyniki/sprzedaz/mieszkanie/{location_filter}?limit=72"
-    resp = requests.get(search_url, headers=HEADERS)
-    soup = BeautifulSoup(resp.text, "html.parser")
+    Zwraca adres strony wyników nr 'page' (72 ogłoszenia na stronę).
+    """
+    url = f"{base_url}/pl/wyniki/sprzedaz/mieszkanie/{location_filter}?limit=72"
+    if page > 1:
+        url += f"&page={page}"
+    return url
 
-    offers = []
-    articles = soup.select('article[data-cy="listing-item"]')
 
-    for article in articles:
+def parse_listing_cards(html, base_url=BASE_URL):
+    """
+    Zwraca wszystkie karty ogłoszeń ze strony wyników (bez filtrowania lokalizacji)
+    jako listę słowników {"url", "list_location", "price", "fingerprint"}.
+    'fingerprint' to skrót całego tekstu karty – zmienia się, gdy zmieni się
+    cena, tytuł lub inne dane widoczne w wynikach.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+
+    cards = []
+    for article in soup.select('article[data-cy="listing-item"]'):
+        full_url = ""
         try:
             # 1.1. Link do podstrony ogłoszenia
             a_tag = article.select_one('a[data-cy="listing-item-link"]')
             href = a_tag["href"] if (a_tag and a_tag.has_attr("href")) else ""
-            full_url = urljoin("https://www.otodom.pl", href)
+            full_url = urljoin(base_url, href)
 
             # 1.2. Z listy pobierz przybliżoną lokalizację, jeśli chcesz sprawdzić filtr lokacji:
             loc_el = article.select_one('[data-sentry-component="Address"]')
             list_location = loc_el.get_text(strip=True) if loc_el else ""
 
-            normalized_input = location_filter.lower().replace("/", " ").replace(",", " ")
-            normalized_target = list_location.lower().replace("/", " ").replace(",", " ")
-            if not all(part in normalized_target for part in normalized_input.split()):
-                # Pomijamy, jeśli podstrona nie odpowiada dokładnie lokalizacji
-                continue
-
-            # 2. Otwieramy detail page
-            det_resp = requests.get(full_url, headers=HEADERS, timeout=10)
-            det_soup = BeautifulSoup(det_resp.text, "html.parser")
-
-            # 2.1. Tytuł ogłoszenia
-            title_el = det_soup.select_one('h1[data-cy="adPageAdTitle"]')
-            title = title_el.get_text(strip=True) if title_el else "brak"
-
-            # 2.2. Cena
-            price_el = det_soup.select_one('strong[data-cy="adPageHeaderPrice"]')
-            price = price_el.get_text(strip=True) if price_el else "brak"
-
-            # 2.3. Cena za m²
-            price_m2_el = det_soup.select_one('div[aria-label="Cena za metr kwadratowy"]')
-            price_per_m2 = price_m2_el.get_text(strip=True) if price_m2_el else "brak"
-
-            # 2.4. Dokładna lokalizacja (MapLink → <a> wewnątrz)
-            maplink_el = det_soup.select_one('div[data-sentry-component="MapLink"] a')
-            location = maplink_el.get_text(strip=True) if maplink_el else list_location or "brak"
-
-            # 2.5. Opis ogłoszenia
-            desc_container = det_soup.select_one('div[data-cy="adPageAdDescription"]')
-            description = desc_container.get_text(" ", strip=True) if desc_container else "brak"
-
-            # 2.6. Specyfikacja – wszystkie etykieta→wartość z ItemGridContainer
-            #     Każdy wiersz to <div data-sentry-element="ItemGridContainer">
-            #       <p data-sentry-element="Item">Label:</p>
-            #       <p class="...">Value</p>
-            #     </div>
-            details = {}
-            for container in det_soup.select('div[data-sentry-element="ItemGridContainer"]'):
-                ps = container.select('p')
-                if len(ps) >= 2:
-                    label = ps[0].get_text(strip=True).rstrip(":").strip()
-                    # ps[1] może zawierać &nbsp; lub kolejne fragmenty, zbierz cały tekst
-                    value = ps[1].get_text(" ", strip=True)
-                    details[label] = value
-
-            # 2.7. Utwórz kompletny słownik oferty
-            offer_dict = {
-                "title": title,
-                "price": price,
-                "price_per_m2": price_per_m2,
-                "location": location,
-                "description": description,
-                "url": full_url,
-                "date": str(datetime.datetime.now())
-            }
-            # Doklejamy wszystkie zebrane pola specyfikacji:
-            # Możesz później odczytać te kolumny, np. "Powierzchnia", "Liczba pokoi" itd.
-            for key, val in details.items():
-                offer_dict[key] = val
-
-            offers.append(offer_dict)
+            # 1.3. Cena z karty wyników i skrót treści karty (do trybu przyrostowego)
+            price_el = article.select_one('[data-sentry-element="MainPrice"]')
+            card_price = price_el.get_text(strip=True) if price_el else ""
+            fingerprint = hashlib.sha1(article.get_text(" ", strip=True).encode("utf-8")).hexdigest()
 
+            cards.append({
+                "url": full_url,
+                "list_location": list_location,
+                "price": card_price,
+                "fingerprint": fingerprint
+            })
         except Exception as e:
+            metrics.count_error("listing_card", e)
             print(f"[WARN] Błąd przy analizie ogłoszenia {full_url}: {e}")
-            continue
+    return cards
+
+
+def parse_listing_page(html, location_filter, base_url=BASE_URL):
+    """
+    Ze strony wyników zwraca karty ogłoszeń, których adres odpowiada filtrowi lokalizacji.
+    """
+    # Pomijamy karty, które nie odpowiadają dokładnie lokalizacji
+    return [card for card in parse_listing_cards(html, base_url)
+            if matches_location(card["list_location"], location_filter)]
+
+
+def parse_offer_details(html, full_url, list_location=""):
+    """
+    Parsuje HTML podstrony ogłoszenia i zwraca kompletną ofertę (offer_model.Offer –
+    liczby sparsowane raz, pola specyfikacji internowane; działa też jak dawny słownik).
+    Pola wyciąga pierwszy pasujący ekstraktor z extractors.EXTRACTOR_ORDER
+    (osadzony JSON strony, lxml, selektory BeautifulSoup).
+    """
+    _, fields = extract_fields(html)
+    return Offer.from_fields(fields, full_url, list_location)
+
+
+def fetch_detail(session, limiter, card, headers=None, cache=None, refresh=False, policy=None):
+    """
+    Pobiera i parsuje podstronę ogłoszenia dla karty z wyników (wywoływane w wątku roboczym).
+    'headers' to opcjonalne nagłówki zapytania warunkowego (If-None-Match / If-Modified-Since).
+    refresh=True pomija odczyt z pamięci podręcznej 'cache' (ogłoszenie się zmieniło).
+    'policy' – polityka ponawiania zapytań (patrz http_get).
+    Zwraca krotkę (oferta, nagłówki odpowiedzi); oferta to słownik, NOT_MODIFIED
+    (odpowiedź 304) albo None, jeśli wystąpił błąd.
+    """
+    full_url = card["url"]
+    try:
+        det_resp = http_get(session, limiter, full_url, cache, refresh=refresh, policy=policy,
+                            headers=headers)
+        if det_resp.status_code == 304:
+            return NOT_MODIFIED, det_resp.headers
+        if det_resp.status_code != 200:
+            # Błąd, którego nie udało się ponowić – nie parsujemy strony błędu
+            raise requests.HTTPError(f"HTTP {det_resp.status_code}")
+        return parse_offer_details(det_resp.text, full_url, card["list_location"]), det_resp.headers
+    except Exception as e:
+        metrics.count_error("detail", e)
+        print(f"[WARN] Błąd przy analizie ogłoszenia {full_url}: {e}")
+        return None, {}
+
+
+def fetch_offer(session, limiter, full_url, list_location=""):
+    """
+    Pobiera i parsuje jedną podstronę ogłoszenia.
+    Zwraca słownik oferty albo None, jeśli wystąpił błąd.
+    """
+    offer, _ = fetch_detail(session, limiter, {"url": full_url, "list_location": list_location})
+    return offer
 
-    # 3. Zapisz wszystkie pobrane oferty do Excela
-    save_offers_to_excel(offers)
+
+def iter_listing_cards(session, limiter, location_filter, base_url=BASE_URL, max_pages=None,
+                       stop_on_seen=None, cache=None, policy=None):
+    """
+    Generator przechodzący kolejne strony wyników (page=1, 2, ...) i zwracający
+    karty ogłoszeń pasujące do lokalizacji.
+    Następna strona wyników jest pobierana w tle, gdy przetwarzamy bieżącą.
+    Zatrzymuje się, gdy:
+      - strona jest pusta lub powtarza poprzednią – koniec wyników,
+      - osiągnięto 'max_pages' stron,
+      - 'stop_on_seen' (zbiór znanych URL-i) zawiera wszystkie ogłoszenia ze strony.
+    Strona wyników, której nie udało się pobrać mimo ponowień, kończy się wyjątkiem
+    requests.HTTPError (a nie cichym końcem wyników).
+    """
+    def fetch_page(page):
+        url = search_url(location_filter, page, base_url)
+        try:
+            resp = http_get(session, limiter, url, cache, policy=policy)
+            if resp.status_code != 200:
+                raise requests.HTTPError(f"HTTP {resp.status_code} dla {url}")
+            html = resp.text
+            with metrics.timer("parse_seconds", page="listing"):
+                return parse_listing_cards(html, base_url)
+        except CacheMiss:
+            return []
+
+    previous_urls = set()
+    with ThreadPoolExecutor(max_workers=1) as page_pool:
+        page = 1
+        next_page = page_pool.submit(fetch_page, page)
+        while next_page is not None:
+            cards = next_page.result()
+            next_page = None
+            # Strona za ostatnią zwraca pustą listę albo powtórkę wcześniejszej strony
+            new_cards = [card for card in cards if card["url"] not in previous_urls]
+            if not new_cards:
+                break
+            if stop_on_seen is not None and all(card["url"] in stop_on_seen for card in new_cards):
+                break
+            previous_urls = {card["url"] for card in cards}
+
+            if max_pages is None or page < max_pages:
+                page += 1
+                next_page = page_pool.submit(fetch_page, page)
+
+            for card in new_cards:
+                if matches_location(card["list_location"], location_filter):
+                    yield card
+
+
+def iter_offers(location_filter, concurrency=DEFAULT_CONCURRENCY, rate_limit=DEFAULT_RATE_LIMIT,
+                base_url=BASE_URL, max_pages=None, max_offers=None, stop_on_seen=None,
+                index=None, stats=None, cache=None, limiter=None, policy=None):
+    """
+    Tryb "crawl": generator zwracający oferty (słowniki jak w get_offers) ze wszystkich
+    stron wyników dla danej lokalizacji, w kolejności stron wyników.
+    Podstrony ogłoszeń są pobierane już w trakcie wczytywania kolejnych stron wyników.
+    W pamięci trzymamy najwyżej 2 * concurrency ofert "w locie", więc zużycie pamięci
+    nie zależy od liczby ogłoszeń w lokalizacji.
+    Warunki stopu: max_pages, max_offers, stop_on_seen (patrz iter_listing_cards).
+    Tryb przyrostowy: jeśli podano 'index' (SeenIndex), podstrony są pobierane tylko
+    dla nowych ogłoszeń i takich, których karta w wynikach się zmieniła; znane
+    ogłoszenia pobieramy zapytaniem warunkowym (ETag / Last-Modified). Zmiany indeksu
+    są tylko przygotowywane (index.stage...) – zapisuje je apply_seen po zapisaniu ofert.
+    Do słownika 'stats' (jeśli podany) trafiają liczniki: cards, fetched, skipped,
+    not_modified, errors – patrz format_report.
+    'cache' (http_cache.HttpCache) – dyskowa pamięć podręczna stron wyników i podstron;
+    z HttpCache(replay_only=True) przebieg nie korzysta z sieci wcale.
+    'limiter' – własny limiter zapytań (np. wspólny dla wielu procesów, parallel.py);
+    domyślnie request_policy.AdaptiveRateLimiter – startuje od 'rate_limit' zapytań/s
+    i zwalnia po odpowiedziach 429/503.
+    'policy' – polityka ponawiania (domyślnie RequestPolicy(): ponowienia z opóźnieniem,
+    Retry-After i bezpiecznik).
+    """
+    concurrency = max(1, int(concurrency))
+    window = 2 * concurrency
+    session = make_session(concurrency)
+    limiter = limiter or AdaptiveRateLimiter(rate_limit)
+    policy = policy or RequestPolicy()
+    pending = deque()
+    yielded = 0
+    stats = stats if stats is not None else {}
+    for key in ("cards", "fetched", "skipped", "not_modified", "errors"):
+        stats.setdefault(key, 0)
+
+    def submit(pool, card):
+        stats["cards"] += 1
+        headers = None
+        entry = None
+        if index is not None:
+            entry = index.get(card["url"])
+            if entry and entry["fingerprint"] == card["fingerprint"]:
+                # Karta bez zmian od ostatniego przebiegu – nie pobieramy podstrony
+                index.stage_unchanged(card["url"])
+                stats["skipped"] += 1
+                return
+            headers = index.conditional_headers(entry)
+        pending.append((card, pool.submit(fetch_detail, session, limiter, card, headers, cache,
+                                          entry is not None, policy)))
+
+    def resolve(card, future):
+        offer, resp_headers = future.result()
+        if offer is None:
+            stats["errors"] += 1
+            return None
+        stats["not_modified" if offer is NOT_MODIFIED else "fetched"] += 1
+        if index is not None:
+            index.stage(card["url"], card["fingerprint"], card["price"],
+                        resp_headers.get("ETag"), resp_headers.get("Last-Modified"))
+            if offer is NOT_MODIFIED:
+                # Oferty nie zapisujemy ponownie – w magazynie podbijamy tylko day/last_seen
+                index.stage_unchanged(card["url"])
+        return None if offer is NOT_MODIFIED else offer
+
+    def completed(pool, cards):
+        # Zlecamy pobieranie kolejnych kart, oddając wyniki w kolejności zlecenia
+        for card in cards:
+            submit(pool, card)
+            while len(pending) >= window:
+                yield resolve(*pending.popleft())
+        while pending:
+            yield resolve(*pending.popleft())
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            cards = iter_listing_cards(session, limiter, location_filter, base_url,
+                                       max_pages, stop_on_seen, cache, policy)
+            try:
+                for offer in completed(pool, cards):
+                    if offer is None:
+                        continue
+                    yield offer
+                    yielded += 1
+                    if max_offers is not None and yielded >= max_offers:
+                        return
+            finally:
+                for _, future in pending:
+                    future.cancel()
+                cards.close()
+    finally:
+        session.close()
+
+
+def format_report(stats):
+    """
+    Zwraca jednolinijkowy raport z przebiegu na podstawie liczników z iter_offers.
+    """
+    return (
+        f"[INFO] Raport: ogłoszeń w wynikach {stats.get('cards', 0)}, "
+        f"pobrano {stats.get('fetched', 0)}, "
+        f"pominięto bez zmian {stats.get('skipped', 0)}, "
+        f"niezmienione (304) {stats.get('not_modified', 0)}, "
+        f"błędy {stats.get('errors', 0)}"
+    )
+
+
+@contextmanager
+def _seen_index(incremental):
+    # Indeks widzianych ogłoszeń na czas crawla (None bez trybu przyrostowego);
+    # po błędzie niezatwierdzone zmiany są porzucane, a nie zatwierdzane przy zamknięciu
+    index = SeenIndex() if incremental else None
+    if index is None:
+        yield None
+        return
+    try:
+        yield index
+    except BaseException:
+        index.rollback()
+        raise
+    finally:
+        index.close()
+
+
+def apply_seen(index, staged, save=True):
+    """
+    Zapisuje w indeksie 'index' zmiany przygotowane podczas crawla (index.take_staged())
+    – wołane dopiero po zapisaniu ofert z tej partii do magazynu.
+    Przy save=True podbija też day/last_seen w magazynie ofert dla ogłoszeń bez zmian
+    (pominiętych i 304), które crawl pomija – inaczej znikałyby z widoku "dzisiaj".
+    Przy save=False oferty nie trafiły do magazynu, więc zmiany są porzucane – inaczej
+    następny crawl przyrostowy pominąłby te ogłoszenia jako znane i bez zmian.
+    """
+    if index is None or staged is None:
+        return
+    if not save:
+        index.rollback()
+        return
+    if staged["unchanged"]:
+        touch_offers(staged["unchanged"])
+    index.apply(staged)
+
+
+def _run_crawl(location_filter, index, stats, **crawl_kwargs):
+    """
+    iter_offers z indeksem widzianych ogłoszeń 'index' (albo None); po zakończeniu
+    drukuje raport (także czasy parsowania per ekstraktor), dolicza liczniki do metryk
+    i zapisuje strukturalny log "crawl".
+    """
+    stats = stats if stats is not None else {}
+    start = time.perf_counter()
+    before = dict(stats)
+    try:
+        yield from iter_offers(location_filter, index=index, stats=stats, **crawl_kwargs)
+    finally:
+        delta = {key: value - before.get(key, 0) for key, value in stats.items()}
+        for key, value in delta.items():
+            metrics.inc("listings_total", value, result=key)
+        metrics.log_event("crawl", location=location_filter, incremental=index is not None,
+                          seconds=round(time.perf_counter() - start, 3), stats=delta)
+        print(format_report(stats))
+        if crawl_kwargs.get("cache") is not None:
+            cache_stats = crawl_kwargs["cache"].stats()
+            print(f"[INFO] Pamięć podręczna HTTP: trafienia {cache_stats['hits']}, "
+                  f"chybienia {cache_stats['misses']}, rozmiar {cache_stats['bytes'] // 1024} KB")
+        for name, row in parse_time_report(reset=True).items():
+            print(f"[INFO] Parsowanie ({name}): {row['pages']} stron, {row['per_page_ms']} ms/stronę")
+
+
+@metrics.timed("get_offers_seconds")
+def get_offers(location_filter, concurrency=DEFAULT_CONCURRENCY, rate_limit=DEFAULT_RATE_LIMIT,
+               base_url=BASE_URL, save=True, max_pages=1, incremental=False, stats=None, cache=None):
+    """
+    Pobiera oferty z Otodom dla danej lokalizacji (location_filter).
+    Krok 1: Ze strony wyników zbiera tylko podstawowe dane (link do detail page).
+    Krok 2: Wejdzie na każdą podstronę ogłoszenia i zbiera:
+       - tytuł (h1[data-cy="adPageAdTitle"]),
+       - cenę (strong[data-cy="adPageHeaderPrice"]),
+       - cenę za m² (div[aria-label="Cena za metr kwadratowy"]),
+       - lokalizację (MapLink → <a> wewnątrz),
+       - wszystkie etykieta→wartość z sekcji <div data-sentry-element="ItemGridContainer">,
+       - opis (div[data-cy="adPageAdDescription"]).
+    Podstrony pobiera pula 'concurrency' wątków przez wspólną sesję (keep-alive),
+    z limitem 'rate_limit' zapytań/s na hosta; każdy wątek od razu parsuje swoją
+    stronę, więc parsowanie nakłada się na oczekiwanie na sieć.
+    Kolejność ofert jest taka sama jak na stronie wyników.
+    Domyślnie czyta tylko pierwszą stronę wyników (max_pages=1); max_pages=None
+    przechodzi wszystkie strony – dla dużych lokalizacji lepiej użyć crawl_offers.
+    'base_url' pozwala skierować scraper na lokalny serwer testowy (benchmark.py).
+    incremental=True pobiera tylko nowe i zmienione ogłoszenia (indeks seen_index.py),
+    więc zwrócona lista nie zawiera ogłoszeń pominiętych jako niezmienione.
+    'cache' – opcjonalna dyskowa pamięć podręczna odpowiedzi (http_cache.HttpCache).
+    Na koniec (jeśli save=True) zapisuje listę słowników do magazynu ofert i zwraca ją.
+    """
+    with _seen_index(incremental) as index:
+        offers = list(_run_crawl(location_filter, index, stats, concurrency=concurrency,
+                                 rate_limit=rate_limit, base_url=base_url, max_pages=max_pages,
+                                 cache=cache))
+
+        # 3. Zapisz wszystkie pobrane oferty do magazynu ofert (dopiero potem indeks widzianych)
+        if save:
+            save_offers(offers)
+        apply_seen(index, index.take_staged() if index is not None else None, save)
     return offers
 
 
+def crawl_offers(location_filter, batch_size=72, on_batch=None, save=True, incremental=False,
+                 stats=None, on_seen=None, **crawl_kwargs):
+    """
+    Przechodzi wszystkie strony wyników (iter_offers) i zapisuje oferty partiami
+    po 'batch_size', zamiast budować jedną dużą listę.
+    Po każdej partii wywołuje on_batch(batch), np. żeby otagować oferty i zachować
+    tylko pasujące. Dodatkowe argumenty (max_pages, max_offers, stop_on_seen,
+    concurrency, ...) trafiają do iter_offers; 'incremental' i 'stats' działają
+    jak w get_offers.
+    Zmiany indeksu widzianych ogłoszeń z partii są zapisywane dopiero po jej zapisaniu.
+    Przy save=False zapis partii należy do wołającego: jeśli podano on_seen, dostaje
+    on_seen(zmiany) po on_batch i sam woła apply_seen po zapisaniu (parallel.py);
+    bez on_seen zmiany indeksu są porzucane (nic nie zostało zapisane).
+    Zwraca liczbę pobranych ofert.
+    """
+    total = 0
+    batch = []
+    with _seen_index(incremental) as index:
+        for offer in _run_crawl(location_filter, index, stats, **crawl_kwargs):
+            batch.append(offer)
+            if len(batch) >= batch_size:
+                total += _flush_batch(batch, on_batch, save, index, on_seen)
+                batch = []
+        # Także bez ofert – zmiany indeksu dla ogłoszeń pominiętych i 304
+        total += _flush_batch(batch, on_batch, save, index, on_seen)
+    return total
+
+
+def _flush_batch(batch, on_batch, save, index, on_seen):
+    staged = index.take_staged() if index is not None else None
+    if save and batch:
+        save_offers(batch)
+    if on_batch is not None and batch:
+        on_batch(batch)
+    if on_seen is not None and not save:
+        if staged is not None:
+            on_seen(staged)
+    else:
+        apply_seen(index, staged, save)
+    return len(batch)
+
+
 if __name__ == "__main__":
     cfg = load_config()
     result = get_offers(cfg["location"])
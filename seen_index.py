@@ -0,0 +1,155 @@
+import datetime
+import os
+import sqlite3
+import threading
+
+INDEX_PATH = "data/seen_index.db"
+
+
+class SeenIndex:
+    """
+    Trwały indeks widzianych ogłoszeń (SQLite, klucz = URL ogłoszenia).
+    Dla każdego ogłoszenia przechowuje:
+      - last_seen     – kiedy ostatnio widzieliśmy je na stronie wyników,
+      - fingerprint   – skrót treści karty z wyników (zmienia się np. przy zmianie ceny),
+      - price         – cena z karty wyników,
+      - etag / last_modified – nagłówki podstrony do zapytań warunkowych.
+    Obiekt obsługuje 'url in index', więc może też służyć jako stop_on_seen.
+    Crawl tylko przygotowuje zmiany (stage, stage_unchanged); zapisuje je apply() dopiero
+    po zapisaniu partii ofert do magazynu – ogłoszenie, którego nie udało się zapisać,
+    nie zostaje oznaczone jako widziane.
+    """
+
+    def __init__(self, path=INDEX_PATH, commit_every=100):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.commit_every = commit_every
+        self._pending = 0
+        self._staged = {"records": [], "unchanged": []}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS seen (
+                url TEXT PRIMARY KEY,
+                last_seen TEXT,
+                fingerprint TEXT,
+                price TEXT,
+                etag TEXT,
+                last_modified TEXT
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, url):
+        """
+        Zwraca zapis dla 'url' jako słownik albo None, jeśli ogłoszenia nie znamy.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_seen, fingerprint, price, etag, last_modified FROM seen WHERE url = ?",
+                (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("last_seen", "fingerprint", "price", "etag", "last_modified"), row))
+
+    def __contains__(self, url):
+        return self.get(url) is not None
+
+    def conditional_headers(self, entry):
+        """
+        Nagłówki If-None-Match / If-Modified-Since dla zapisu z get() (lub {}).
+        """
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def touch(self, url):
+        """
+        Aktualizuje tylko czas ostatniego widzenia (ogłoszenie bez zmian).
+        """
+        self._write("UPDATE seen SET last_seen = ? WHERE url = ?", (self._now(), url))
+
+    def record(self, url, fingerprint, price, etag=None, last_modified=None):
+        """
+        Zapisuje (lub nadpisuje) stan ogłoszenia po pobraniu podstrony.
+        """
+        self._write(
+            """
+            INSERT INTO seen (url, last_seen, fingerprint, price, etag, last_modified)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                last_seen = excluded.last_seen,
+                fingerprint = excluded.fingerprint,
+                price = excluded.price,
+                etag = COALESCE(excluded.etag, seen.etag),
+                last_modified = COALESCE(excluded.last_modified, seen.last_modified)
+            """,
+            (url, self._now(), fingerprint, price, etag, last_modified)
+        )
+
+    def stage(self, url, fingerprint, price, etag=None, last_modified=None):
+        """
+        Przygotowuje record() dla pobranej podstrony (zapis dopiero w apply()).
+        """
+        with self._lock:
+            self._staged["records"].append((url, fingerprint, price, etag, last_modified))
+
+    def stage_unchanged(self, url):
+        """
+        Przygotowuje touch() dla ogłoszenia bez zmian (zapis dopiero w apply()).
+        """
+        with self._lock:
+            self._staged["unchanged"].append(url)
+
+    def take_staged(self):
+        """
+        Zwraca i czyści przygotowane zmiany: {"records": [...], "unchanged": [url, ...]}
+        (słownik – można go przesłać do innego procesu, patrz parallel.py).
+        """
+        with self._lock:
+            staged, self._staged = self._staged, {"records": [], "unchanged": []}
+        return staged
+
+    def apply(self, staged):
+        """
+        Zapisuje i zatwierdza zmiany z take_staged() – wołane po zapisaniu partii ofert.
+        """
+        for record in staged["records"]:
+            self.record(*record)
+        for url in staged["unchanged"]:
+            self.touch(url)
+        self.commit()
+
+    def rollback(self):
+        # Porzuca niezatwierdzone zapisy i przygotowane zmiany (np. gdy zapis partii się nie udał)
+        with self._lock:
+            self._conn.rollback()
+            self._pending = 0
+            self._staged = {"records": [], "unchanged": []}
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._conn.close()
+
+    def _write(self, sql, params):
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._pending += 1
+            if self._pending >= self.commit_every:
+                self._conn.commit()
+                self._pending = 0
+
+    @staticmethod
+    def _now():
+        return datetime.datetime.now().isoformat(timespec="seconds")
@@ -0,0 +1,602 @@
+import datetime
+import glob
+import json
+import os
+import sqlite3
+from offer_model import Offer, parse_area, parse_floor, parse_number
+from tag_matcher import normalize
+
+DB_PATH = "data/oferty.db"
+DEFAULT_BACKEND = "sqlite"
+
+# Kolumny typowane (z indeksami) zapisywane obok pełnej oferty w JSON – dla query()
+TYPED_COLUMNS = {
+    "title": "TEXT",
+    "location": "TEXT",
+    "location_key": "TEXT",     # "mazowieckie/warszawa/mokotow/ul. x" – filtr po prefiksie
+    "price": "INTEGER",
+    "price_per_m2": "INTEGER",
+    "rooms": "INTEGER",
+    "area": "REAL",
+    "floor": "INTEGER",
+    "cluster_id": "INTEGER",
+}
+QUERY_COLUMNS = ("url", "first_seen", "last_seen", "day") + tuple(TYPED_COLUMNS)
+
+# Pełnotekstowy indeks ofert (FTS5): wielkość liter i znaki diakrytyczne usuwa tokenizer,
+# a "ł", którego Unicode nie rozkłada na "l" + znak diakrytyczny, zamieniamy sami
+FTS_COLUMNS = ("title", "description", "location")
+FTS_FOLD = str.maketrans("łŁ", "lL")
+_FTS_SELECT = (
+    "SELECT rowid, fts_fold(json_extract(data, '$.title')), "
+    "fts_fold(nullif(json_extract(data, '$.description'), 'brak')), "
+    "fts_fold(json_extract(data, '$.location')) FROM offers"
+)
+
+
+class OfferStore:
+    """
+    Wspólny interfejs magazynu ofert. Oferty są kluczowane adresem 'url'.
+      - upsert(offers)        – dopisuje/aktualizuje oferty (koszt proporcjonalny do partii),
+      - touch(urls)           – oznacza zapisane oferty jako widziane dzisiaj (bez zmiany danych),
+      - read_offers(day)      – lista słowników z ofertami widzianymi danego dnia,
+      - read_frame(day)       – to samo jako pandas.DataFrame,
+      - count(day) / read_page(day, offset, limit) – liczba ofert i jedna strona
+        (najnowsze pierwsze) do stronicowanego podglądu,
+      - export_excel(path, day) – eksport na żądanie do pliku Excel,
+      - data_version(day)     – identyfikator wersji danych danego dnia; zmienia się po każdym
+        zapisie, który może je zmienić,
+      - query(...) / query_columns(...) – zapytania z filtrami, sortowaniem i stronicowaniem
+        (tylko SQLiteOfferStore).
+    day=None oznacza dzisiejszy dzień.
+    """
+
+    def upsert(self, offers):
+        raise NotImplementedError
+
+    def touch(self, urls):
+        raise NotImplementedError
+
+    def read_offers(self, day=None):
+        raise NotImplementedError
+
+    def read_frame(self, day=None):
+        import pandas as pd   # pandas tylko przy odczycie do analizy/eksportu (szybki start CLI)
+        return pd.DataFrame(self.read_offers(day))
+
+    def count(self, day=None):
+        return len(self.read_offers(day))
+
+    def read_page(self, day=None, offset=0, limit=50):
+        offers = self.read_offers(day)[::-1]
+        return offers[offset:offset + limit]
+
+    def data_version(self, day=None):
+        raise NotImplementedError
+
+    def query(self, sort=None, limit=None, offset=0, **filters):
+        raise NotImplementedError("Zapytania są dostępne tylko w magazynie SQLite")
+
+    def query_columns(self, columns, sort=None, limit=None, offset=0, batch_size=1000, **filters):
+        raise NotImplementedError("Zapytania są dostępne tylko w magazynie SQLite")
+
+    def search(self, text, limit=50, offset=0, **filters):
+        raise NotImplementedError("Wyszukiwanie pełnotekstowe jest dostępne tylko w magazynie SQLite")
+
+    def export_excel(self, path=None, day=None):
+        day = day or _today()
+        path = path or f"data/oferty_{day}.xlsx"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.read_frame(day).to_excel(path, index=False)
+        return path
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SQLiteOfferStore(OfferStore):
+    """
+    Magazyn ofert w SQLite (data/oferty.db) – domyślny "system of record".
+    Jedna tabela 'offers' z kluczem głównym url; pełna oferta jest zapisana
+    jako JSON (kolumny specyfikacji różnią się między ogłoszeniami), a pola, po których
+    filtrujemy i sortujemy (TYPED_COLUMNS: cena, pokoje, powierzchnia, lokalizacja, ...),
+    także jako osobne kolumny liczbowe z indeksami.
+    Upsert zachowuje first_seen i aktualizuje last_seen/day/data i kolumny typowane.
+    Tytuł, opis i lokalizacja trafiają przy zapisie do indeksu pełnotekstowego
+    'offers_fts' (FTS5, rowid = rowid oferty) – patrz filtr 'text' w _where i search().
+    """
+
+    def __init__(self, path=DB_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS offers (
+                url TEXT PRIMARY KEY,
+                first_seen TEXT,
+                last_seen TEXT,
+                day TEXT,
+                data TEXT
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_offers_day ON offers(day)")
+        self._conn.create_function("py_lower", 1, _lower, deterministic=True)
+        self._conn.create_function("py_fold", 1, _fold, deterministic=True)
+        self._conn.create_function("fts_fold", 1, _fts_fold, deterministic=True)
+        self._add_typed_columns()
+        self._add_fts_index()
+        # Licznik zapisów – wersja danych dla pamięci podręcznych analizy
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+        self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+        self._conn.commit()
+
+    def _add_typed_columns(self):
+        # Migracja starszej bazy: brakujące kolumny typowane są dodawane i wypełniane z JSON
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(offers)")}
+        missing = [name for name in TYPED_COLUMNS if name not in existing]
+        for name in missing:
+            self._conn.execute(f"ALTER TABLE offers ADD COLUMN {name} {TYPED_COLUMNS[name]}")
+        if missing:
+            assignments = ", ".join(f"{name} = ?" for name in TYPED_COLUMNS)
+            rows = self._conn.execute("SELECT url, data FROM offers").fetchall()
+            self._conn.executemany(
+                f"UPDATE offers SET {assignments} WHERE url = ?",
+                [_typed_values(json.loads(data)) + (url,) for url, data in rows]
+            )
+            if rows:
+                print(f"[INFO] Magazyn ofert: uzupełniono kolumny typowane dla {len(rows)} ofert")
+        self._conn.executescript(
+            """
+            CREATE INDEX IF NOT EXISTS idx_offers_last_seen ON offers(last_seen);
+            CREATE INDEX IF NOT EXISTS idx_offers_price ON offers(price);
+            CREATE INDEX IF NOT EXISTS idx_offers_area ON offers(area);
+            CREATE INDEX IF NOT EXISTS idx_offers_rooms ON offers(rooms, price);
+            CREATE INDEX IF NOT EXISTS idx_offers_location ON offers(location_key);
+            CREATE INDEX IF NOT EXISTS idx_offers_cluster ON offers(cluster_id);
+            """
+        )
+        self._conn.commit()
+
+    def _add_fts_index(self):
+        # Migracja starszej bazy: nowy indeks pełnotekstowy jest wypełniany z zapisanych ofert
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'offers_fts'"
+        ).fetchone()
+        if exists:
+            return
+        self._conn.execute(
+            f"""
+            CREATE VIRTUAL TABLE offers_fts USING fts5(
+                {', '.join(FTS_COLUMNS)}, tokenize = 'unicode61 remove_diacritics 2'
+            )
+            """
+        )
+        self._conn.execute(f"INSERT INTO offers_fts (rowid, {', '.join(FTS_COLUMNS)}) {_FTS_SELECT}")
+        self._conn.commit()
+        indexed = self._conn.execute("SELECT COUNT(*) FROM offers").fetchone()[0]
+        if indexed:
+            print(f"[INFO] Magazyn ofert: zbudowano indeks pełnotekstowy dla {indexed} ofert")
+
+    def _write(self, rows, conflict):
+        columns = ("url", "first_seen", "last_seen", "day", "data") + tuple(TYPED_COLUMNS)
+        self._conn.executemany(
+            f"INSERT INTO offers ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) {conflict}",
+            rows
+        )
+
+    def _index_text(self, urls):
+        # Indeksuje ponownie (z zapisanego JSON) oferty o podanych adresach – nowe i zaktualizowane
+        urls = json.dumps(list(urls))
+        self._conn.execute(
+            "DELETE FROM offers_fts WHERE rowid IN "
+            "(SELECT rowid FROM offers WHERE url IN (SELECT value FROM json_each(?)))",
+            (urls,)
+        )
+        self._conn.execute(
+            f"INSERT INTO offers_fts (rowid, {', '.join(FTS_COLUMNS)}) {_FTS_SELECT} "
+            "WHERE url IN (SELECT value FROM json_each(?))",
+            (urls,)
+        )
+
+    def upsert(self, offers):
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        day = _today()
+        rows = [
+            (offer.get("url"), now, now, day, json.dumps(offer if isinstance(offer, dict) else dict(offer),
+                                                  ensure_ascii=False, default=str))
+            + _typed_values(offer)
+            for offer in offers
+        ]
+        updates = ", ".join(f"{name} = excluded.{name}"
+                            for name in ("last_seen", "day", "data") + tuple(TYPED_COLUMNS))
+        with self._conn:
+            self._write(rows, f"ON CONFLICT(url) DO UPDATE SET {updates}")
+            self._index_text(row[0] for row in rows)
+            self._bump_version()
+        return len(rows)
+
+    def touch(self, urls):
+        # Jedno UPDATE na partię; tekst i dane oferty się nie zmieniły, więc bez reindeksacji FTS
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        with self._conn:
+            touched = self._conn.execute(
+                "UPDATE offers SET day = ?, last_seen = ? WHERE url IN (SELECT value FROM json_each(?))",
+                (_today(), now, json.dumps(list(urls)))
+            ).rowcount
+            if touched:
+                self._bump_version()
+        return touched
+
+    def data_version(self, day=None):
+        # Jedna wersja całej bazy – zmienia się po każdym zapisie, niezależnie od dnia
+        return str(self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0])
+
+    def _bump_version(self):
+        self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+
+    def read_offers(self, day=None):
+        cursor = self._conn.execute(
+            "SELECT data FROM offers WHERE day = ? ORDER BY rowid", (day or _today(),)
+        )
+        return [json.loads(data) for (data,) in cursor]
+
+    def count(self, day=None):
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM offers WHERE day = ?", (day or _today(),)
+        ).fetchone()[0]
+
+    def read_page(self, day=None, offset=0, limit=50):
+        # Tylko jedna strona wierszy – bez wczytywania całego dnia
+        cursor = self._conn.execute(
+            "SELECT data FROM offers WHERE day = ? ORDER BY rowid DESC LIMIT ? OFFSET ?",
+            (day or _today(), limit, offset)
+        )
+        return [json.loads(data) for (data,) in cursor]
+
+    def import_excel(self, path, day=None):
+        """
+        Wczytuje dawny dzienny plik Excel (data/oferty_YYYY-MM-DD.xlsx) do magazynu.
+        Dzień jest brany z nazwy pliku, jeśli nie podano 'day'.
+        """
+        import pandas as pd
+        day = day or os.path.basename(path)[len("oferty_"):-len(".xlsx")]
+        df = pd.read_excel(path)
+        offers = [
+            {key: val for key, val in row.items() if not pd.isna(val)}
+            for row in df.to_dict(orient="records")
+        ]
+        rows = [
+            (offer.get("url"), str(offer.get("date", day)), str(offer.get("date", day)), day,
+             json.dumps(offer, ensure_ascii=False, default=str))
+            + _typed_values(offer)
+            for offer in offers
+        ]
+        with self._conn:
+            self._write(rows, "ON CONFLICT(url) DO NOTHING")
+            self._index_text(row[0] for row in rows)
+            self._bump_version()
+        return len(rows)
+
+    def query(self, sort=None, limit=None, offset=0, **filters):
+        """
+        Oferty spełniające filtry (patrz _where), leniwie – kolejne oferty (słowniki)
+        są dekodowane z JSON dopiero przy iteracji. Bez filtra 'day' – ze wszystkich dni.
+        sort: nazwa kolumny z QUERY_COLUMNS albo "rowid" (kolejność zapisu), "-" na początku
+        = malejąco (domyślnie najnowsze zapisy pierwsze).
+        """
+        where, params = _where(**filters)
+        cursor = self._select(
+            f"SELECT data FROM offers{where}{_order_by(sort)} LIMIT ? OFFSET ?",
+            params + [-1 if limit is None else limit, offset]
+        )
+        return (json.loads(data) for (data,) in cursor)
+
+    def query_columns(self, columns, sort=None, limit=None, offset=0, batch_size=1000, **filters):
+        """
+        Jak query(), ale zwraca tylko wybrane kolumny z QUERY_COLUMNS, bez dekodowania
+        JSON, jako kolejne partie w układzie kolumnowym: {kolumna: [wartości]}
+        (najwyżej 'batch_size' wierszy w partii). Np. do pandas.DataFrame(partia).
+        """
+        unknown = [name for name in columns if name not in QUERY_COLUMNS]
+        if unknown:
+            raise ValueError(f"Nieznane kolumny: {unknown} (dostępne: {QUERY_COLUMNS})")
+        where, params = _where(**filters)
+        cursor = self._select(
+            f"SELECT {', '.join(columns)} FROM offers{where}{_order_by(sort)} LIMIT ? OFFSET ?",
+            params + [-1 if limit is None else limit, offset]
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield dict(zip(columns, map(list, zip(*rows))))
+
+    def count_matching(self, **filters):
+        """
+        Liczba ofert spełniających filtry query() (bez filtra 'day' – ze wszystkich dni).
+        """
+        if set(filters) == {"text"} and filters["text"]:
+            # Każda oferta ma dokładnie jeden wiersz w indeksie – liczymy w samym indeksie
+            return self._select("SELECT COUNT(*) FROM offers_fts WHERE offers_fts MATCH ?",
+                                [fts_query(filters["text"])]).fetchone()[0]
+        where, params = _where(**filters)
+        return self._select(f"SELECT COUNT(*) FROM offers{where}", params).fetchone()[0]
+
+    def search(self, text, limit=50, offset=0, **filters):
+        """
+        Wyszukiwanie pełnotekstowe w tytułach, opisach i lokalizacjach (składnia FTS5,
+        bez rozróżniania wielkości liter i polskich znaków):
+          - słowa:     balkon garaż      (oba słowa),
+          - fraza:     "blisko metra",
+          - prefiks:   metr*             (metra, metrem, metro, ... – zamiast odmiany),
+          - logika:    balkon OR taras, garaż NOT parter, (balkon OR taras) AND "blisko metra",
+          - kolumna:   title: apartament.
+        Oferty (słowniki) od najtrafniejszych (bm25), leniwie; 'filters' jak w query().
+        Ocena trafności obejmuje wszystkie trafienia, więc bardzo ogólne zapytania
+        (dziesiątki tysięcy ofert) są wolniejsze – wtedy query(text=...) zwraca
+        najnowsze trafienia bez oceny. Niepoprawne zapytanie → ValueError.
+        """
+        page = [-1 if limit is None else limit, offset]
+        if not filters:
+            # Bez filtrów stronicujemy w samym indeksie – złączenie tylko dla zwracanych ofert
+            sql = """
+                SELECT o.data FROM (SELECT rowid, rank FROM offers_fts WHERE offers_fts MATCH ?
+                                    ORDER BY rank LIMIT ? OFFSET ?) AS f
+                JOIN offers AS o ON o.rowid = f.rowid
+                ORDER BY f.rank
+                """
+            cursor = self._select(sql, [fts_query(text)] + page)
+        else:
+            where, params = _where(**filters)
+            sql = f"""
+                SELECT o.data FROM (SELECT rowid, rank FROM offers_fts WHERE offers_fts MATCH ?) AS f
+                JOIN offers AS o ON o.rowid = f.rowid{where}
+                ORDER BY f.rank LIMIT ? OFFSET ?
+                """
+            cursor = self._select(sql, [fts_query(text)] + params + page)
+        return (json.loads(data) for (data,) in cursor)
+
+    def _select(self, sql, params):
+        try:
+            return self._conn.execute(sql, params)
+        except sqlite3.OperationalError as e:
+            # Błędy składni zapytania FTS5 ("unterminated string", "fts5: syntax error", ...)
+            if "offers_fts" in sql:
+                raise ValueError(f"Niepoprawne zapytanie pełnotekstowe: {e}") from None
+            raise
+
+    def close(self):
+        self._conn.close()
+
+
+class ExcelOfferStore(OfferStore):
+    """
+    Dawny sposób zapisu: jeden plik Excel na dzień, przepisywany w całości przy każdym zapisie.
+    Zostawiony jako alternatywny backend (get_store("excel")).
+    """
+
+    def upsert(self, offers):
+        import pandas as pd
+        file_path = f"data/oferty_{_today()}.xlsx"
+        os.makedirs("data", exist_ok=True)
+        df_new = pd.DataFrame([dict(offer) for offer in offers])
+        if os.path.exists(file_path):
+            df_combined = pd.concat([pd.read_excel(file_path), df_new], ignore_index=True)
+            if "url" in df_combined.columns:
+                df_combined.drop_duplicates(subset=["url"], keep="last", inplace=True)
+            else:
+                df_combined.drop_duplicates(inplace=True)
+        else:
+            df_combined = df_new
+        df_combined.to_excel(file_path, index=False)
+        return len(offers)
+
+    def touch(self, urls):
+        # Pliki są dzienne – oferty bez zmian przepisujemy do dzisiejszego pliku
+        # z najnowszego wcześniejszego pliku, w którym występują
+        import pandas as pd
+        missing = set(urls) - set(self.read_frame().get("url", ()))
+        found = []
+        for path in sorted(glob.glob("data/oferty_*.xlsx"), reverse=True):
+            if not missing:
+                break
+            df = pd.read_excel(path)
+            if "url" not in df.columns:
+                continue
+            rows = df[df["url"].isin(missing)]
+            found.extend(rows.to_dict(orient="records"))
+            missing -= set(rows["url"])
+        return self.upsert(found) if found else 0
+
+    def read_frame(self, day=None):
+        import pandas as pd
+        file_path = f"data/oferty_{day or _today()}.xlsx"
+        if not os.path.exists(file_path):
+            return pd.DataFrame()
+        return pd.read_excel(file_path)
+
+    def read_offers(self, day=None):
+        return self.read_frame(day).to_dict(orient="records")
+
+    def data_version(self, day=None):
+        file_path = f"data/oferty_{day or _today()}.xlsx"
+        if not os.path.exists(file_path):
+            return "0"
+        stat = os.stat(file_path)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+BACKENDS = {
+    "sqlite": SQLiteOfferStore,
+    "excel": ExcelOfferStore,
+}
+
+
+def get_store(backend=None):
+    """
+    Zwraca magazyn ofert wskazanego typu (domyślnie DEFAULT_BACKEND).
+    Używać jako menedżer kontekstu: with get_store() as store: ...
+    """
+    return BACKENDS[backend or DEFAULT_BACKEND]()
+
+
+def import_excel_files(pattern="data/oferty_*.xlsx"):
+    """
+    Jednorazowa migracja: wczytuje wszystkie dawne dzienne pliki Excel do SQLite.
+    Zwraca liczbę wczytanych wierszy.
+    """
+    total = 0
+    with SQLiteOfferStore() as store:
+        for path in sorted(glob.glob(pattern)):
+            total += store.import_excel(path)
+            print(f"[INFO] Zaimportowano {path}")
+    return total
+
+
+def _today():
+    return datetime.date.today().isoformat()
+
+
+def _lower(text):
+    # lower() z SQLite zmienia tylko litery ASCII ("Ł" zostaje "Ł")
+    return text.lower() if text is not None else None
+
+
+def _fold(text):
+    # Jak tag_matcher.normalize(fold_diacritics=True) – filtr 'tags' bez polskich znaków
+    return normalize(text, fold_diacritics=True) if text is not None else None
+
+
+def _fts_fold(text):
+    return text.translate(FTS_FOLD) if isinstance(text, str) else None
+
+
+def fts_query(text):
+    """
+    Zapytanie użytkownika w składni FTS5 gotowe dla indeksu offers_fts ("ł" → "l";
+    operatory AND/OR/NOT muszą zostać wielkimi literami, więc nie zmieniamy wielkości liter).
+    """
+    return str(text).translate(FTS_FOLD)
+
+
+def phrase_query(phrases, prefix=True):
+    """
+    Zapytanie FTS5 pasujące do oferty zawierającej którąkolwiek z fraz:
+    ["blisko metra", "balkon"] → '"blisko metra"* OR "balkon"*'. prefix=True dopuszcza
+    dowolne zakończenie ostatniego słowa frazy ("balkon" znajdzie też "balkonem").
+    """
+    quoted = ['"' + str(phrase).replace('"', '""') + '"' + ("*" if prefix else "")
+              for phrase in phrases if str(phrase).strip()]
+    return " OR ".join(quoted)
+
+
+def location_key(location):
+    """
+    Klucz lokalizacji do filtrowania po prefiksie, od ogółu do szczegółu i bez polskich
+    znaków: "ul. Puławska 5, Mokotów, Warszawa, mazowieckie" → "mazowieckie/warszawa/mokotow/ul. pulawska 5";
+    lokalizacja w stylu config.txt ("mazowieckie/warszawa") zostaje w tej samej kolejności.
+    """
+    text = normalize(str(location or ""), fold_diacritics=True)
+    parts = text.split("/") if "/" in text else reversed(text.split(","))
+    return "/".join(part.strip() for part in parts if part.strip())
+
+
+def _typed_values(offer):
+    # Wartości TYPED_COLUMNS (w tej kolejności) z oferty
+    location = offer.get("location")
+    if isinstance(offer, Offer):
+        # Liczby sparsowane już przy scrapowaniu
+        return (offer.title, location, location_key(location) if location != "brak" else None,
+                offer.price, offer.price_per_m2, offer.rooms, offer.area, offer.floor,
+                offer.get("cluster_id"))
+    return (
+        offer.get("title"),
+        location,
+        location_key(location) if location and location != "brak" else None,
+        parse_number(offer.get("price")),
+        parse_number(offer.get("price_per_m2")),
+        parse_number(offer.get("Liczba pokoi")),
+        parse_area(offer.get("Powierzchnia")),
+        parse_floor(offer.get("Piętro")),
+        offer.get("cluster_id"),
+    )
+
+
+def _where(day=None, min_price=None, max_price=None, rooms=None, min_area=None, max_area=None,
+           location=None, tags=None, text=None, since=None, until=None, cluster_id=None,
+           fold_diacritics=False):
+    """
+    Klauzula WHERE dla query()/query_columns()/count_matching():
+      - day                  – dzień ostatniego widzenia (RRRR-MM-DD),
+      - min_price/max_price  – cena w zł, min_area/max_area – powierzchnia w m²,
+      - rooms                – liczba pokoi albo przedział (od, do),
+      - location             – lokalizacja wraz z podlokalizacjami (location_key, np. "mazowieckie/warszawa";
+                               całe segmenty – "warszawa" nie obejmuje "warszawa-wola"),
+      - tags                 – lista fraz; oferta pasuje, gdy tytuł lub opis zawiera
+                               którąkolwiek z nich (bez rozróżniania wielkości liter;
+                               z fold_diacritics=True także bez polskich znaków) – tak
+                               jak tag_matcher.tag_offers bez whole_words,
+      - text                 – zapytanie pełnotekstowe (indeks offers_fts, składnia jak w search()),
+      - since/until          – zakres last_seen (ISO data lub data/czas, włącznie),
+      - cluster_id           – grupa duplikatów (dedup.py).
+    Zwraca (" WHERE ...", parametry) albo ("", []).
+    """
+    clauses, params = [], []
+
+    def add(clause, *values):
+        clauses.append(clause)
+        params.extend(values)
+
+    if day is not None:
+        add("day = ?", day)
+    if min_price is not None:
+        add("price >= ?", min_price)
+    if max_price is not None:
+        add("price <= ?", max_price)
+    if rooms is not None:
+        if isinstance(rooms, (tuple, list)):
+            add("rooms BETWEEN ? AND ?", *rooms)
+        else:
+            add("rooms = ?", rooms)
+    if min_area is not None:
+        add("area >= ?", min_area)
+    if max_area is not None:
+        add("area <= ?", max_area)
+    if location:
+        # Sam klucz albo zakres po indeksie dla 'klucz/...' ('0' następuje po '/'),
+        # zamiast LIKE 'prefiks%', które łapałoby też "warszawa-wola" dla "warszawa"
+        key = location_key(location)
+        add("(location_key = ? OR (location_key >= ? AND location_key < ?))", key, key + "/", key + "0")
+    if tags:
+        haystack = ("py_fold" if fold_diacritics else "py_lower") + \
+            "(coalesce(json_extract(data, '$.title'), '') || ' ' || " \
+            "coalesce(json_extract(data, '$.description'), ''))"
+        add("(" + " OR ".join(f"instr({haystack}, ?) > 0" for _ in tags) + ")",
+            *[normalize(str(tag), fold_diacritics) for tag in tags])
+    if text:
+        add("rowid IN (SELECT rowid FROM offers_fts WHERE offers_fts MATCH ?)", fts_query(text))
+    if since is not None:
+        add("last_seen >= ?", since)
+    if until is not None:
+        # Sama data obejmuje cały dzień
+        add("last_seen <= ?", until + "T23:59:59" if len(until) == 10 else until)
+    if cluster_id is not None:
+        add("cluster_id = ?", cluster_id)
+    return (" WHERE " + " AND ".join(clauses), params) if clauses else ("", [])
+
+
+def _order_by(sort):
+    if not sort:
+        return " ORDER BY rowid DESC"
+    column = sort.lstrip("-")
+    if column not in QUERY_COLUMNS + ("rowid",):
+        raise ValueError(f"Nie można sortować po {column!r} (dostępne: {QUERY_COLUMNS})")
+    return f" ORDER BY {column} {'DESC' if sort.startswith('-') else 'ASC'}, rowid DESC"
@@ -0,0 +1,178 @@
+from collections import deque
+from functools import lru_cache
+import metrics
+
+# Do tylu fraz (bez whole_words) szybsze jest zwykłe "fraza in tekst" wykonywane w C
+DIRECT_SCAN_MAX_TAGS = 150
+
+# Składanie polskich znaków diakrytycznych (ą→a, ł→l, ...); zachowuje długość tekstu
+POLISH_FOLD = str.maketrans("ąćęłńóśźż", "acelnoszz")
+
+
+def normalize(text, fold_diacritics=False):
+    """
+    Normalizacja tekstu i fraz przed dopasowaniem: małe litery i (opcjonalnie)
+    usunięcie polskich znaków diakrytycznych.
+    """
+    text = text.lower()
+    if fold_diacritics:
+        text = text.translate(POLISH_FOLD)
+    return text
+
+
+class TagMatcher:
+    """
+    Skompilowany zbiór fraz (automat Aho-Corasick), który znajduje wszystkie frazy
+    w jednym przejściu po tekście, niezależnie od ich liczby.
+      - fold_diacritics=True – "łazienka" pasuje do "lazienka" i odwrotnie,
+      - whole_words=True     – fraza musi stać na granicy słów ("metra" nie pasuje do "kilometra").
+    match(text) zwraca frazy w postaci tag.lower(), w kolejności z listy 'tags' –
+    tak samo jak dawne [tag.lower() for tag in tags if tag.lower() in text.lower()].
+    Dla małej liczby fraz (DIRECT_SCAN_MAX_TAGS) automat nie jest używany.
+    """
+
+    def __init__(self, tags, fold_diacritics=False, whole_words=False):
+        self.tags = [tag.lower() for tag in tags]
+        self.fold_diacritics = fold_diacritics
+        self.whole_words = whole_words
+
+        # Fraza → indeksy tagów, które ją dają (te same frazy mogą się powtarzać)
+        patterns = {}
+        for i, tag in enumerate(self.tags):
+            patterns.setdefault(normalize(tag, fold_diacritics), []).append(i)
+        self._patterns = list(patterns)
+        self._tag_ids = [patterns[p] for p in self._patterns]
+        # Pusta fraza występuje w każdym tekście
+        self._always = [pid for pid, p in enumerate(self._patterns) if not p]
+        self._direct_scan = not whole_words and len(self._patterns) <= DIRECT_SCAN_MAX_TAGS
+        self._build(self._patterns)
+
+    def _build(self, patterns):
+        goto = [{}]
+        out = [[]]
+        for pid, pattern in enumerate(patterns):
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(pid)
+
+        # Linki "fail" (BFS) i pełna tablica przejść: delta[stan][znak] → stan.
+        # Znak spoza alfabetu fraz zawsze prowadzi do stanu 0.
+        fail = [0] * len(goto)
+        delta = [None] * len(goto)
+        delta[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            f = fail[state]
+            out[state] = out[state] + out[f]
+            delta[state] = dict(delta[f])
+            delta[state].update(goto[state])
+            for ch, nxt in goto[state].items():
+                fail[nxt] = delta[f].get(ch, 0)
+                queue.append(nxt)
+
+        self._delta = delta
+        self._out = [tuple(o) for o in out]
+
+    def match(self, text):
+        """
+        Zwraca listę tagów występujących w tekście (w kolejności z listy 'tags').
+        """
+        text = normalize(text, self.fold_diacritics)
+        if self._direct_scan:
+            found = {pid for pid, p in enumerate(self._patterns) if p in text}
+        else:
+            found = self._scan(text)
+        matched = sorted(i for pid in found for i in self._tag_ids[pid])
+        return [self.tags[i] for i in matched]
+
+    def _scan(self, text):
+        # Jedno przejście automatu po tekście; zwraca zbiór znalezionych fraz
+        found = set(self._always)
+        remaining = len(self._patterns) - len(found)
+        delta = self._delta
+        out = self._out
+        state = 0
+        for pos, ch in enumerate(text if remaining else ""):
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                for pid in out[state]:
+                    if pid in found:
+                        continue
+                    if self.whole_words and not self._at_word_boundary(text, pos, len(self._patterns[pid])):
+                        continue
+                    found.add(pid)
+                    remaining -= 1
+                if not remaining:
+                    break
+        return found
+
+    @staticmethod
+    def _at_word_boundary(text, end, length):
+        start = end - length + 1
+        before = text[start - 1] if start > 0 else " "
+        after = text[end + 1] if end + 1 < len(text) else " "
+        return not before.isalnum() and not after.isalnum()
+
+
+@lru_cache(maxsize=32)
+def _cached_matcher(tags, fold_diacritics, whole_words):
+    return TagMatcher(tags, fold_diacritics, whole_words)
+
+
+def get_matcher(tags, fold_diacritics=False, whole_words=False):
+    """
+    Zwraca skompilowany TagMatcher dla danej listy fraz; kolejne wywołania z tą samą
+    konfiguracją używają tego samego automatu.
+    """
+    return _cached_matcher(tuple(tags), fold_diacritics, whole_words)
+
+
+def tag_offers(offers, tags, fold_diacritics=False, whole_words=False):
+    """
+    Dodaje do każdej oferty (słownika) klucz "tags" zawierający listę fraz z 'tags',
+    które występują w title lub description oferty (ignoring case).
+    Frazy są kompilowane raz (get_matcher) i wyszukiwane w jednym
+    przejściu po tekście; opcjonalnie bez polskich znaków (fold_diacritics)
+    i tylko jako całe słowa (whole_words).
+    """
+    matcher = get_matcher(tags, fold_diacritics, whole_words)
+    with metrics.timer("tag_seconds"):
+        for offer in offers:
+            full_text = str(offer.get("title", "")) + " " + str(offer.get("description", ""))
+            offer["tags"] = matcher.match(full_text)
+    metrics.inc("tagged_offers_total", len(offers))
+    return offers
+
+
+def tag_stored_offers(tags, fold_diacritics=False, whole_words=False, **filters):
+    """
+    tag_offers dla ofert już zapisanych w magazynie – np. po dodaniu nowej frazy,
+    bez ponownego scrapowania; wynik jest taki sam jak przy tagowaniu w trakcie
+    scrapowania. Kandydatów wybiera magazyn: przy whole_words indeks pełnotekstowy
+    (frazy od początku słowa – obejmuje każde dopasowanie całych słów), w pozostałych
+    przypadkach wyszukiwanie podciągu w tytule i opisie (filtr 'tags' magazynu);
+    dokładne dopasowanie robi tag_offers.
+    'filters' jak w utils.query_offers (np. day, since, location); bez filtrów –
+    wszystkie zapisane oferty. Zwraca oferty z niepustym "tags".
+    """
+    from storage import phrase_query
+    from utils import query_offers
+
+    if not tags:
+        return []
+    query = phrase_query(tags) if whole_words else None
+    if query:
+        candidates = query_offers(text=query, **filters)
+    else:
+        candidates = query_offers(tags=list(tags), fold_diacritics=fold_diacritics, **filters)
+    return [offer for offer in tag_offers(candidates, tags, fold_diacritics, whole_words) if offer["tags"]]
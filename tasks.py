@@ -0,0 +1,90 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+POLL_MS = 100          # co ile ms wątek GUI odbiera zdarzenia z kolejki
+MAX_WORKERS = 4
+
+
+class TaskRunner:
+    """
+    Warstwa uruchamiania zadań w tle dla GUI (Tkinter nie jest bezpieczny wątkowo):
+      - submit() wykonuje funkcję w wątku roboczym; funkcja dostaje jako pierwszy
+        argument 'progress' – wywołanie progress(wartość) przekazuje postęp lub
+        częściowy wynik do on_progress,
+      - post() zleca dowolne wywołanie (np. label.config) do wykonania w wątku GUI,
+      - wszystkie wywołania zwrotne (on_progress, on_done, on_error, post) trafiają
+        do kolejki, którą wątek GUI opróżnia co POLL_MS ms przez root.after().
+    Dzięki temu żaden wątek roboczy nie dotyka widżetów bezpośrednio.
+    """
+
+    def __init__(self, root, max_workers=MAX_WORKERS, poll_ms=POLL_MS):
+        self.root = root
+        self.poll_ms = poll_ms
+        self._events = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gui-task")
+        self._busy = set()
+        self._lock = threading.Lock()
+        self._closed = False
+        self.root.after(self.poll_ms, self._poll)
+
+    def submit(self, func, *args, on_done=None, on_error=None, on_progress=None, name=None, **kwargs):
+        """
+        Uruchamia func(progress, *args, **kwargs) w tle. Zadanie o nazwie 'name'
+        nie zostanie uruchomione drugi raz, dopóki poprzednie trwa (zwraca wtedy False).
+        """
+        with self._lock:
+            if name is not None:
+                if name in self._busy:
+                    return False
+                self._busy.add(name)
+
+        def progress(value):
+            if on_progress is not None:
+                self._events.put((on_progress, (value,)))
+
+        def run():
+            try:
+                result = func(progress, *args, **kwargs)
+            except Exception as e:
+                print(f"[ERROR] Zadanie {name or func.__name__} nie powiodło się: {e}")
+                if on_error is not None:
+                    self._events.put((on_error, (e,)))
+            else:
+                if on_done is not None:
+                    self._events.put((on_done, (result,)))
+            finally:
+                if name is not None:
+                    with self._lock:
+                        self._busy.discard(name)
+
+        self._pool.submit(run)
+        return True
+
+    def is_busy(self, name):
+        with self._lock:
+            return name in self._busy
+
+    def post(self, callback, *args, **kwargs):
+        """
+        Bezpieczne wątkowo: callback(*args, **kwargs) wykona się w wątku GUI.
+        """
+        self._events.put((lambda: callback(*args, **kwargs), ()))
+
+    def close(self):
+        self._closed = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _poll(self):
+        # Wątek GUI: wykonaj wszystkie oczekujące wywołania zwrotne
+        while True:
+            try:
+                callback, args = self._events.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"[ERROR] Błąd aktualizacji GUI: {e}")
+        if not self._closed:
+            self.root.after(self.poll_ms, self._poll)
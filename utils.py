@@ -1,55 +1,117 @@
 import datetime
-import os
-import pandas as pd
+import re
+from storage import get_store
+from history import PriceHistory
+from dedup import NearDuplicateIndex
+import metrics
+
+INTERVAL_UNITS = {"s": 1, "m": 60, "min": 60, "h": 3600, "d": 86400}
+
+
+def save_offers(offers):
+    """
+    Zapisuje listę ofert (lista słowników) do magazynu ofert (domyślnie SQLite, data/oferty.db).
+    Oferty są kluczowane adresem 'url' – istniejące są aktualizowane, nowe dopisywane,
+    a koszt zapisu zależy tylko od wielkości partii.
+    Obserwacje cen trafiają też do historii cen (PriceHistory); oferty ze zmienioną
+    ceną dostają klucz "price_change". Zwraca listę zmian cen w tej partii.
+    Przed zapisem oferty dostają "cluster_id" (to samo mieszkanie pod różnymi adresami),
+    a duplikaty także "duplicate_of" – patrz dedup.NearDuplicateIndex.
+    """
+    with NearDuplicateIndex() as index:
+        index.assign(offers)
+    with metrics.timer("storage_write_seconds", target="offers"):
+        with get_store() as store:
+            store.upsert(offers)
+    metrics.inc("stored_offers_total", len(offers))
+    with metrics.timer("storage_write_seconds", target="history"):
+        with PriceHistory() as history:
+            return history.record(offers)
+
+
+def touch_offers(urls):
+    """
+    Oznacza zapisane oferty o podanych adresach jako widziane dzisiaj (day/last_seen)
+    bez przepisywania ich danych – dla ogłoszeń, których crawl nie pobrał ponownie,
+    bo się nie zmieniły. Zwraca liczbę oznaczonych ofert.
+    """
+    with metrics.timer("storage_write_seconds", target="offers"):
+        with get_store() as store:
+            return store.touch(urls)
 
 
 def save_offers_to_excel(offers):
     """
-    Zapisuje listę ofert (lista słowników) do pliku Excel (data/oferty_YYYY-MM-DD.xlsx).
-    Jeśli plik już istnieje, dopisuje nowe wiersze i usuwa duplikaty według 'url'.
+    Zachowane dla zgodności ze starszym kodem – zapisuje oferty do magazynu (save_offers).
+    Plik Excel tworzy się teraz na żądanie przez export_offers_to_excel().
+    """
+    save_offers(offers)
+
+
+def export_offers_to_excel(day=None, path=None):
+    """
+    Eksportuje oferty z danego dnia (domyślnie dzisiejsze) z magazynu do pliku Excel
+    (domyślnie data/oferty_YYYY-MM-DD.xlsx). Zwraca ścieżkę pliku.
     """
-    today = datetime.date.today().isoformat()
-    os.makedirs("data", exist_ok=True)
-    file_path = f"data/oferty_{today}.xlsx"
+    with get_store() as store:
+        return store.export_excel(path, day)
+
 
-    # Konwertujemy listę słowników na DataFrame
-    df_new = pd.DataFrame(offers)
+def read_saved_offers(day=None):
+    """
+    Wczytuje oferty zapisane w magazynie dla danego dnia (domyślnie dzisiejsze).
+    Zwraca listę słowników (każda oferta jako dict).
+    """
+    with get_store() as store:
+        return store.read_offers(day)
 
-    if os.path.exists(file_path):
-        # Jeśli plik istnieje, wczytaj stare dane i połącz z nowymi
-        df_old = pd.read_excel(file_path)
-        df_combined = pd.concat([df_old, df_new], ignore_index=True)
-        # Usuń duplikaty na podstawie unikalnego adresu URL
-        if "url" in df_combined.columns:
-            df_combined.drop_duplicates(subset=["url"], inplace=True)
-        else:
-            df_combined.drop_duplicates(inplace=True)
-    else:
-        df_combined = df_new
 
-    # Zapisz do Excela
-    df_combined.to_excel(file_path, index=False)
+def read_offers_page(day=None, offset=0, limit=50, sort=None, **filters):
+    """
+    Jedna strona zapisanych ofert (domyślnie najnowsze pierwsze) oraz łączna liczba ofert
+    danego dnia: zwraca (lista_ofert, liczba). Do stronicowanego podglądu w GUI.
+    'sort' i 'filters' jak w query_offers (filtry dotyczą ofert z dnia 'day').
+    """
+    with get_store() as store:
+        if sort is None and not filters:
+            return store.read_page(day, offset, limit), store.count(day)
+        day = day or datetime.date.today().isoformat()
+        return (list(store.query(sort, limit, offset, day=day, **filters)),
+                store.count_matching(day=day, **filters))
+
+
+def query_offers(sort=None, limit=None, offset=0, **filters):
+    """
+    Zapisane oferty spełniające filtry (lista słowników), np.
+    query_offers(max_price=600000, rooms=(2, 3), location="mazowieckie/warszawa",
+                 tags=["balkon"], since="2025-05-01", sort="price", limit=20).
+    Filtry i sortowanie: storage.SQLiteOfferStore.query. Przy dużych wynikach lepiej
+    iterować store.query() albo pobierać kolumny partiami przez store.query_columns().
+    """
+    with get_store() as store:
+        return list(store.query(sort, limit, offset, **filters))
 
 
-def read_saved_offers():
+def search_offers(text, limit=50, offset=0, **filters):
     """
-    Wczytuje oferty zapisane w dzisiejszym pliku Excel (data/oferty_YYYY-MM-DD.xlsx).
-    Zwraca listę słowników (każdy wiersz jako dict).
+    Wyszukiwanie pełnotekstowe w zapisanych ofertach, od najtrafniejszych, np.
+    search_offers('"blisko metra" AND balkon*', max_price=700000).
+    Zwraca (lista_ofert, liczba_wszystkich_trafień). Składnia zapytań:
+    storage.SQLiteOfferStore.search; niepoprawne zapytanie → ValueError.
     """
-    today = datetime.date.today().isoformat()
-    file_path = f"data/oferty_{today}.xlsx"
-    offers = []
+    with get_store() as store:
+        return list(store.search(text, limit, offset, **filters)), store.count_matching(text=text, **filters)
 
-    if os.path.exists(file_path):
-        df = pd.read_excel(file_path)
-        # Każdy wiersz DataFrame zamieniamy na słownik
-        for _, row in df.iterrows():
-            offers.append(row.to_dict())
 
-    return offers
+def load_offers_frame(day=None):
+    """
+    Jak read_saved_offers, ale zwraca pandas.DataFrame (do analizy).
+    """
+    with get_store() as store:
+        return store.read_frame(day)
 
 
-def save_config(location, tags, notify_email, login_email, email_password):
+def save_config(location, tags, notify_email, login_email, email_password, locations=None):
     """
     Zapisuje konfigurację do pliku 'config.txt' (5 linii):
       1. lokalizacja
@@ -57,6 +119,9 @@ def save_config(location, tags, notify_email, login_email, email_password):
       3. e-mail do powiadomień
       4. login e-mail nadawcy
       5. hasło e-mail nadawcy
+    oraz opcjonalnie kolejne linie z dodatkowymi lokalizacjami (parse_location_line),
+    np. "malopolskie/krakow | blisko tramwaju, balkon | 30m".
+    'locations' to lista takich linii albo słowników {"location", "tags", "interval"}.
     """
     with open("config.txt", "w", encoding="utf-8") as f:
         f.write(f"{location}\n")               # linia 1
@@ -64,26 +129,98 @@ def save_config(location, tags, notify_email, login_email, email_password):
         f.write(f"{notify_email}\n")          # linia 3
         f.write(f"{login_email}\n")           # linia 4
         f.write(f"{email_password}\n")        # linia 5
+        for entry in locations or []:          # linie 6+ (opcjonalne)
+            if isinstance(entry, dict):
+                entry = format_location_line(entry)
+            if entry.strip():
+                f.write(f"{entry.strip()}\n")
+
+
+def matches_location(list_location, location_filter):
+    """
+    Sprawdza, czy adres z karty wyników zawiera wszystkie części filtra lokalizacji.
+    """
+    normalized_input = location_filter.lower().replace("/", " ").replace(",", " ")
+    normalized_target = list_location.lower().replace("/", " ").replace(",", " ")
+    return all(part in normalized_target for part in normalized_input.split())
+
+
+def parse_tags(text):
+    """
+    "do remontu, blisko metra" → ["do remontu", "blisko metra"]
+    """
+    return [tag.strip() for tag in text.split(",") if tag.strip()]
+
+
+def parse_interval(text):
+    """
+    Odstęp między przebiegami w sekundach: "90s", "30m", "2h", "1d"; sama liczba
+    to minuty. Pusty tekst → None (domyślny odstęp harmonogramu).
+    """
+    if not text or not text.strip():
+        return None
+    match = re.fullmatch(r"\s*(\d+(?:[.,]\d+)?)\s*(s|m|min|h|d)?\s*", text)
+    if match is None:
+        raise ValueError(f"Niepoprawny odstęp: {text!r} (np. 30m, 2h)")
+    value = float(match.group(1).replace(",", "."))
+    return int(value * INTERVAL_UNITS[match.group(2) or "m"])
+
+
+def format_interval(seconds):
+    # 1800 → "30m", 7200 → "2h", 90 → "90s"
+    for unit in ("d", "h", "m"):
+        if seconds % INTERVAL_UNITS[unit] == 0:
+            return f"{seconds // INTERVAL_UNITS[unit]}{unit}"
+    return f"{seconds}s"
+
+
+def parse_location_line(line, default_tags):
+    """
+    Linia dodatkowej lokalizacji: "lokalizacja | fraza1, fraza2 | odstęp".
+    Bez części po "|" lokalizacja dostaje frazy z linii 2 konfiguracji;
+    odstęp (np. "30m", "2h" – parse_interval) jest opcjonalny, domyślnie None.
+    """
+    location, _, rest = line.partition("|")
+    tags, _, interval = rest.partition("|")
+    return {
+        "location": location.strip(),
+        "tags": parse_tags(tags) if tags.strip() else list(default_tags),
+        "interval": parse_interval(interval),
+    }
+
+
+def format_location_line(entry):
+    # Odwrotność parse_location_line
+    line = f"{entry['location']} | {', '.join(entry['tags'])}"
+    if entry.get("interval"):
+        line += f" | {format_interval(entry['interval'])}"
+    return line
 
 
 def load_config():
     """
-    Wczytuje konfigurację z pliku 'config.txt' (zakładamy, że istnieje i ma 5 linii).
+    Wczytuje konfigurację z pliku 'config.txt' (zakładamy, że istnieje i ma co najmniej 5 linii).
     Zwraca słownik:
       {
         "location": ...,
         "tags": [tag1, tag2, ...],
         "notify_email": ...,
         "login_email": ...,
-        "email_password": ...
+        "email_password": ...,
+        "locations": [{"location": ..., "tags": [...], "interval": sekundy albo None}, ...]
       }
+    "locations" zawiera główną lokalizację (linie 1–2) i wszystkie dodatkowe z linii 6+.
     """
     with open("config.txt", "r", encoding="utf-8") as f:
         lines = f.read().splitlines()
+        tags = parse_tags(lines[1])
+        locations = [{"location": lines[0], "tags": tags, "interval": None}] if lines[0].strip() else []
+        locations += [parse_location_line(line, tags) for line in lines[5:] if line.strip()]
         return {
             "location": lines[0],
-            "tags": [tag.strip() for tag in lines[1].split(",") if tag.strip()],
+            "tags": tags,
             "notify_email": lines[2],
             "login_email": lines[3],
-            "email_password": lines[4]
+            "email_password": lines[4],
+            "locations": locations
         }